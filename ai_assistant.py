@@ -22,6 +22,7 @@ class SellStrategy(Enum):
     TWAP = "twap"
     ICEBERG = "iceberg"
     ADAPTIVE = "adaptive"
+    VWAP = "vwap"
 
 @dataclass
 class MarketData:
@@ -144,10 +145,11 @@ def get_ai_trading_decision(currency, balance, market_data, db_manager):
         3. twap - разделение на части через равные промежутки времени
         4. iceberg - отображение только части ордера
         5. adaptive - динамический выбор на основе рыночных условий
+        6. vwap - разделение на части пропорционально ожидаемому объему торгов по часам суток
         
         Ответь в формате JSON:
         {{
-            "strategy": "market|limit|twap|iceberg|adaptive",
+            "strategy": "market|limit|twap|iceberg|adaptive|vwap",
             "parameters": {{
                 "price": 0.0,
                 "duration_minutes": 60,
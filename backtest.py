@@ -0,0 +1,454 @@
+"""
+Бэктест стратегий продажи на записанных снимках стакана.
+
+Снимки пишет бот (BookRecorder, включается backtest.record_books в config.yml)
+в data/books/<market>.jsonl: {"ts", "bids", "asks", "last", "vol"}. Бэктест
+проигрывает их через правила стратегий MARKET, LIMIT, TWAP, ICEBERG, ADAPTIVE
+и VWAP с теми же параметрами, что execute_*_sell в main.py (main.py нельзя
+импортировать офлайн - он требует ключей и сети), и простую модель исполнения:
+    - рыночный ордер проходит по bids текущего снимка;
+    - лимитный ордер на продажу исполняется объемом bids, цена которых не ниже
+      цены ордера, в каждом следующем снимке (ликвидность снимка общая для всех
+      наших ордеров, более дешевые исполняются первыми).
+
+Каждая пара (рынок, стратегия) считается в отдельном процессе.
+
+Использование:
+    python backtest.py --books data/books --amount-usd 500
+    python backtest.py --books data/books --strategies market,twap --starts 24 --json report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+from depth_slicing import BookDepth
+from order_router import parse_bids
+from order_sizing import SizingRules, quantize_amount, to_decimal
+from vwap_profile import build_hourly_profile, schedule_slices
+
+STRATEGIES = ["market", "limit", "twap", "iceberg", "adaptive", "vwap"]
+
+# Параметры стратегий по умолчанию - как DEFAULT_CONFIG в main.py
+DEFAULT_PARAMS = {
+    "limit": {"price_ratio": 0.999},
+    "twap": {"duration_minutes": 60, "chunks": 6, "price_ratio": 1.001},
+    "iceberg": {"visible_ratio": 0.1, "max_open_slices": 1, "refill_fill_ratio": 0.9, "slice_timeout": 120},
+    "adaptive": {"max_price_levels": 10, "liquidity_ratio": 0.1},
+    "vwap": {"duration_minutes": 60, "chunks": 6},
+    "horizon_seconds": 3600,   # Сколько ждать исполнения лимитных ордеров
+}
+
+
+def merge_params(params: Optional[dict] = None) -> dict:
+    """DEFAULT_PARAMS с переопределениями; вложенные словари стратегий сливаются по ключам."""
+    merged = dict(DEFAULT_PARAMS)
+    for key, value in (params or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+class BookRecorder:
+    """Пишет снимки стакана в JSONL по рынкам не чаще interval секунд на рынок."""
+
+    def __init__(self, directory, interval: float = 30, depth: int = 20, clock=time.time):
+        self.directory = Path(directory)
+        self.clock = clock
+        self.interval = interval
+        self.depth = depth
+        self.lock = Lock()
+        self.last_recorded: Dict[str, float] = {}
+
+    def record(self, market: str, orderbook: dict, last_price=None, volume=None) -> bool:
+        now = self.clock()
+        market = market.lower()
+        with self.lock:
+            if now - self.last_recorded.get(market, 0) < self.interval:
+                return False
+            self.last_recorded[market] = now
+        snapshot = {
+            "ts": now,
+            "bids": [[str(level[0]), str(level[1])] for level in (orderbook.get("bids") or [])[:self.depth]],
+            "asks": [[str(level[0]), str(level[1])] for level in (orderbook.get("asks") or [])[:self.depth]],
+            "last": str(last_price) if last_price is not None else None,
+            "vol": float(volume) if volume is not None else None,
+        }
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f"{market}.jsonl", "a", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot) + "\n")
+            return True
+        except Exception as e:
+            logging.warning(f"Не удалось записать снимок стакана {market}: {e}")
+            return False
+
+
+@dataclass
+class Snapshot:
+    ts: float
+    depth: BookDepth
+    last: Optional[Decimal] = None
+    vol: Optional[float] = None
+
+    @property
+    def best_bid(self) -> Decimal:
+        return self.depth.best_bid
+
+
+def load_snapshots(path) -> List[Snapshot]:
+    """Читает JSONL снимков рынка, пропуская поврежденные строки и пустые стаканы."""
+    snapshots = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                raw = json.loads(line)
+                depth = BookDepth.from_bids(parse_bids(raw.get("bids")))
+                if not depth.prices:
+                    continue
+                last = to_decimal(raw["last"]) if raw.get("last") else None
+                snapshots.append(Snapshot(float(raw["ts"]), depth, last, raw.get("vol")))
+            except (ValueError, KeyError, TypeError):
+                continue
+    snapshots.sort(key=lambda s: s.ts)
+    return snapshots
+
+
+@dataclass
+class SimOrder:
+    price: Optional[Decimal]      # None - рыночный
+    amount: Decimal
+    placed_at: float
+    filled: Decimal = Decimal("0")
+    proceeds: Decimal = Decimal("0")
+    active: bool = True
+
+    @property
+    def remaining(self) -> Decimal:
+        return self.amount - self.filled
+
+
+@dataclass
+class RunResult:
+    strategy: str
+    start_ts: float
+    amount: Decimal
+    filled: Decimal = Decimal("0")
+    proceeds: Decimal = Decimal("0")
+    arrival_bid: Decimal = Decimal("0")
+    last_fill_ts: Optional[float] = None
+    orders: int = 0
+
+    @property
+    def fill_ratio(self) -> float:
+        return float(self.filled / self.amount) if self.amount > 0 else 0.0
+
+    @property
+    def avg_price(self) -> Optional[float]:
+        return float(self.proceeds / self.filled) if self.filled > 0 else None
+
+    @property
+    def slippage_bps(self) -> Optional[float]:
+        """Отклонение средней цены от лучшего bid в момент старта (положительное - хуже)."""
+        if self.filled <= 0 or self.arrival_bid <= 0:
+            return None
+        return float((self.arrival_bid - self.proceeds / self.filled) / self.arrival_bid * 10000)
+
+    @property
+    def time_to_complete(self) -> Optional[float]:
+        if self.last_fill_ts is None or self.filled < self.amount:
+            return None
+        return self.last_fill_ts - self.start_ts
+
+
+class FillSimulator:
+    """Модель исполнения наших ордеров на последовательности снимков."""
+
+    def __init__(self, snapshots: List[Snapshot], start: int, rules: SizingRules, result: RunResult):
+        self.snapshots = snapshots
+        self.index = start
+        self.rules = rules
+        self.result = result
+        self.orders: List[SimOrder] = []
+        # Объем bids текущего снимка, уже занятый нашими ордерами
+        self.used_index = -1
+        self.used: List[Decimal] = []
+
+    @property
+    def now(self) -> Snapshot:
+        return self.snapshots[self.index]
+
+    def _record_fill(self, order: SimOrder, amount: Decimal, value: Decimal) -> None:
+        order.filled += amount
+        order.proceeds += value
+        self.result.filled += amount
+        self.result.proceeds += value
+        self.result.last_fill_ts = self.now.ts
+
+    def place(self, amount, price=None) -> Optional[SimOrder]:
+        amount = quantize_amount(min(to_decimal(amount), self.result.amount - self.committed()), self.rules)
+        if amount <= 0 or amount < self.rules.min_amount:
+            return None
+        order = SimOrder(to_decimal(price) if price is not None else None, amount, self.now.ts)
+        self.orders.append(order)
+        self.result.orders += 1
+        if order.price is None:
+            # Рыночный ордер: по текущему стакану, остаток сверх глубины отменяется биржей
+            self._take(order)
+            order.active = False
+        else:
+            self._match([order])
+        return order
+
+    def cancel(self, order: SimOrder) -> None:
+        order.active = False
+
+    def committed(self) -> Decimal:
+        """Объем, который уже исполнен или стоит в активных ордерах."""
+        return sum((o.filled if not o.active else o.amount for o in self.orders), Decimal("0"))
+
+    def _take(self, order: SimOrder) -> None:
+        """
+        Исполняет ордер объемом bids текущего снимка, который еще не заняли наши ордера.
+        Лимитный ордер исполняется по своей цене и только уровнями не ниже нее.
+        """
+        depth = self.now.depth
+        if self.used_index != self.index:
+            self.used_index = self.index
+            self.used = [Decimal("0")] * len(depth.prices)
+        for i, price in enumerate(depth.prices):
+            if order.remaining <= 0 or (order.price is not None and price < order.price):
+                break
+            level_amount = depth.cum_amounts[i] - (depth.cum_amounts[i - 1] if i > 0 else 0)
+            take = min(order.remaining, level_amount - self.used[i])
+            if take > 0:
+                self.used[i] += take
+                self._record_fill(order, take, take * (order.price if order.price is not None else price))
+
+    def _match(self, orders: List[SimOrder]) -> None:
+        """Исполняет лимитные ордера (более дешевые первыми) ликвидностью текущего снимка."""
+        for order in sorted((o for o in orders if o.active and o.price is not None), key=lambda o: o.price):
+            self._take(order)
+            if order.remaining <= 0:
+                order.active = False
+
+    def advance(self) -> bool:
+        """Переходит к следующему снимку и исполняет стоящие ордера. False - снимки закончились."""
+        if self.index + 1 >= len(self.snapshots):
+            return False
+        self.index += 1
+        self._match(self.orders)
+        return True
+
+    def wait_until(self, ts: float) -> bool:
+        while self.now.ts < ts:
+            if not self.advance():
+                return False
+        return True
+
+    def active_orders(self) -> List[SimOrder]:
+        return [o for o in self.orders if o.active]
+
+
+def _price_of(snapshot: Snapshot) -> Decimal:
+    """Текущая цена как в get_ticker_price: last, иначе лучший bid."""
+    return snapshot.last if snapshot.last else snapshot.best_bid
+
+
+def run_strategy(strategy: str, snapshots: List[Snapshot], start: int, amount: Decimal,
+                 rules: SizingRules, params: Optional[dict] = None) -> RunResult:
+    """Проигрывает одну продажу стратегией strategy со снимка start."""
+    params = merge_params(params)
+    result = RunResult(strategy, snapshots[start].ts, quantize_amount(amount, rules),
+                       arrival_bid=snapshots[start].best_bid)
+    sim = FillSimulator(snapshots, start, rules, result)
+    horizon = snapshots[start].ts + params["horizon_seconds"]
+
+    if strategy == "market":
+        sim.place(result.amount)
+
+    elif strategy == "limit":
+        sim.place(result.amount, _price_of(sim.now) * to_decimal(params["limit"]["price_ratio"]))
+
+    elif strategy == "twap":
+        p = params["twap"]
+        interval = p["duration_minutes"] * 60 / p["chunks"]
+        chunk = result.amount / p["chunks"]
+        for i in range(p["chunks"]):
+            if i and not sim.wait_until(result.start_ts + interval * i):
+                break
+            sim.place(chunk if i < p["chunks"] - 1 else result.amount, _price_of(sim.now) * to_decimal(p["price_ratio"]))
+
+    elif strategy == "iceberg":
+        p = params["iceberg"]
+        slice_size = result.amount * to_decimal(p["visible_ratio"])
+        while result.filled < result.amount and sim.now.ts < horizon:
+            open_slices = [o for o in sim.active_orders() if o.filled / o.amount < to_decimal(p["refill_fill_ratio"])]
+            if len(open_slices) < p["max_open_slices"] and sim.committed() < result.amount:
+                if sim.place(slice_size, sim.now.best_bid):
+                    continue
+            for order in open_slices:
+                if sim.now.ts - order.placed_at > p["slice_timeout"]:
+                    sim.cancel(order)
+            if not sim.advance():
+                break
+
+    elif strategy == "adaptive":
+        p = params["adaptive"]
+        depth = sim.now.depth
+        remaining = result.amount
+        for i, price in enumerate(depth.prices[:p["max_price_levels"]]):
+            if remaining <= 0:
+                break
+            level_amount = depth.cum_amounts[i] - (depth.cum_amounts[i - 1] if i > 0 else 0)
+            order = sim.place(min(remaining, level_amount * to_decimal(p["liquidity_ratio"])), price)
+            if order:
+                remaining -= order.amount
+        if remaining > 0:
+            sim.place(remaining)
+
+    elif strategy == "vwap":
+        p = params["vwap"]
+        rows = [{"timestamp": datetime.fromtimestamp(s.ts).isoformat(), "volume": s.vol}
+                for s in snapshots[:start] if s.vol is not None]
+        schedule = schedule_slices(build_hourly_profile(rows), datetime.fromtimestamp(result.start_ts),
+                                   p["duration_minutes"], p["chunks"])
+        for i, (offset, share) in enumerate(schedule):
+            if i and not sim.wait_until(result.start_ts + offset):
+                break
+            size = result.amount * to_decimal(share) if i < len(schedule) - 1 else result.amount
+            sim.place(size, sim.now.best_bid)
+
+    else:
+        raise ValueError(f"Неизвестная стратегия: {strategy}")
+
+    # Ждем исполнения лимитных ордеров до горизонта
+    while sim.active_orders() and sim.now.ts < horizon and sim.advance():
+        pass
+    return result
+
+
+def pick_starts(snapshots: List[Snapshot], count: int, horizon_seconds: float) -> List[int]:
+    """Равномерно распределенные точки старта, после которых есть хотя бы horizon_seconds данных."""
+    if not snapshots:
+        return []
+    last_start_ts = snapshots[-1].ts - horizon_seconds
+    candidates = [i for i, s in enumerate(snapshots) if s.ts <= last_start_ts] or [0]
+    if count >= len(candidates):
+        return candidates
+    step = len(candidates) / count
+    return [candidates[int(i * step)] for i in range(count)]
+
+
+def backtest_pair(path: str, strategy: str, amount_usd: Optional[float], amount: Optional[float],
+                  amount_precision: int, starts: int, params: Optional[dict] = None) -> dict:
+    """Рабочая функция процесса: все старты одной пары (рынок, стратегия)."""
+    snapshots = load_snapshots(path)
+    market = Path(path).stem
+    rules = SizingRules.from_precision(amount_precision)
+    horizon = merge_params(params)["horizon_seconds"]
+    runs = []
+    for start in pick_starts(snapshots, starts, horizon):
+        size = to_decimal(amount) if amount else to_decimal(amount_usd) / snapshots[start].best_bid
+        runs.append(run_strategy(strategy, snapshots, start, size, rules, params))
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return statistics.fmean(values) if values else None
+
+    def median(values):
+        values = [v for v in values if v is not None]
+        return statistics.median(values) if values else None
+
+    return {
+        "market": market,
+        "strategy": strategy,
+        "runs": len(runs),
+        "avg_price": mean(r.avg_price for r in runs),
+        "slippage_bps_mean": mean(r.slippage_bps for r in runs),
+        "slippage_bps_median": median(r.slippage_bps for r in runs),
+        "fill_ratio_mean": mean(r.fill_ratio for r in runs),
+        "completed_share": (sum(1 for r in runs if r.time_to_complete is not None) / len(runs)) if runs else None,
+        "time_to_complete_median": median(r.time_to_complete for r in runs),
+        "orders_mean": mean(r.orders for r in runs),
+    }
+
+
+def run_backtest(books_dir, strategies=None, amount_usd: Optional[float] = 500, amount: Optional[float] = None,
+                 amount_precision: int = 4, starts: int = 12, workers: Optional[int] = None,
+                 params: Optional[dict] = None) -> List[dict]:
+    """Запускает все пары (рынок, стратегия) в пуле процессов."""
+    strategies = strategies or STRATEGIES
+    books = sorted(Path(books_dir).glob("*.jsonl"))
+    jobs = [(str(path), strategy) for path in books for strategy in strategies]
+    if not jobs:
+        return []
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(backtest_pair, path, strategy, amount_usd, amount, amount_precision, starts, params)
+                   for path, strategy in jobs]
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"Ошибка бэктеста: {e}")
+    results.sort(key=lambda r: (r["market"], r["strategy"]))
+    return results
+
+
+def format_report(results: List[dict]) -> str:
+    def fmt(value, pattern):
+        return pattern.format(value) if value is not None else "-"
+
+    lines = [f"{'рынок':<12} {'стратегия':<10} {'прогонов':>8} {'ср. цена':>14} {'проск. bps':>11} "
+             f"{'исполнено':>10} {'заверш.':>8} {'время, с':>9}"]
+    for r in results:
+        lines.append(
+            f"{r['market']:<12} {r['strategy']:<10} {r['runs']:>8} {fmt(r['avg_price'], '{:.8f}'):>14} "
+            f"{fmt(r['slippage_bps_mean'], '{:.1f}'):>11} {fmt(r['fill_ratio_mean'], '{:.1%}'):>10} "
+            f"{fmt(r['completed_share'], '{:.0%}'):>8} {fmt(r['time_to_complete_median'], '{:.0f}'):>9}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бэктест стратегий продажи на записанных стаканах")
+    parser.add_argument("--books", default="data/books", help="Каталог с <market>.jsonl")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--amount-usd", type=float, default=500, help="Объем продажи в USD по цене старта")
+    parser.add_argument("--amount", type=float, default=None, help="Объем продажи в монетах (вместо --amount-usd)")
+    parser.add_argument("--amount-precision", type=int, default=4)
+    parser.add_argument("--starts", type=int, default=12, help="Сколько точек старта на пару")
+    parser.add_argument("--horizon", type=float, default=DEFAULT_PARAMS["horizon_seconds"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", help="Сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    started = time.time()
+    results = run_backtest(
+        args.books, [s.strip() for s in args.strategies.split(",") if s.strip()],
+        amount_usd=args.amount_usd, amount=args.amount, amount_precision=args.amount_precision,
+        starts=args.starts, workers=args.workers, params={"horizon_seconds": args.horizon}
+    )
+    print(format_report(results))
+    print(f"\nГотово за {time.time() - started:.1f} с")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
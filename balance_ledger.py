@@ -0,0 +1,133 @@
+"""
+Локальный учет доступных и заблокированных средств SafeTrade.
+
+Снимок балансов биржи (поля balance и locked) дополняется резервами под
+ордера, которые мы выставили после снимка. Так точный продаваемый объем
+известен до отправки ордера, без повторов на 99% / 95% / 90% баланса
+после ошибки insufficient_balance.
+
+Резервы живут до следующего снимка: биржа к этому моменту уже учитывает
+выставленные ордера в поле locked.
+"""
+
+import logging
+import time
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from order_sizing import SizingRules, quantize_amount, to_decimal
+
+
+class BalanceLedger:
+    """Потокобезопасный учет доступных/заблокированных средств по валютам."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.available: Dict[str, Decimal] = {}
+        self.locked: Dict[str, Decimal] = {}
+        # order_id -> {"currency", "amount", "created_at"}
+        self.reservations: Dict[str, dict] = {}
+        self.snapshot_at: Optional[float] = None
+
+    def update_from_balances(self, balances: Iterable[dict], taken_at: Optional[float] = None) -> None:
+        """
+        Принимает ответ /account/balances (список {currency, balance, locked}).
+        Резервы, созданные до запроса снимка, снимаются - биржа уже учла их в locked.
+        """
+        taken_at = taken_at if taken_at is not None else time.time()
+        available, locked = {}, {}
+        for item in balances or []:
+            currency = str(item.get('currency', '')).upper()
+            if not currency:
+                continue
+            available[currency] = to_decimal(item.get('balance') or 0)
+            locked[currency] = to_decimal(item.get('locked') or 0)
+
+        with self.lock:
+            self.available = available
+            self.locked = locked
+            self.snapshot_at = taken_at
+            self.reservations = {
+                order_id: reservation for order_id, reservation in self.reservations.items()
+                if reservation["created_at"] > taken_at
+            }
+
+    def update_currency(self, currency: str, balance, locked, taken_at: Optional[float] = None) -> None:
+        """
+        Обновляет одну валюту (событие balance приватного потока).
+        Резервы этой валюты, созданные до события, снимаются.
+        """
+        currency = str(currency).upper()
+        taken_at = taken_at if taken_at is not None else time.time()
+        with self.lock:
+            self.available[currency] = to_decimal(balance or 0)
+            self.locked[currency] = to_decimal(locked or 0)
+            self.reservations = {
+                order_id: reservation for order_id, reservation in self.reservations.items()
+                if reservation["currency"] != currency or reservation["created_at"] > taken_at
+            }
+
+    def has_snapshot(self) -> bool:
+        return self.snapshot_at is not None
+
+    def _reserved(self, currency: str) -> Decimal:
+        """Сумма локальных резервов по валюте. Вызывается под self.lock."""
+        return sum(
+            (r["amount"] for r in self.reservations.values() if r["currency"] == currency),
+            Decimal("0")
+        )
+
+    def get_available(self, currency: str) -> Decimal:
+        """Свободный остаток: доступно по снимку минус наши резервы после снимка."""
+        currency = currency.upper()
+        with self.lock:
+            free = self.available.get(currency, Decimal("0")) - self._reserved(currency)
+        return max(free, Decimal("0"))
+
+    def get_locked(self, currency: str) -> Decimal:
+        """Заблокировано в ордерах: по снимку плюс наши резервы после снимка."""
+        currency = currency.upper()
+        with self.lock:
+            return self.locked.get(currency, Decimal("0")) + self._reserved(currency)
+
+    def sellable(self, currency: str, rules: SizingRules, requested=None) -> Decimal:
+        """
+        Точный объем для продажи: свободный остаток (или requested, если он меньше),
+        округленный вниз до шага рынка. 0, если объем меньше min_amount.
+        """
+        amount = self.get_available(currency)
+        if requested is not None:
+            amount = min(amount, to_decimal(requested))
+        amount = quantize_amount(amount, rules)
+        if amount <= 0 or amount < rules.min_amount:
+            return Decimal("0")
+        return amount
+
+    def reserve(self, currency: str, amount, order_id=None) -> str:
+        """Резервирует объем под выставленный ордер. Возвращает ключ резерва."""
+        key = str(order_id) if order_id is not None else f"local-{time.time_ns()}"
+        with self.lock:
+            self.reservations[key] = {
+                "currency": currency.upper(),
+                "amount": to_decimal(amount),
+                "created_at": time.time()
+            }
+        return key
+
+    def release(self, order_id, filled_amount=0) -> None:
+        """
+        Снимает резерв отмененного ордера. Исполненная часть остается списанной
+        до следующего снимка балансов.
+        """
+        key = str(order_id)
+        with self.lock:
+            reservation = self.reservations.get(key)
+            if not reservation:
+                return
+            filled = max(to_decimal(filled_amount), Decimal("0"))
+            if filled > 0:
+                reservation["amount"] = min(filled, reservation["amount"])
+            else:
+                self.reservations.pop(key, None)
+        logging.debug(f"Резерв {key} снят, исполнено {filled_amount}")
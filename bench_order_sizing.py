@@ -0,0 +1,61 @@
+"""
+Сравнение старого расчета объема (float) и нового (order_sizing на Decimal).
+
+Считает, сколько объемов float-путь отдает в API с артефактами (экспонента,
+хвосты 0.30000000000000004, объем больше баланса), и сколько стоит каждый путь по времени.
+
+Запуск: python bench_order_sizing.py [количество]
+"""
+import math
+import random
+import sys
+import time
+from decimal import Decimal
+
+from order_sizing import format_decimal, quantize_to_step, step_from_precision
+
+
+def float_path(amount, precision):
+    """Старый расчет из main.py: floor на float и str() для API."""
+    rounded = math.floor(amount * 10**precision) / 10**precision
+    return str(rounded)
+
+
+def decimal_path(amount, precision):
+    """Новый расчет: Decimal и каноническая строка."""
+    return format_decimal(quantize_to_step(amount, step_from_precision(precision)))
+
+
+def is_artifact(text, amount, precision):
+    """Строка, которую биржа отклонит или которая продает больше баланса."""
+    if "e" in text.lower():
+        return True
+    decimals = text.split(".")[1] if "." in text else ""
+    if len(decimals.rstrip("0")) > precision:
+        return True
+    return Decimal(text) > Decimal(repr(amount))
+
+
+def run(count=100000, seed=1):
+    rng = random.Random(seed)
+    samples = [(rng.uniform(0, 10 ** rng.randint(-6, 6)), rng.choice([0, 2, 4, 6, 8])) for _ in range(count)]
+
+    results = {}
+    for name, func in (("float", float_path), ("decimal", decimal_path)):
+        start = time.perf_counter()
+        outputs = [func(amount, precision) for amount, precision in samples]
+        elapsed = time.perf_counter() - start
+        artifacts = sum(
+            1 for text, (amount, precision) in zip(outputs, samples) if is_artifact(text, amount, precision)
+        )
+        results[name] = {"seconds": elapsed, "artifacts": artifacts}
+
+    print(f"Объемов: {count}")
+    for name, stats in results.items():
+        per_call = stats["seconds"] / count * 1e6
+        print(f"  {name:8s} {stats['seconds']:.3f} с ({per_call:.2f} мкс/объем), артефактов: {stats['artifacts']}")
+    return results
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
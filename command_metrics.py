@@ -0,0 +1,82 @@
+"""
+Задержка выполнения команд Telegram-бота.
+
+Обработчики выполняются в пуле потоков telebot (telegram.num_threads), и
+медленная команда одного пользователя не задерживает остальных. Здесь
+считается, сколько занимает каждая команда: последние window замеров на
+команду хранятся в памяти для /health, а каждый замер дополнительно
+передается в sink (например, в таблицу метрик производительности).
+"""
+
+import functools
+import logging
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+
+class CommandMetrics:
+    def __init__(self, window: int = 200, slow_threshold: float = 10.0,
+                 sink: Optional[Callable[[str, float, bool], None]] = None, clock=time.monotonic):
+        self.window = window
+        self.slow_threshold = slow_threshold  # Команды дольше этого (сек) пишутся в лог
+        self.sink = sink
+        self.clock = clock
+        self.lock = Lock()
+        self.latencies: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, command: str, seconds: float, ok: bool = True):
+        with self.lock:
+            self.latencies.setdefault(command, deque(maxlen=self.window)).append(seconds)
+            self.counts[command] = self.counts.get(command, 0) + 1
+            if not ok:
+                self.errors[command] = self.errors.get(command, 0) + 1
+        if seconds > self.slow_threshold:
+            logging.warning(f"Команда {command} выполнялась {seconds:.1f} сек")
+        if self.sink:
+            try:
+                self.sink(command, seconds, ok)
+            except Exception as e:
+                logging.debug(f"Не удалось сохранить метрику команды {command}: {e}")
+
+    def wrap(self, command: str, handler: Callable) -> Callable:
+        """Обработчик, замеряющий собственное время выполнения"""
+        @functools.wraps(handler)
+        def timed(*args, **kwargs):
+            started = self.clock()
+            ok = False
+            try:
+                result = handler(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self.record(command, self.clock() - started, ok)
+        return timed
+
+    def snapshot(self) -> Dict[str, dict]:
+        """{команда: {count, errors, avg, p50, p95, max}} по последним window замерам"""
+        with self.lock:
+            samples = {command: sorted(values) for command, values in self.latencies.items()}
+            counts, errors = dict(self.counts), dict(self.errors)
+        stats = {}
+        for command, values in samples.items():
+            stats[command] = {
+                'count': counts[command],
+                'errors': errors.get(command, 0),
+                'avg': sum(values) / len(values),
+                'p50': values[(len(values) - 1) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+            }
+        return stats
+
+    def summary(self, limit: int = 10) -> str:
+        """Самые медленные команды по p95 для сообщения в Telegram"""
+        stats = sorted(self.snapshot().items(), key=lambda item: item[1]['p95'], reverse=True)
+        return "\n".join(
+            f"/{command}: {s['count']} шт., p50 {s['p50']:.2f}с, p95 {s['p95']:.2f}с, ошибок {s['errors']}"
+            for command, s in stats[:limit]
+        )
@@ -10,22 +10,24 @@
 -- =====================================================
 
 -- Таблица для хранения исторических данных о ценах
+-- (секционирована по месяцам, первичный ключ включает ключ секционирования)
 CREATE TABLE IF NOT EXISTS safetrade_price_history (
-    id SERIAL PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    id SERIAL,
+    timestamp TIMESTAMPTZ NOT NULL,
     symbol TEXT NOT NULL,
     price NUMERIC NOT NULL,
     volume NUMERIC,
     high NUMERIC,
     low NUMERIC,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
 
--- Таблица для хранения истории ордеров
+-- Таблица для хранения истории ордеров (секционирована по месяцам)
 CREATE TABLE IF NOT EXISTS safetrade_order_history (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     order_id TEXT NOT NULL,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     symbol TEXT NOT NULL,
     side TEXT NOT NULL,
     order_type TEXT NOT NULL,
@@ -33,75 +35,91 @@ CREATE TABLE IF NOT EXISTS safetrade_order_history (
     price NUMERIC,
     total NUMERIC,
     status TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Секции по месяцам создает safetrade_ensure_partitions (supabase_setup.sql),
+-- ее вызывает плановая свертка истории цен на два месяца вперед
 
 -- Таблица для хранения решений ИИ
 CREATE TABLE IF NOT EXISTS safetrade_ai_decisions (
     id SERIAL PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     decision_type TEXT NOT NULL,
     decision_data TEXT NOT NULL,
     market_data TEXT,
     reasoning TEXT,
     confidence NUMERIC,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Таблица для хранения торговых пар
 CREATE TABLE IF NOT EXISTS safetrade_trading_pairs (
     id SERIAL PRIMARY KEY,
-    symbol TEXT NOT NULL UNIQUE,
+    symbol TEXT NOT NULL,
     base_currency TEXT NOT NULL,
     quote_currency TEXT NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
-    last_updated TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    last_updated TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Таблица для метрик производительности
 CREATE TABLE IF NOT EXISTS safetrade_performance_metrics (
     id SERIAL PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     metric_type TEXT NOT NULL,
     metric_name TEXT NOT NULL,
     value NUMERIC NOT NULL,
     metadata TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
 -- =====================================================
 -- Индексы для улучшения производительности
 -- =====================================================
 
--- Индекс для быстрого поиска по символу и времени в истории цен
-CREATE INDEX IF NOT EXISTS idx_safetrade_price_history_symbol_timestamp 
+-- Уникальный ключ истории цен (дубликаты запрещены схемой, запись - upsert)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_price_history_symbol_timestamp
 ON safetrade_price_history(symbol, timestamp);
 
+-- BRIN-индексы по времени: компактны и подходят для диапазонных выборок по времени
+CREATE INDEX IF NOT EXISTS idx_safetrade_price_history_timestamp_brin
+ON safetrade_price_history USING BRIN (timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_timestamp_brin
+ON safetrade_order_history USING BRIN (timestamp);
+
 -- Индекс для быстрого поиска по ID ордера
 CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_order_id 
 ON safetrade_order_history(order_id);
 
+-- Уникальный ключ строки ордера (секционированная таблица: ключ включает timestamp;
+-- бот пишет в timestamp время создания ордера на бирже, поэтому ключ один на order_id)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_order_history_order_id_timestamp
+ON safetrade_order_history(order_id, timestamp);
+
 -- Индекс для быстрого поиска по символу и времени в истории ордеров
 CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_symbol_timestamp 
 ON safetrade_order_history(symbol, timestamp);
 
--- Индекс для быстрого поиска по типу решения и времени в решениях ИИ
-CREATE INDEX IF NOT EXISTS idx_safetrade_ai_decisions_decision_type_timestamp 
+-- Уникальный ключ решений ИИ
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_ai_decisions_type_timestamp
 ON safetrade_ai_decisions(decision_type, timestamp);
 
--- Индекс для быстрого поиска по символу торговой пары
-CREATE INDEX IF NOT EXISTS idx_safetrade_trading_pairs_symbol 
+-- Уникальность торговой пары (upsert по symbol)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_trading_pairs_symbol
 ON safetrade_trading_pairs(symbol);
 
 -- Индекс для быстрого поиска по базовой валюте
 CREATE INDEX IF NOT EXISTS idx_safetrade_trading_pairs_base_currency 
 ON safetrade_trading_pairs(base_currency);
 
--- Индекс для быстрого поиска по типу метрики и времени
-CREATE INDEX IF NOT EXISTS idx_safetrade_performance_metrics_metric_type_timestamp 
-ON safetrade_performance_metrics(metric_type, timestamp);
+-- Уникальный ключ метрик
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_performance_metrics_key
+ON safetrade_performance_metrics(metric_type, metric_name, timestamp);
 
 -- =====================================================
 -- Комментарии к таблицам
@@ -109,7 +127,7 @@ ON safetrade_performance_metrics(metric_type, timestamp);
 
 /*
 safetrade_price_history - хранит исторические данные о ценах криптовалют
-- timestamp: время получения цены (TEXT для совместимости)
+- timestamp: время получения цены (TIMESTAMPTZ, пишется в UTC)
 - symbol: символ торговой пары (например, BTCUSDT)
 - price: текущая цена (NUMERIC для точности)
 - volume: объем торгов (NUMERIC для точности)
@@ -152,6 +170,8 @@ safetrade_performance_metrics - хранит метрики производит
 ПРИМЕЧАНИЕ: Схема оптимизирована для Supabase (PostgreSQL)
 - SERIAL для автоинкремента
 - NUMERIC для точных числовых значений
-- TIMESTAMP для временных меток
+- TIMESTAMPTZ для временных меток (старые TEXT-схемы переводит supabase_migrate_timestamptz.sql
+  и команда python main.py migrate)
+- помесячное секционирование истории цен и ордеров
 - BOOLEAN для логических значений
 */
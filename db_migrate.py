@@ -0,0 +1,52 @@
+"""
+Перевод схемы Supabase на timestamptz и помесячные секции.
+
+Функции миграции определены в supabase_migrate_timestamptz.sql (файл один раз
+выполняется в SQL-редакторе Supabase), а здесь они вызываются через RPC:
+
+1. safetrade_migrate_prepare - текстовые таблицы переименовываются в *_legacy,
+   создаются секционированные таблицы, история ордеров и небольшие таблицы
+   конвертируются сразу;
+2. safetrade_migrate_chunk - история цен переносится пачками по batch_size
+   строк, каждая пачка - отдельная транзакция;
+3. safetrade_migrate_finish - удаляются опустевшие legacy-таблицы.
+
+Каждый шаг идемпотентен: после сбоя команду можно просто запустить снова.
+"""
+
+import logging
+import time
+from typing import Callable, Optional
+
+
+def run_timestamptz_migration(rpc: Callable[[str, dict], object], source_tz: str = 'UTC',
+                              batch_size: int = 5000, pause: float = 0.0,
+                              max_chunks: Optional[int] = None, sleep=time.sleep) -> dict:
+    """
+    rpc(name, params) - вызов функции Supabase, возвращает ее результат.
+    pause - пауза между пачками, чтобы перенос не мешал рабочей нагрузке.
+    max_chunks - ограничить число пачек за запуск (остальное - при следующем).
+    """
+    report = {'prepare': rpc('safetrade_migrate_prepare', {'source_tz': source_tz}),
+              'moved': 0, 'chunks': 0, 'finish': None}
+    logging.info(f"Миграция timestamptz: {report['prepare']}")
+
+    started = time.monotonic()
+    while max_chunks is None or report['chunks'] < max_chunks:
+        moved = rpc('safetrade_migrate_chunk', {'batch_size': batch_size, 'source_tz': source_tz}) or 0
+        report['chunks'] += 1
+        if not moved:
+            break
+        report['moved'] += moved
+        if report['chunks'] % 20 == 0:
+            rate = report['moved'] / max(time.monotonic() - started, 1e-9)
+            logging.info(f"Миграция timestamptz: перенесено {report['moved']} строк истории цен ({rate:.0f} строк/сек)")
+        if pause:
+            sleep(pause)
+    else:
+        logging.info(f"Миграция timestamptz: достигнут лимит {max_chunks} пачек, продолжение при следующем запуске")
+        return report
+
+    report['finish'] = rpc('safetrade_migrate_finish', {})
+    logging.info(f"Миграция timestamptz завершена: перенесено {report['moved']} строк, {report['finish']}")
+    return report
@@ -0,0 +1,43 @@
+"""
+Временные метки для базы данных.
+
+Раньше в колонки timestamp писалось datetime.now().isoformat() - наивное
+локальное время хоста без часового пояса. Теперь в базу (Supabase с
+timestamptz и локальное хранилище) пишется время UTC с явным смещением, а при
+чтении оно переводится обратно в локальное наивное время, с которым работает
+остальной код. Старые наивные строки считаются локальным временем хоста.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def parse_db_timestamp(value) -> Optional[datetime]:
+    """datetime (с часовым поясом, если он был в значении) из строки ISO, числа Unix или datetime."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00").replace(" ", "T", 1))
+    except ValueError:
+        return None
+
+
+def to_utc_iso(value=None) -> Optional[str]:
+    """Метка для записи в базу: ISO-строка UTC со смещением (без аргумента - текущее время)."""
+    ts = datetime.now(timezone.utc) if value is None else parse_db_timestamp(value)
+    if ts is None:
+        return None
+    # Наивное время - локальное время хоста (так писал datetime.now().isoformat())
+    return ts.astimezone(timezone.utc).isoformat()
+
+
+def to_local(value) -> Optional[datetime]:
+    """Метка из базы в локальном наивном времени."""
+    ts = parse_db_timestamp(value)
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone().replace(tzinfo=None)
@@ -0,0 +1,251 @@
+"""
+Асинхронная очередь записи в базу для пути исполнения ордеров.
+
+insert_order_history и update_order_status раньше выполняли HTTP-запрос к
+Supabase прямо между ответом биржи и следующим действием. Теперь они только
+ставят запись в очередь, а фоновый поток:
+
+- вставляет строки пачками (один insert на таблицу за проход);
+- схлопывает повторные обновления статуса одного order_id до последнего;
+- при ошибке повторяет с экспоненциальной задержкой;
+- если база недоступна несколько проходов подряд или при остановке,
+  сбрасывает очередь в JSONL-файл, который дочитывается при следующем запуске.
+
+Очередь используется только без локального хранилища (database.local_store.enabled:
+false). С хранилищем запись идет в SQLite, а в Supabase - через SupabaseSyncer
+(local_store.py), и JSONL-файл очереди не ведется.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DBWriteQueue:
+    """Очередь вставок и обновлений статусов ордеров с фоновой записью."""
+
+    def __init__(self, insert_rows: Callable[[str, List[dict]], object],
+                 update_status: Callable[[str, str], object],
+                 spill_path: Optional[Path] = None, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_backoff: float = 60, spill_after_failures: int = 3,
+                 max_pending: int = 10000, start: bool = True):
+        self.insert_rows = insert_rows
+        self.update_status = update_status
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.spill_after_failures = spill_after_failures
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.spill_lock = threading.Lock()
+        self.inserts: List[Tuple[str, dict]] = []
+        self.statuses: "OrderedDict[str, str]" = OrderedDict()
+        self.in_flight: List[dict] = []  # Пачки, которые сейчас пишутся flush() и уже не в очереди
+        self.failures = 0
+        self.stats = {"inserted": 0, "updated": 0, "coalesced": 0, "failed_flushes": 0, "spilled": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load_spill()
+        if start:
+            self.start()
+
+    # --- Постановка в очередь ---
+
+    def insert(self, table: str, row: dict) -> None:
+        with self.lock:
+            self.inserts.append((table, row))
+            size = len(self.inserts)
+        if size >= self.batch_size:
+            self._wake.set()
+
+    def set_status(self, order_id, status: str) -> None:
+        """Обновление статуса; предыдущее незаписанное обновление того же ордера заменяется."""
+        key = str(order_id)
+        with self.lock:
+            if key in self.statuses:
+                self.stats["coalesced"] += 1
+                self.statuses.pop(key)
+            self.statuses[key] = status
+
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.inserts) + len(self.statuses)
+
+    # --- Запись ---
+
+    def flush(self) -> bool:
+        """
+        Один проход записи. Статусы пишутся только после успешной вставки строк,
+        чтобы обновление не пришло раньше строки ордера. False - запись не удалась.
+        """
+        with self.lock:
+            inserts, self.inserts = self.inserts, []
+            statuses, self.statuses = self.statuses, OrderedDict()
+        if not inserts and not statuses:
+            return True
+
+        by_table: Dict[str, List[dict]] = {}
+        for table, row in inserts:
+            by_table.setdefault(table, []).append(row)
+        done_tables = set()
+        done_statuses = set()
+        flight = {"by_table": by_table, "statuses": statuses, "done_tables": done_tables, "done_statuses": done_statuses}
+        with self.lock:
+            self.in_flight.append(flight)
+        try:
+            for table, rows in by_table.items():
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = rows[start:start + self.batch_size]
+                    self.insert_rows(table, chunk)
+                    self.stats["inserted"] += len(chunk)
+                    # Вставленная часть не должна повторяться при ошибке в следующей пачке
+                    by_table[table] = rows[start + self.batch_size:]
+                done_tables.add(table)
+            for order_id, status in statuses.items():
+                self.update_status(order_id, status)
+                done_statuses.add(order_id)
+                self.stats["updated"] += 1
+        except Exception as e:
+            self.failures += 1
+            self.stats["failed_flushes"] += 1
+            logging.warning(f"Очередь записи в БД: ошибка записи ({self.failures} подряд): {e}")
+            self._land(flight)
+            self._requeue(*self._unwritten(flight))
+            if self.failures >= self.spill_after_failures or self.pending() > self.max_pending:
+                self.spill()
+            return False
+
+        self._land(flight)
+        self.failures = 0
+        if self.spill_path and self.spill_path.exists() and not self._stop.is_set():
+            # База снова доступна - дочитываем сброшенное на диск (кроме остановки: файл нужен следующему запуску)
+            self._load_spill()
+            self._wake.set()
+        return True
+
+    def _land(self, flight: dict) -> None:
+        """Пачка дописана или вернулась в очередь (могла быть уже сброшена на диск при остановке)"""
+        with self.lock:
+            self.in_flight = [f for f in self.in_flight if f is not flight]
+
+    @staticmethod
+    def _unwritten(flight: dict) -> Tuple[list, list]:
+        """Строки и статусы пачки, запись которых еще не подтверждена"""
+        return (
+            [(table, row) for table, rows in flight["by_table"].items()
+             if table not in flight["done_tables"] for row in rows],
+            [(order_id, status) for order_id, status in flight["statuses"].items()
+             if order_id not in flight["done_statuses"]]
+        )
+
+    def _requeue(self, inserts, statuses) -> None:
+        """Возвращает незаписанное в начало очереди (новые статусы важнее возвращаемых)."""
+        with self.lock:
+            self.inserts = list(inserts) + self.inserts
+            merged = OrderedDict(statuses)
+            for order_id, status in self.statuses.items():
+                merged.pop(order_id, None)
+                merged[order_id] = status
+            self.statuses = merged
+
+    # --- Диск ---
+
+    def spill(self, include_in_flight: bool = False) -> int:
+        """
+        Сбрасывает очередь в файл (без сети). Возвращает число записей.
+        include_in_flight - сохранить и пачки, зависшие в flush() (при остановке).
+        """
+        if not self.spill_path:
+            return 0
+        with self.lock:
+            inserts, self.inserts = self.inserts, []
+            statuses, self.statuses = self.statuses, OrderedDict()
+            if include_in_flight:
+                # Сначала старые (зависшие) записи; статус из очереди новее статуса из пачки
+                merged = OrderedDict()
+                for flight in self.in_flight:
+                    flight_inserts, flight_statuses = self._unwritten(flight)
+                    inserts = flight_inserts + inserts
+                    merged.update(flight_statuses)
+                for order_id, status in statuses.items():
+                    merged.pop(order_id, None)
+                    merged[order_id] = status
+                statuses = merged
+                self.in_flight = []
+        count = len(inserts) + len(statuses)
+        if not count:
+            return 0
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+            for table, row in inserts:
+                f.write(json.dumps({"op": "insert", "table": table, "row": row}, ensure_ascii=False, default=str) + "\n")
+            for order_id, status in statuses.items():
+                f.write(json.dumps({"op": "status", "order_id": order_id, "status": status}) + "\n")
+        self.stats["spilled"] += count
+        logging.warning(f"Очередь записи в БД: {count} записей сохранено в {self.spill_path}")
+        return count
+
+    def _load_spill(self) -> None:
+        """Возвращает в очередь записи, сохраненные на диск при прошлой остановке или сбое базы."""
+        if not self.spill_path:
+            return
+        inserts, statuses = [], OrderedDict()
+        with self.spill_lock:
+            if not self.spill_path.exists():
+                return
+            with open(self.spill_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("op") == "insert":
+                        inserts.append((entry["table"], entry["row"]))
+                    elif entry.get("op") == "status":
+                        statuses.pop(entry["order_id"], None)
+                        statuses[entry["order_id"]] = entry["status"]
+            self.spill_path.unlink()
+        # Сохраненное на диск старше текущей очереди
+        self._requeue(inserts, statuses.items())
+        loaded = len(inserts) + len(statuses)
+        logging.info(f"Очередь записи в БД: загружено {loaded} отложенных записей")
+
+    # --- Фоновый поток ---
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-write-queue", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if not self.flush():
+                # Повтор с экспоненциальной задержкой
+                self._stop.wait(min(self.flush_interval * 2 ** self.failures, self.max_backoff))
+
+    def close(self, timeout: float = 2) -> None:
+        """Останавливает поток, пробует записать остаток за timeout секунд, остальное - на диск."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self.pending():
+            writer = threading.Thread(target=self.flush, daemon=True)
+            writer.start()
+            writer.join(timeout)
+        with self.lock:
+            unfinished = bool(self.inserts or self.statuses or self.in_flight)
+        if unfinished:
+            # Запись зависла на сети или не удалась: на диск уходят и очередь, и незавершенные пачки
+            self.spill(include_in_flight=True)
@@ -0,0 +1,135 @@
+"""
+Размер частей рыночной продажи по глубине стакана.
+
+Вместо деления баланса на 2/3/5 равных частей по количеству монет
+объем части выбирается так, чтобы ее проскальзывание (отклонение средней
+цены исполнения от лучшего bid) не превышало бюджета impact_budget.
+Накопленные объемы и выручка по уровням стакана считаются один раз
+(itertools.accumulate), а граница части ищется бинарным поиском (bisect).
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_CEILING
+from itertools import accumulate
+from typing import List, Optional, Sequence, Tuple
+
+from order_sizing import SizingRules, quantize_amount, quantize_to_step, to_decimal
+
+
+@dataclass
+class BookDepth:
+    """Стакан bids в накопленном виде: лучшие цены первыми."""
+    prices: List[Decimal]
+    cum_amounts: List[Decimal]   # Объем уровней 0..i включительно
+    cum_values: List[Decimal]    # Выручка (цена * объем) уровней 0..i включительно
+
+    @classmethod
+    def from_bids(cls, bids: Sequence[Tuple[Decimal, Decimal]]) -> "BookDepth":
+        levels = sorted(((to_decimal(p), to_decimal(a)) for p, a in bids if to_decimal(a) > 0),
+                        key=lambda level: level[0], reverse=True)
+        prices = [p for p, _ in levels]
+        return cls(
+            prices=prices,
+            cum_amounts=list(accumulate(a for _, a in levels)),
+            cum_values=list(accumulate(p * a for p, a in levels)),
+        )
+
+    @property
+    def best_bid(self) -> Decimal:
+        return self.prices[0] if self.prices else Decimal("0")
+
+    @property
+    def total_amount(self) -> Decimal:
+        return self.cum_amounts[-1] if self.cum_amounts else Decimal("0")
+
+    def fill_value(self, amount) -> Decimal:
+        """Выручка рыночной продажи amount (без учета объема сверх стакана)."""
+        amount = min(to_decimal(amount), self.total_amount)
+        if amount <= 0:
+            return Decimal("0")
+        i = bisect_left(self.cum_amounts, amount)
+        before_amount = self.cum_amounts[i - 1] if i > 0 else Decimal("0")
+        before_value = self.cum_values[i - 1] if i > 0 else Decimal("0")
+        return before_value + (amount - before_amount) * self.prices[i]
+
+    def impact(self, amount) -> Optional[Decimal]:
+        """
+        Проскальзывание продажи amount: 1 - средняя цена / лучший bid.
+        None, если стакана не хватает на весь объем.
+        """
+        amount = to_decimal(amount)
+        if amount <= 0:
+            return Decimal("0")
+        if amount > self.total_amount or self.best_bid <= 0:
+            return None
+        return 1 - self.fill_value(amount) / amount / self.best_bid
+
+    def max_amount_within(self, impact_budget) -> Decimal:
+        """Наибольший объем, проскальзывание которого не превышает impact_budget."""
+        budget = to_decimal(impact_budget)
+        if not self.prices:
+            return Decimal("0")
+        # Проскальзывание монотонно растет с объемом: ищем последний уровень в бюджете
+        best = self.best_bid
+        limit = Decimal("0")
+        for i, price in enumerate(self.prices):
+            if 1 - self.cum_values[i] / self.cum_amounts[i] / best > budget:
+                # Часть этого уровня: решаем value(x) >= (1 - budget) * best * x
+                before_amount = self.cum_amounts[i - 1] if i > 0 else Decimal("0")
+                before_value = self.cum_values[i - 1] if i > 0 else Decimal("0")
+                target = (1 - budget) * best
+                if price < target:
+                    extra = (before_value - target * before_amount) / (target - price)
+                    limit = before_amount + max(extra, Decimal("0"))
+                else:
+                    limit = self.cum_amounts[i]
+                return limit
+            limit = self.cum_amounts[i]
+        return limit
+
+
+def plan_slices(total, depth: BookDepth, rules: SizingRules, impact_budget,
+                max_slices: int = 10) -> List[Decimal]:
+    """
+    Делит total на части, каждая из которых укладывается в бюджет проскальзывания
+    по текущему стакану (стакан считается восстановившимся к следующей части).
+    Части выровнены по шагу рынка, сумма равна округленному total.
+    Если бюджет требует больше max_slices частей, частей будет max_slices.
+    """
+    total = quantize_amount(total, rules)
+    if total <= 0:
+        return []
+    capacity = quantize_amount(depth.max_amount_within(impact_budget), rules)
+    min_slice = max(rules.min_amount, rules.amount_step)
+    if capacity < min_slice:
+        capacity = min_slice
+
+    count = int((total / capacity).to_integral_value(rounding=ROUND_CEILING))
+    count = max(1, min(count, max(1, int(max_slices))))
+    # Частей меньше min_amount быть не должно
+    while count > 1 and quantize_to_step(total / count, rules.amount_step) < min_slice:
+        count -= 1
+    if count == 1:
+        return [total]
+
+    size = quantize_to_step(total / count, rules.amount_step)
+    sizes = [size] * (count - 1)
+    sizes.append(total - size * (count - 1))
+    return sizes
+
+
+def next_slice(remaining, depth: BookDepth, rules: SizingRules, impact_budget,
+               slices_left: int = 10) -> Decimal:
+    """
+    Размер следующей части по свежему стакану. Остаток меньше min_amount
+    присоединяется к части, чтобы не оставлять непродаваемый хвост.
+    """
+    plan = plan_slices(remaining, depth, rules, impact_budget, max_slices=slices_left)
+    if not plan:
+        return Decimal("0")
+    size = plan[0]
+    leftover = quantize_amount(remaining, rules) - size
+    if 0 < leftover < max(rules.min_amount, rules.amount_step):
+        size += leftover
+    return size
@@ -0,0 +1,613 @@
+"""
+Локальный симулятор биржи SafeTrade для офлайн-тестов и замеров задержек.
+
+Отвечает на те же REST-маршруты API v2, что использует бот:
+    /trade/public/markets, /trade/public/tickers/{sym}, /public/markets/{sym}/tickers,
+    /public/markets/{sym}/order-book, /trade/account/balances,
+    /trade/market/orders (GET/POST), /trade/market/orders/{id}, /trade/market/orders/{id}/cancel,
+    /trade/market/trades
+и содержит простой движок сопоставления в памяти: синтетический стакан вокруг
+случайно блуждающей цены, который истощается нашими сделками и восстанавливается
+со временем. Ошибки биржи воспроизводятся с теми же кодами
+(market.order.non_round_amount, market.account.insufficient_balance и т.д.).
+
+Задержка, доля ошибок 500 и ответы 429 настраиваются.
+
+Использование:
+    python exchange_simulator.py --port 5055 --latency-ms 80 --error-rate 0.02 --rate-limit-rps 10
+    SAFETRADE_BASE_URL=http://127.0.0.1:5055/api/v2 python main.py
+
+Конфигурация рынков и стартовых балансов - JSON файл (--config), см. DEFAULT_SIM_CONFIG.
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_FLOOR
+from threading import Lock
+from typing import Dict, List, Optional
+
+from order_sizing import format_decimal, step_from_precision, to_decimal
+
+DEFAULT_SIM_CONFIG = {
+    "markets": {
+        "nockusdt": {"price": "0.05", "amount_precision": 4, "price_precision": 6,
+                     "min_amount": "0.01", "liquidity_usd": 300, "volatility": 0.0005},
+        "btcusdt": {"price": "60000", "amount_precision": 6, "price_precision": 2,
+                    "min_amount": "0.00001", "liquidity_usd": 50000, "volatility": 0.0002},
+        "qtcusdt": {"price": "1.2", "amount_precision": 2, "price_precision": 4,
+                    "min_amount": "1", "liquidity_usd": 500, "volatility": 0.001},
+    },
+    "balances": {"usdt": "0", "nock": "177.83966849", "btc": "0.0123", "qtc": "250.5"},
+    "fee": "0.002",
+    "spread": "0.004",          # Спред между лучшими bid и ask
+    "level_step": "0.002",      # Шаг цены между уровнями стакана
+    "depth_levels": 20,
+    "replenish_half_life": 30   # За сколько секунд восстанавливается половина съеденной ликвидности
+}
+
+
+class SimulatorError(Exception):
+    """Ошибка в формате биржи: {"errors": [code]} с HTTP статусом."""
+
+    def __init__(self, code: str, status: int = 422):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _decimals(value: Decimal) -> int:
+    exponent = value.normalize().as_tuple().exponent
+    return max(-exponent, 0)
+
+
+class SimulatedExchange:
+    """Движок сопоставления в памяти. Все публичные методы потокобезопасны."""
+
+    def __init__(self, config: Optional[dict] = None, seed: Optional[int] = None, clock=time.time):
+        config = config or DEFAULT_SIM_CONFIG
+        self.config = config
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.lock = Lock()
+        self.fee = to_decimal(config.get("fee", "0.002"))
+        self.spread = to_decimal(config.get("spread", "0.004"))
+        self.level_step = to_decimal(config.get("level_step", "0.002"))
+        self.depth_levels = int(config.get("depth_levels", 20))
+        self.half_life = float(config.get("replenish_half_life", 30))
+
+        self.markets: Dict[str, dict] = {}
+        for market_id, spec in config["markets"].items():
+            base = market_id[:-4] if market_id.endswith("usdt") else market_id[:-3]
+            self.markets[market_id] = {
+                "id": market_id,
+                "base_unit": base,
+                "quote_unit": market_id[len(base):],
+                "amount_precision": int(spec.get("amount_precision", 4)),
+                "price_precision": int(spec.get("price_precision", 6)),
+                "min_amount": to_decimal(spec.get("min_amount", "0")),
+                "liquidity_usd": to_decimal(spec.get("liquidity_usd", 1000)),
+                "volatility": float(spec.get("volatility", 0.0005)),
+                "price": to_decimal(spec["price"]),
+                "open": to_decimal(spec["price"]),
+                "high": to_decimal(spec["price"]),
+                "low": to_decimal(spec["price"]),
+                "volume": Decimal("0"),
+                # Съеденная ликвидность по уровням: индекс -> объем
+                "consumed": {"bids": defaultdict(Decimal), "asks": defaultdict(Decimal)},
+                "last_tick": self.clock(),
+            }
+
+        self.balances: Dict[str, Dict[str, Decimal]] = {
+            currency.lower(): {"balance": to_decimal(amount), "locked": Decimal("0")}
+            for currency, amount in config.get("balances", {}).items()
+        }
+        self.orders: Dict[int, dict] = {}
+        self.trades: List[dict] = []
+        self.next_order_id = 1
+        self.next_trade_id = 1
+
+    # --- Рыночная модель ---
+
+    def _market(self, market_id: str) -> dict:
+        market = self.markets.get(str(market_id).lower())
+        if not market:
+            raise SimulatorError("market.market.doesnt_exist", 404)
+        return market
+
+    def _tick(self, market: dict) -> None:
+        """Сдвигает цену случайным блужданием и восстанавливает ликвидность стакана."""
+        now = self.clock()
+        dt = max(now - market["last_tick"], 0.0)
+        market["last_tick"] = now
+        if dt <= 0:
+            return
+        shock = self.rng.gauss(0, market["volatility"] * math.sqrt(dt))
+        price_step = step_from_precision(market["price_precision"])
+        new_price = (market["price"] * to_decimal(math.exp(shock))).quantize(price_step)
+        market["price"] = max(new_price, price_step)
+        market["high"] = max(market["high"], market["price"])
+        market["low"] = min(market["low"], market["price"])
+
+        decay = to_decimal(0.5 ** (dt / self.half_life)) if self.half_life > 0 else Decimal("0")
+        for side in ("bids", "asks"):
+            consumed = market["consumed"][side]
+            for level in list(consumed):
+                consumed[level] *= decay
+                if consumed[level] < step_from_precision(market["amount_precision"]):
+                    del consumed[level]
+        self._match_resting(market)
+
+    def _levels_indexed(self, market: dict, side: str):
+        """
+        Синтетический стакан: (индекс уровня, цена, объем) с учетом съеденной ликвидности.
+        Индекс нужен, чтобы учитывать съеденный объем по уровням.
+        """
+        price_step = step_from_precision(market["price_precision"])
+        amount_step = step_from_precision(market["amount_precision"])
+        for i in range(self.depth_levels):
+            offset = self.spread / 2 + self.level_step * i
+            if side == "bids":
+                price = (market["price"] * (1 - offset)).quantize(price_step, rounding=ROUND_FLOOR)
+            else:
+                price = (market["price"] * (1 + offset)).quantize(price_step)
+            if price <= 0:
+                break
+            # Дальние уровни глубже
+            usd = market["liquidity_usd"] * (1 + Decimal(i) / 4)
+            amount = (usd / price).quantize(amount_step, rounding=ROUND_FLOOR) - market["consumed"][side][i]
+            amount = amount.quantize(amount_step, rounding=ROUND_FLOOR)
+            if amount > 0:
+                yield i, price, amount
+
+    def _levels(self, market: dict, side: str) -> List[List[Decimal]]:
+        return [[price, amount] for _, price, amount in self._levels_indexed(market, side)]
+
+    def _consume(self, market: dict, side: str, amount: Decimal, limit_price: Optional[Decimal] = None):
+        """Проходит по уровням стакана и съедает объем. Возвращает [(цена, объем)] исполнений."""
+        fills = []
+        remaining = amount
+        for i, price, available in list(self._levels_indexed(market, side)):
+            if remaining <= 0:
+                break
+            if limit_price is not None:
+                if side == "bids" and price < limit_price:
+                    break
+                if side == "asks" and price > limit_price:
+                    break
+            take = min(remaining, available)
+            market["consumed"][side][i] += take
+            fills.append((price, take))
+            remaining -= take
+        return fills
+
+    # --- Балансы и исполнение ---
+
+    def _account(self, currency: str) -> Dict[str, Decimal]:
+        return self.balances.setdefault(currency.lower(), {"balance": Decimal("0"), "locked": Decimal("0")})
+
+    def _apply_fills(self, market: dict, order: dict, fills) -> None:
+        base = self._account(market["base_unit"])
+        quote = self._account(market["quote_unit"])
+        for price, amount in fills:
+            total = price * amount
+            if order["side"] == "sell":
+                base["locked"] -= amount
+                quote["balance"] += total * (1 - self.fee)
+            else:
+                quote["locked"] -= total
+                base["balance"] += amount * (1 - self.fee)
+            order["executed_volume"] += amount
+            order["remaining_volume"] -= amount
+            order["funds_received"] += total
+            order["trades_count"] += 1
+            market["volume"] += amount
+            self.trades.append({
+                "id": self.next_trade_id,
+                "price": format_decimal(price),
+                "amount": format_decimal(amount),
+                "total": format_decimal(total),
+                "market": market["id"],
+                "side": order["side"],
+                "order_id": order["id"],
+                "taker_type": order["side"],
+                "fee_currency": market["quote_unit"] if order["side"] == "sell" else market["base_unit"],
+                "fee": format_decimal(self.fee),
+                "fee_amount": format_decimal((total if order["side"] == "sell" else amount) * self.fee),
+                "created_at": _iso(self.clock()),
+            })
+            self.next_trade_id += 1
+        order["updated_at"] = self.clock()
+
+    def _release(self, market: dict, order: dict) -> None:
+        """Возвращает заблокированный остаток ордера на баланс."""
+        if order["side"] == "sell":
+            account = self._account(market["base_unit"])
+            amount = order["remaining_volume"]
+        else:
+            account = self._account(market["quote_unit"])
+            amount = order["locked_quote"] - order["funds_received"]
+        account["locked"] -= amount
+        account["balance"] += amount
+
+    def _match_resting(self, market: dict) -> None:
+        """Исполняет наши лимитные ордера, до цены которых дошел стакан."""
+        for order in self.orders.values():
+            if order["market"] != market["id"] or order["state"] != "wait":
+                continue
+            side = "bids" if order["side"] == "sell" else "asks"
+            fills = self._consume(market, side, order["remaining_volume"], order["price"])
+            if fills:
+                self._apply_fills(market, order, fills)
+            if order["remaining_volume"] <= 0:
+                order["state"] = "done"
+
+    def _validate(self, market: dict, amount: Decimal, price: Optional[Decimal]) -> None:
+        if amount <= 0:
+            raise SimulatorError("market.order.invalid_volume")
+        if _decimals(amount) > market["amount_precision"]:
+            raise SimulatorError("market.order.non_round_amount")
+        if price is not None and _decimals(price) > market["price_precision"]:
+            raise SimulatorError("market.order.non_round_price")
+        if amount < market["min_amount"]:
+            raise SimulatorError("market.order.invalid_volume_or_price")
+
+    def create_order(self, market_id: str, side: str, amount, ord_type: str = "market", price=None) -> dict:
+        with self.lock:
+            market = self._market(market_id)
+            self._tick(market)
+            if side not in ("sell", "buy"):
+                raise SimulatorError("market.order.invalid_side")
+            if ord_type not in ("market", "limit"):
+                raise SimulatorError("market.order.invalid_type")
+            try:
+                amount = Decimal(str(amount))
+                price = Decimal(str(price)) if price not in (None, "") else None
+            except Exception:
+                raise SimulatorError("market.order.invalid_volume_or_price")
+            if ord_type == "limit" and (price is None or price <= 0):
+                raise SimulatorError("market.order.invalid_price")
+            self._validate(market, amount, price)
+
+            book_side = "bids" if side == "sell" else "asks"
+            if side == "sell":
+                account = self._account(market["base_unit"])
+                required = amount
+            else:
+                account = self._account(market["quote_unit"])
+                if price is not None:
+                    required = price * amount
+                else:
+                    required = sum((p * a for p, a in self._preview(market, book_side, amount)), Decimal("0"))
+            if account["balance"] < required:
+                raise SimulatorError("market.account.insufficient_balance")
+            account["balance"] -= required
+            account["locked"] += required
+
+            now = self.clock()
+            order = {
+                "id": self.next_order_id,
+                "uuid": f"sim-{self.next_order_id}",
+                "market": market["id"],
+                "side": side,
+                "ord_type": ord_type,
+                "price": price,
+                "state": "wait",
+                "origin_volume": amount,
+                "remaining_volume": amount,
+                "executed_volume": Decimal("0"),
+                "funds_received": Decimal("0"),
+                "locked_quote": required if side == "buy" else Decimal("0"),
+                "trades_count": 0,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self.next_order_id += 1
+            self.orders[order["id"]] = order
+
+            fills = self._consume(market, book_side, amount, price)
+            if fills:
+                self._apply_fills(market, order, fills)
+            if order["remaining_volume"] <= 0:
+                order["state"] = "done"
+            elif ord_type == "market":
+                # Стакана не хватило - остаток рыночного ордера отменяется
+                self._release(market, order)
+                order["state"] = "cancel"
+            return self._render(order)
+
+    def _preview(self, market: dict, side: str, amount: Decimal):
+        remaining, fills = amount, []
+        for _, price, available in self._levels_indexed(market, side):
+            if remaining <= 0:
+                break
+            take = min(remaining, available)
+            fills.append((price, take))
+            remaining -= take
+        return fills
+
+    def cancel_order(self, order_id) -> dict:
+        with self.lock:
+            order = self.orders.get(int(order_id))
+            if not order:
+                raise SimulatorError("market.order.doesnt_exist", 404)
+            market = self._market(order["market"])
+            self._tick(market)
+            if order["state"] != "wait":
+                raise SimulatorError("market.order.invalid_state")
+            self._release(market, order)
+            order["state"] = "cancel"
+            order["updated_at"] = self.clock()
+            return self._render(order)
+
+    def _render(self, order: dict) -> dict:
+        """Ордер в формате SafeTrade (поля Peatio плюс amount/type/filled_amount, которые читает бот)."""
+        executed = order["executed_volume"]
+        avg_price = order["funds_received"] / executed if executed > 0 else Decimal("0")
+        return {
+            "id": order["id"],
+            "uuid": order["uuid"],
+            "market": order["market"],
+            "side": order["side"],
+            "ord_type": order["ord_type"],
+            "type": order["ord_type"],
+            "state": order["state"],
+            "price": format_decimal(order["price"]) if order["price"] is not None else None,
+            "avg_price": format_decimal(avg_price),
+            "origin_volume": format_decimal(order["origin_volume"]),
+            "remaining_volume": format_decimal(order["remaining_volume"]),
+            "executed_volume": format_decimal(executed),
+            "origin_amount": format_decimal(order["origin_volume"]),
+            "amount": format_decimal(order["origin_volume"]),
+            "filled_amount": format_decimal(executed),
+            "trades_count": order["trades_count"],
+            "created_at": _iso(order["created_at"]),
+            "updated_at": _iso(order["updated_at"]),
+        }
+
+    # --- Чтение состояния ---
+
+    def list_markets(self) -> List[dict]:
+        return [{
+            "id": m["id"],
+            "name": f"{m['base_unit'].upper()}/{m['quote_unit'].upper()}",
+            "base_unit": m["base_unit"],
+            "quote_unit": m["quote_unit"],
+            "state": "enabled",
+            "amount_precision": m["amount_precision"],
+            "price_precision": m["price_precision"],
+            "min_amount": format_decimal(m["min_amount"]),
+            "min_price": format_decimal(step_from_precision(m["price_precision"])),
+            "max_price": "0",
+        } for m in self.markets.values()]
+
+    def ticker(self, market_id: str) -> dict:
+        with self.lock:
+            market = self._market(market_id)
+            self._tick(market)
+            bids = self._levels(market, "bids")
+            asks = self._levels(market, "asks")
+            return {
+                "at": int(self.clock()),
+                "last": format_decimal(market["price"]),
+                "buy": format_decimal(bids[0][0]) if bids else "0",
+                "sell": format_decimal(asks[0][0]) if asks else "0",
+                "high": format_decimal(market["high"]),
+                "low": format_decimal(market["low"]),
+                "open": format_decimal(market["open"]),
+                "vol": format_decimal(market["volume"]),
+            }
+
+    def order_book(self, market_id: str, limit: Optional[int] = None) -> dict:
+        with self.lock:
+            market = self._market(market_id)
+            self._tick(market)
+            render = lambda levels: [[format_decimal(p), format_decimal(a)] for p, a in levels[:limit]]
+            return {"bids": render(self._levels(market, "bids")), "asks": render(self._levels(market, "asks"))}
+
+    def list_balances(self) -> List[dict]:
+        with self.lock:
+            for market in self.markets.values():
+                self._tick(market)
+            return [{"currency": currency, "balance": format_decimal(acc["balance"]),
+                     "locked": format_decimal(acc["locked"])} for currency, acc in self.balances.items()]
+
+    def get_order(self, order_id) -> dict:
+        with self.lock:
+            order = self.orders.get(int(order_id))
+            if not order:
+                raise SimulatorError("market.order.doesnt_exist", 404)
+            self._tick(self._market(order["market"]))
+            return self._render(order)
+
+    def list_orders(self, state: Optional[str] = None, market: Optional[str] = None,
+                    limit: int = 100, offset: int = 0) -> List[dict]:
+        with self.lock:
+            for m in self.markets.values():
+                self._tick(m)
+            orders = sorted(self.orders.values(), key=lambda o: o["id"], reverse=True)
+            if state:
+                orders = [o for o in orders if o["state"] == state]
+            if market:
+                orders = [o for o in orders if o["market"] == market.lower()]
+            return [self._render(o) for o in orders[offset:offset + limit]]
+
+    def list_trades(self, market: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[dict]:
+        with self.lock:
+            trades = list(reversed(self.trades))
+            if market:
+                trades = [t for t in trades if t["market"] == market.lower()]
+            return trades[offset:offset + limit]
+
+
+@dataclass
+class FaultConfig:
+    """Настройки деградации: задержка, ошибки 500 и ограничение частоты (429)."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0        # Доля ответов 500
+    throttle_rate: float = 0.0     # Доля случайных ответов 429
+    rate_limit_rps: float = 0.0    # Лимит запросов в секунду (token bucket), 0 - без лимита
+
+
+class FaultInjector:
+    """Применяет FaultConfig к каждому запросу и собирает статистику."""
+
+    def __init__(self, faults: FaultConfig, seed: Optional[int] = None):
+        self.faults = faults
+        self.rng = random.Random(seed)
+        self.lock = Lock()
+        self.tokens = faults.rate_limit_rps
+        self.last_refill = time.monotonic()
+        self.stats = {"requests": 0, "errors_500": 0, "throttled_429": 0, "by_route": defaultdict(int)}
+
+    def before_request(self, route: str) -> Optional[int]:
+        """Задерживает запрос и возвращает HTTP статус сбоя (500/429) или None."""
+        delay = self.faults.latency_ms + self.rng.uniform(-self.faults.jitter_ms, self.faults.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["by_route"][route] += 1
+            if self.faults.rate_limit_rps > 0:
+                now = time.monotonic()
+                self.tokens = min(self.faults.rate_limit_rps,
+                                  self.tokens + (now - self.last_refill) * self.faults.rate_limit_rps)
+                self.last_refill = now
+                if self.tokens < 1:
+                    self.stats["throttled_429"] += 1
+                    return 429
+                self.tokens -= 1
+            if self.rng.random() < self.faults.throttle_rate:
+                self.stats["throttled_429"] += 1
+                return 429
+            if self.rng.random() < self.faults.error_rate:
+                self.stats["errors_500"] += 1
+                return 500
+        return None
+
+
+def create_app(exchange: SimulatedExchange, faults: Optional[FaultConfig] = None,
+               prefix: str = "/api/v2", seed: Optional[int] = None):
+    """Flask приложение с маршрутами SafeTrade поверх SimulatedExchange."""
+    from flask import Flask, jsonify, request
+
+    app = Flask(__name__)
+    injector = FaultInjector(faults or FaultConfig(), seed=seed)
+
+    def route(*paths, methods=("GET",), private=False):
+        def decorator(func):
+            def view(**kwargs):
+                status = injector.before_request(request.url_rule.rule)
+                if status == 429:
+                    return jsonify({"errors": ["too_many_requests"]}), 429
+                if status == 500:
+                    return jsonify({"errors": ["server.internal_error"]}), 500
+                if private and not request.headers.get("X-Auth-Apikey"):
+                    return jsonify({"errors": ["authz.invalid_session"]}), 401
+                try:
+                    return jsonify(func(**kwargs))
+                except SimulatorError as e:
+                    return jsonify({"errors": [e.code]}), e.status
+            view.__name__ = func.__name__
+            for path in paths:
+                app.add_url_rule(prefix + path, endpoint=f"{func.__name__}:{path}", view_func=view, methods=list(methods))
+            return func
+        return decorator
+
+    def paging():
+        return int(request.args.get("limit", 100)), int(request.args.get("offset", 0))
+
+    @route("/trade/public/markets", "/public/markets")
+    def markets():
+        return exchange.list_markets()
+
+    @route("/trade/public/tickers/<symbol>", "/public/markets/<symbol>/tickers")
+    def ticker(symbol):
+        return exchange.ticker(symbol)
+
+    @route("/public/markets/<symbol>/order-book", "/trade/public/order-book/<symbol>")
+    def order_book(symbol):
+        limit = request.args.get("limit")
+        return exchange.order_book(symbol, int(limit) if limit else None)
+
+    @route("/trade/account/balances", "/account/balances", private=True)
+    def balances():
+        return exchange.list_balances()
+
+    @route("/trade/market/orders", private=True)
+    def orders():
+        limit, offset = paging()
+        return exchange.list_orders(request.args.get("state"), request.args.get("market"), limit, offset)
+
+    @route("/trade/market/orders", methods=("POST",), private=True)
+    def create_order():
+        payload = request.get_json(silent=True) or {}
+        return exchange.create_order(
+            payload.get("market", ""), payload.get("side", ""), payload.get("amount", payload.get("volume")),
+            payload.get("type", payload.get("ord_type", "market")), payload.get("price")
+        )
+
+    @route("/trade/market/orders/<order_id>", "/market/orders/<order_id>", private=True)
+    def order(order_id):
+        return exchange.get_order(order_id)
+
+    @route("/trade/market/orders/<order_id>/cancel", methods=("POST",), private=True)
+    def cancel(order_id):
+        return exchange.cancel_order(order_id)
+
+    @route("/trade/market/trades", private=True)
+    def trades():
+        limit, offset = paging()
+        return exchange.list_trades(request.args.get("market"), limit, offset)
+
+    @app.route("/sim/stats")
+    def stats():
+        with injector.lock:
+            data = dict(injector.stats)
+            data["by_route"] = dict(injector.stats["by_route"])
+        data["orders"] = len(exchange.orders)
+        data["trades"] = len(exchange.trades)
+        return jsonify(data)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный симулятор биржи SafeTrade")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--config", help="JSON с рынками и балансами (формат DEFAULT_SIM_CONFIG)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rps", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = DEFAULT_SIM_CONFIG
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    exchange = SimulatedExchange(config, seed=args.seed)
+    faults = FaultConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.rate_limit_rps)
+    app = create_app(exchange, faults, seed=args.seed)
+    logging.info(f"Симулятор SafeTrade: SAFETRADE_BASE_URL=http://{args.host}:{args.port}/api/v2")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+Локальное хранилище SQLite (WAL) - основная цель записи вместо Supabase.
+
+Таблицы повторяют пять таблиц safetrade_* из database_schema.sql, поэтому
+бот пишет и читает историю с локального диска и продолжает работать, когда
+Supabase медленный или недоступен. SupabaseSyncer в фоне переносит новые
+строки в Supabase пачками:
+
+- таблицы только с добавлением строк отслеживаются курсором по локальному id
+  (таблица sync_cursors), поэтому после перезапуска синхронизация продолжается
+  с первой неотправленной строки;
+- торговые пары помечаются флагом synced и отправляются upsert по symbol;
+- обновления статусов ордеров схлопываются в таблице sync_status_updates
+  (последний статус на order_id) и отправляются после вставки строк.
+
+Доставка "хотя бы один раз": если процесс упадет между вставкой пачки и
+сдвигом курсора, пачка будет отправлена повторно.
+"""
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from db_time import parse_db_timestamp, to_utc_iso
+
+TABLES: Dict[str, List[str]] = {
+    'safetrade_price_history': ['timestamp', 'symbol', 'price', 'volume', 'high', 'low', 'created_at'],
+    'safetrade_order_history': ['order_id', 'timestamp', 'symbol', 'side', 'order_type', 'amount',
+                                'price', 'total', 'status', 'created_at', 'updated_at'],
+    'safetrade_ai_decisions': ['timestamp', 'decision_type', 'decision_data', 'market_data',
+                               'reasoning', 'confidence', 'created_at'],
+    'safetrade_trading_pairs': ['symbol', 'base_currency', 'quote_currency', 'is_active',
+                                'last_updated', 'created_at'],
+    'safetrade_performance_metrics': ['timestamp', 'metric_type', 'metric_name', 'value',
+                                      'metadata', 'created_at'],
+}
+
+# Колонки с метками времени (ISO UTC со смещением, см. db_time.py)
+TIMESTAMP_COLUMNS: Dict[str, List[str]] = {
+    'safetrade_price_history': ['timestamp', 'created_at'],
+    'safetrade_order_history': ['timestamp', 'created_at', 'updated_at'],
+    'safetrade_ai_decisions': ['timestamp', 'created_at'],
+    'safetrade_trading_pairs': ['last_updated', 'created_at'],
+    'safetrade_performance_metrics': ['timestamp', 'created_at'],
+    'safetrade_price_candles': ['bucket_start'],
+}
+
+# PRAGMA user_version: 1 - метки времени в UTC
+SCHEMA_VERSION = 1
+
+# Таблицы, в которые строки только добавляются: синхронизация по курсору id
+APPEND_TABLES = [table for table in TABLES if table != 'safetrade_trading_pairs']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS safetrade_price_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL, symbol TEXT NOT NULL, price REAL NOT NULL,
+    volume REAL, high REAL, low REAL, created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_symbol_timestamp ON safetrade_price_history(symbol, timestamp);
+
+CREATE TABLE IF NOT EXISTS safetrade_order_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL, timestamp TEXT NOT NULL, symbol TEXT NOT NULL, side TEXT NOT NULL,
+    order_type TEXT NOT NULL, amount REAL NOT NULL, price REAL, total REAL, status TEXT NOT NULL,
+    created_at TEXT, updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_history_order_id ON safetrade_order_history(order_id);
+
+CREATE TABLE IF NOT EXISTS safetrade_ai_decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL, decision_type TEXT NOT NULL, decision_data TEXT NOT NULL,
+    market_data TEXT, reasoning TEXT, confidence REAL, created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS safetrade_trading_pairs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL UNIQUE, base_currency TEXT NOT NULL, quote_currency TEXT NOT NULL,
+    is_active INTEGER DEFAULT 1, last_updated TEXT, created_at TEXT,
+    synced INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS safetrade_performance_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL, metric_type TEXT NOT NULL, metric_name TEXT NOT NULL,
+    value REAL NOT NULL, metadata TEXT, created_at TEXT
+);
+
+-- Свечи из price_rollup.py (только локально; в Supabase свои, см. supabase_setup.sql)
+CREATE TABLE IF NOT EXISTS safetrade_price_candles (
+    symbol TEXT NOT NULL, resolution TEXT NOT NULL, bucket_start TEXT NOT NULL,
+    open REAL NOT NULL, high REAL NOT NULL, low REAL NOT NULL, close REAL NOT NULL,
+    volume REAL, samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, resolution, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    table_name TEXT PRIMARY KEY, last_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_status_updates (
+    order_id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at TEXT NOT NULL
+);
+"""
+
+
+class LocalStore:
+    """SQLite-зеркало таблиц safetrade_* с очередью синхронизации."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL-режиме NORMAL не теряет целостность, но не ждет fsync на каждый commit
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._migrate_timestamps()
+
+    def _migrate_timestamps(self, chunk_size: int = 5000) -> None:
+        """
+        Версия 1: наивные локальные метки (datetime.now().isoformat()) переводятся в UTC со
+        смещением, как их теперь пишет DatabaseManager, - иначе строки сравниваются неверно.
+        """
+        converted = 0
+        with self.lock:
+            for table, columns in TIMESTAMP_COLUMNS.items():
+                last = 0
+                while True:
+                    rows = self.conn.execute(
+                        f"SELECT rowid AS row_key, {', '.join(columns)} FROM {table} "
+                        f"WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, chunk_size)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    updates = []
+                    for row in rows:
+                        values = [to_utc_iso(row[c]) if _is_naive(row[c]) else row[c] for c in columns]
+                        if values != [row[c] for c in columns]:
+                            updates.append(values + [row['row_key']])
+                    with self.conn:
+                        self.conn.executemany(
+                            f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE rowid = ?", updates
+                        )
+                    converted += len(updates)
+                    last = rows[-1]['row_key']
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+        if converted:
+            logging.info(f"Локальное хранилище: {converted} строк переведено на метки времени UTC")
+
+    # --- Запись ---
+
+    def insert_rows(self, table: str, rows: List[dict]) -> List[dict]:
+        """Добавляет строки в таблицу; возвращает их с локальным id."""
+        columns = TABLES[table]
+        inserted = []
+        with self.lock, self.conn:
+            for row in rows:
+                cursor = self.conn.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [_to_sql(row.get(column)) for column in columns]
+                )
+                inserted.append(dict(row, id=cursor.lastrowid))
+        return inserted
+
+    def insert(self, table: str, row: dict) -> dict:
+        return self.insert_rows(table, [row])[0]
+
+    def set_order_status(self, order_id, status: str) -> None:
+        """Обновляет статус локально и ставит его в очередь синхронизации (последний статус побеждает)."""
+        now = to_utc_iso()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE safetrade_order_history SET status = ?, updated_at = ? WHERE order_id = ?",
+                (status, now, str(order_id))
+            )
+            self.conn.execute(
+                "INSERT INTO sync_status_updates (order_id, status, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(order_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (str(order_id), status, now)
+            )
+
+    def upsert_trading_pairs(self, rows: List[dict]) -> int:
+        """Upsert торговых пар по symbol; измененные пары помечаются для синхронизации."""
+        columns = TABLES['safetrade_trading_pairs']
+        updates = ', '.join(f"{c} = excluded.{c}" for c in columns if c not in ('symbol', 'created_at'))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT INTO safetrade_trading_pairs ({', '.join(columns)}, synced) "
+                f"VALUES ({', '.join('?' * len(columns))}, 0) "
+                f"ON CONFLICT(symbol) DO UPDATE SET {updates}, synced = 0",
+                [[_to_sql(row.get(c, row.get('last_updated') if c == 'created_at' else None)) for c in columns]
+                 for row in rows]
+            )
+        return len(rows)
+
+    # --- Чтение ---
+
+    def query(self, sql: str, params=()) -> List[dict]:
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def price_history(self, symbol: str, since: str) -> List[dict]:
+        """История цен с since: сырые строки, а где они уже удалены сверткой - часовые свечи."""
+        rows = self.query(
+            "SELECT timestamp, volume FROM safetrade_price_history "
+            "WHERE symbol = ? AND timestamp >= ? ORDER BY timestamp", (symbol, since)
+        )
+        older = self.query(
+            "SELECT bucket_start AS timestamp, volume FROM safetrade_price_candles "
+            "WHERE symbol = ? AND resolution = '1h' AND bucket_start >= ? AND bucket_start < ? ORDER BY bucket_start",
+            # Часовая свеча, в которую попадает первая сырая строка, не дублирует ее
+            (symbol, since, rows[0]['timestamp'][:13] if rows else '9999')
+        )
+        return older + rows
+
+    # --- Свечи (price_rollup.py) ---
+
+    def latest_candle_start(self, interval: str) -> Optional[str]:
+        return self.query("SELECT MAX(bucket_start) AS ts FROM safetrade_price_candles WHERE resolution = ?",
+                          (interval,))[0]['ts']
+
+    def raw_prices_since(self, since: Optional[str]) -> List[dict]:
+        return self.query(
+            "SELECT symbol, timestamp, price, volume FROM safetrade_price_history WHERE timestamp >= ? ORDER BY id",
+            (since or '',)
+        )
+
+    def upsert_candles(self, candles: List[dict]) -> None:
+        columns = ['symbol', 'resolution', 'bucket_start', 'open', 'high', 'low', 'close', 'volume', 'samples']
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO safetrade_price_candles ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [[candle[c] for c in columns] for candle in candles]
+            )
+
+    def candles(self, symbol: str, interval: str, since: str = '') -> List[dict]:
+        return self.query(
+            "SELECT * FROM safetrade_price_candles WHERE symbol = ? AND resolution = ? AND bucket_start >= ? "
+            "ORDER BY bucket_start", (symbol, interval, since)
+        )
+
+    def prune_price_history(self, before: str, max_id: Optional[int] = None) -> int:
+        """Удаляет сырые строки до before (при max_id - только с id <= max_id, т.е. уже синхронизированные)."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM safetrade_price_history WHERE timestamp < ? AND (? IS NULL OR id <= ?)",
+                (before, max_id, max_id)
+            ).rowcount
+
+    def prune_candles(self, interval: str, before: str) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM safetrade_price_candles WHERE resolution = ? AND bucket_start < ?", (interval, before)
+            ).rowcount
+
+    def recent(self, table: str, limit: int = 10) -> List[dict]:
+        """Последние строки таблицы (новые первыми)."""
+        return self.query(f"SELECT * FROM {table} ORDER BY id DESC LIMIT ?", (limit,))
+
+    def trading_pairs(self, active_only: bool = True) -> List[dict]:
+        rows = self.query(
+            "SELECT * FROM safetrade_trading_pairs" + (" WHERE is_active = 1" if active_only else "")
+        )
+        for row in rows:
+            row['is_active'] = bool(row['is_active'])
+        return rows
+
+    def count(self, table: str) -> int:
+        return self.query(f"SELECT COUNT(*) AS n FROM {table}")[0]['n']
+
+    # --- Синхронизация ---
+
+    def cursor(self, table: str) -> int:
+        rows = self.query("SELECT last_id FROM sync_cursors WHERE table_name = ?", (table,))
+        return rows[0]['last_id'] if rows else 0
+
+    def advance_cursor(self, table: str, last_id: int) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO sync_cursors (table_name, last_id) VALUES (?, ?) "
+                "ON CONFLICT(table_name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+                (table, last_id)
+            )
+
+    def unsynced_rows(self, table: str, limit: int) -> List[dict]:
+        return self.query(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (self.cursor(table), limit))
+
+    def unsynced_pairs(self, limit: int) -> List[dict]:
+        return self.query("SELECT * FROM safetrade_trading_pairs WHERE synced = 0 ORDER BY id LIMIT ?", (limit,))
+
+    def mark_pairs_synced(self, pairs: List[dict]) -> None:
+        """Снимает флаг только с пар, не измененных после выборки."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE safetrade_trading_pairs SET synced = 1 WHERE symbol = ? AND last_updated IS ?",
+                [(pair['symbol'], pair['last_updated']) for pair in pairs]
+            )
+
+    def pending_statuses(self, limit: int) -> List[dict]:
+        return self.query("SELECT * FROM sync_status_updates ORDER BY updated_at LIMIT ?", (limit,))
+
+    def clear_status(self, order_id: str, updated_at: str) -> None:
+        """Удаляет отправленное обновление, если за время отправки не пришло новое."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM sync_status_updates WHERE order_id = ? AND updated_at = ?", (order_id, updated_at)
+            )
+
+    def sync_backlog(self) -> Dict[str, int]:
+        """Сколько строк каждой таблицы еще не отправлено в Supabase."""
+        backlog = {
+            table: self.query(f"SELECT COUNT(*) AS n FROM {table} WHERE id > ?", (self.cursor(table),))[0]['n']
+            for table in APPEND_TABLES
+        }
+        backlog['safetrade_trading_pairs'] = self.query(
+            "SELECT COUNT(*) AS n FROM safetrade_trading_pairs WHERE synced = 0")[0]['n']
+        backlog['status_updates'] = self.count('sync_status_updates')
+        return backlog
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def _to_sql(value):
+    return int(value) if isinstance(value, bool) else value
+
+
+def _is_naive(value) -> bool:
+    ts = parse_db_timestamp(value) if isinstance(value, str) else None
+    return ts is not None and ts.tzinfo is None
+
+
+class SupabaseSyncer:
+    """Фоновый перенос новых строк LocalStore в Supabase пачками."""
+
+    def __init__(self, store: LocalStore, insert_rows: Callable[[str, List[dict]], object],
+                 upsert_pairs: Callable[[List[dict]], object], update_status: Callable[[str, str], object],
+                 batch_size: int = 500, interval: float = 5, max_backoff: float = 300, start: bool = True):
+        self.store = store
+        self.insert_rows = insert_rows
+        self.upsert_pairs = upsert_pairs
+        self.update_status = update_status
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.stats = {"rows": 0, "pairs": 0, "statuses": 0, "failed_syncs": 0}
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    def sync_once(self) -> int:
+        """
+        Отправляет все накопленные строки. Статусы - после вставок, чтобы
+        обновление не пришло раньше строки ордера. Ошибки пробрасываются.
+        """
+        sent = 0
+        with self._sync_lock:
+            for table in APPEND_TABLES:
+                while True:
+                    rows = self.store.unsynced_rows(table, self.batch_size)
+                    if not rows:
+                        break
+                    # Supabase назначает собственный id
+                    self.insert_rows(table, [{k: v for k, v in row.items() if k != 'id'} for row in rows])
+                    self.store.advance_cursor(table, rows[-1]['id'])
+                    self.stats["rows"] += len(rows)
+                    sent += len(rows)
+                    if len(rows) < self.batch_size:
+                        break
+            while True:
+                pairs = self.store.unsynced_pairs(self.batch_size)
+                if not pairs:
+                    break
+                self.upsert_pairs([{k: v for k, v in pair.items() if k not in ('id', 'synced')} for pair in pairs])
+                self.store.mark_pairs_synced(pairs)
+                self.stats["pairs"] += len(pairs)
+                sent += len(pairs)
+                if len(pairs) < self.batch_size:
+                    break
+            for update in self.store.pending_statuses(self.batch_size):
+                self.update_status(update['order_id'], update['status'])
+                self.store.clear_status(update['order_id'], update['updated_at'])
+                self.stats["statuses"] += 1
+                sent += 1
+        return sent
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="supabase-sync", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                sent = self.sync_once()
+                if self.failures:
+                    logging.info(f"Синхронизация с Supabase восстановлена, отправлено {sent} записей")
+                self.failures = 0
+                delay = self.interval
+            except Exception as e:
+                self.failures += 1
+                self.stats["failed_syncs"] += 1
+                delay = min(self.interval * 2 ** self.failures, self.max_backoff)
+                logging.warning(f"Синхронизация с Supabase не удалась ({self.failures} подряд), "
+                                f"повтор через {delay:.0f} сек: {e}")
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def close(self, timeout: float = 3) -> None:
+        """Останавливает поток и пробует отправить остаток за timeout секунд (он останется на диске)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self.failures:
+            return
+        final = threading.Thread(target=self._final_sync, daemon=True)
+        final.start()
+        final.join(timeout)
+
+    def _final_sync(self) -> None:
+        try:
+            self.sync_once()
+        except Exception as e:
+            logging.warning(f"Остаток синхронизации отправится при следующем запуске: {e}")
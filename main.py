@@ -7,7 +7,7 @@ import telebot
 from telebot import types
 from dotenv import load_dotenv
 import cloudscraper
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import threading
 from supabase.client import create_client, Client
 # --- УСЛОВНЫЙ ИМПОРТ И ИНИЦИАЛИЗАЦИЯ ИИ ---
@@ -24,6 +24,7 @@ import logging
 import sys
 import signal
 from threading import Lock, Semaphore
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tenacity import retry, stop_after_attempt, wait_exponential
 from contextlib import contextmanager
 import asyncio
@@ -35,16 +36,39 @@ import subprocess
 from urllib.parse import urlparse
 import trade_history
 import binascii
+from precision_cache import PrecisionCache
+from balance_ledger import BalanceLedger
+from order_router import VenueQuote, currency_locks, parse_bids, route_sell
+from depth_slicing import BookDepth, next_slice
+from vwap_profile import build_hourly_profile, schedule_slices
+from backtest import BookRecorder
+from order_tracker import OrderTracker
+from order_snapshot import fetch_order_snapshot
+from private_stream import PrivateStream, private_stream_url
+from trade_sync import TradeStore, TradeSync
+from order_canceller import cancel_open_orders
+from db_write_queue import DBWriteQueue
+from local_store import LocalStore, SupabaseSyncer
+from price_rollup import rollup_local
+from db_time import parse_db_timestamp, to_utc_iso, to_local
+from db_migrate import run_timestamptz_migration
+from command_metrics import CommandMetrics
+from order_journal import OrderJournal, OrderStatus
+from decimal import Decimal
+from order_sizing import (
+    OrderSizeError, format_decimal, quantize_amount, quantize_to_step,
+    rules_from_safetrade_market, size_order, step_from_precision, to_decimal
+)
 
 # --- SAFE TRADE API КЛИЕНТ ---
 class SafeTradeAPI:
-    def __init__(self, api_key: str, api_secret: str):
+    def __init__(self, api_key: str, api_secret: str, base_url: str = "https://safe.trade/api/v2"):
         if not api_key or not api_secret:
             raise ValueError("API key and secret cannot be empty.")
         
         self.key = api_key
         self.secret = api_secret.encode('utf-8')
-        self.base_url = "https://safe.trade/api/v2"
+        self.base_url = base_url
         self.scraper = cloudscraper.create_scraper()
 
     def _sign_payload(self, nonce: str) -> str:
@@ -68,12 +92,12 @@ class SafeTradeAPI:
             'Content-Type': 'application/json;charset=utf-8'  # Use correct content type
         }
 
-    def get(self, path: str):
+    def get(self, path: str, params: Optional[dict] = None):
         """Sends a GET request with proper authentication."""
         url = self.base_url + path
         headers = self._get_auth_headers()
             
-        response = self.scraper.get(url, headers=headers, timeout=30)
+        response = self.scraper.get(url, headers=headers, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
 
@@ -114,8 +138,8 @@ class SafeTradeAPI:
         Creates a new order with CORRECT parameters.
         Note the parameter names: 'amount' and 'type'.
         """
-        # ✅ ИСПРАВЛЕНО: Убедимся, что amount всегда передается как строка
-        amount_str = str(amount) if not isinstance(amount, str) else amount
+        # ✅ ИСПРАВЛЕНО: amount всегда передается как каноническая строка (без 1e-05 и хвостов float)
+        amount_str = format_decimal(amount) if not isinstance(amount, str) else amount
         
         payload = {
             "market": market,
@@ -124,18 +148,35 @@ class SafeTradeAPI:
             "type": order_type,     # ✅ Use 'type' not 'ord_type'
         }
         if order_type == "limit" and price:
-            payload["price"] = str(price)
+            payload["price"] = format_decimal(price) if not isinstance(price, str) else price
         
         return self.post("/trade/market/orders", payload)
 
-    def get_orders(self):
-        """Fetches all orders."""
-        return self.get("/trade/market/orders")
+    def get_orders(self, state: Optional[str] = None, market: Optional[str] = None,
+                   limit: Optional[int] = None, offset: Optional[int] = None):
+        """Fetches orders, optionally filtered by state/market and paginated with limit/offset."""
+        params = {key: value for key, value in
+                  (("state", state), ("market", market), ("limit", limit), ("offset", offset))
+                  if value is not None}
+        return self.get("/trade/market/orders", params=params or None)
+
+    def get_trades(self, market: Optional[str] = None, time_from: Optional[int] = None,
+                   limit: Optional[int] = None, offset: Optional[int] = None):
+        """Fetches account trades, optionally only those newer than time_from (unix seconds)."""
+        params = {key: value for key, value in
+                  (("market", market), ("time_from", time_from), ("limit", limit), ("offset", offset))
+                  if value is not None}
+        return self.get("/trade/market/trades", params=params or None)
 
     def cancel_order(self, order_id: str):
         """Cancels an order."""
         return self.post(f"/trade/market/orders/{order_id}/cancel", {})
 
+    def cancel_orders(self, market: Optional[str] = None, side: Optional[str] = None):
+        """Cancels all open orders, optionally only for one market/side."""
+        payload = {key: value for key, value in (("market", market), ("side", side)) if value is not None}
+        return self.post("/trade/market/orders/cancel", payload)
+
 # --- НАСТРОЙКИ ЛОГИРОВАНИЯ ---
 import os
 from pathlib import Path
@@ -203,6 +244,7 @@ load_dotenv()
 # - SAFETRADE_SUPABASE_KEY - Ключ Supabase (для облачной базы данных)
 # - SAFETRADE_WEBHOOK_URL - URL для webhook режима (альтернатива polling)
 # - SAFETRADE_WEBHOOK_PORT - Порт для webhook режима
+# - SAFETRADE_BASE_URL - адрес API (по умолчанию https://safe.trade/api/v2, для симулятора http://127.0.0.1:5055/api/v2)
 #
 # КОНФИГУРАЦИЯ ВАЛЮТ:
 # - excluded_currencies: валюты, которые НЕ будут продаваться (всегда исключены)
@@ -229,12 +271,49 @@ DEFAULT_CONFIG = {
             },
             'iceberg': {
                 'default_visible_ratio': 0.1,
-                'max_attempts': 20
+                'max_attempts': 20,
+                'max_open_slices': 1,       # Максимум одновременно выставленных частей
+                'refill_fill_ratio': 0.9,   # Доля исполнения части, после которой ставится следующая
+                'poll_interval': 2,         # Интервал проверки исполнения части (сек)
+                'slice_timeout': 120,       # Через сколько секунд неисполненная часть перевыставляется
+                'max_duration': 1800        # Общий лимит времени: после него открытые части снимаются
+            },
+            'vwap': {
+                'default_duration': 60,
+                'default_chunks': 6,
+                'history_days': 7,          # За сколько дней строить профиль объема по часам
+                'min_observed_hours': 12    # Меньше наблюдаемых часов - равномерный профиль (как TWAP)
             },
             'adaptive': {
                 'max_price_levels': 10,
-                'liquidity_ratio': 0.1
+                'liquidity_ratio': 0.1,
+                'max_parallel_submissions': 4  # Сколько уровней лестницы отправляется одновременно
             }
+        },
+        'easy_mode_slicing': {
+            'impact_budget': 0.01,     # Допустимое проскальзывание одной части (1%)
+            'max_slices': 10,          # Максимум частей за цикл
+            'slice_interval': 1        # Пауза между частями для восстановления стакана (сек)
+        },
+        'router': {
+            'enabled': False,          # Маршрутизация продажи между SafeTrade и MEXC
+            'depth_levels': 20,        # Сколько уровней стакана учитывать
+            'safetrade_fee': 0.002,    # Комиссия тейкера SafeTrade
+            'mexc_fee': 0.001,         # Комиссия тейкера MEXC
+            'max_slippage': 0.03       # Худшая допустимая чистая цена относительно лучшей
+        },
+        'order_tracker': {
+            'min_interval': 2,         # Проверка ордера у вершины стакана (сек)
+            'max_interval': 30,        # Проверка далекого от вершины ордера (сек)
+            'far_distance': 0.05,      # Удаленность от лучшей цены, с которой интервал максимальный
+            'timeout': 3600,           # Неисполненный за это время ордер отменяется (сек)
+            'private_stream': True,    # Получать ордера/сделки/балансы из приватного WebSocket
+            'push_interval': 300       # Страховочный опрос REST при живом потоке (сек)
+        },
+        'shutdown_cancel': {
+            'deadline': 8,             # Общий лимит отмены ордеров при остановке (сек)
+            'max_workers': 8,          # Параллельных запросов отмены
+            'bulk_by_market': True     # Отменять рынок одним запросом, если ордеров несколько
         }
     },
     'risk_management': {
@@ -243,10 +322,41 @@ DEFAULT_CONFIG = {
         'max_volatility_threshold': 0.05,
         'max_spread_threshold': 0.02  # <-- ИСПРАВЛЕНО: Добавлен недостающий ключ (значение 2%)
     },
+    'backtest': {
+        'record_books': False,   # Записывать снимки стакана в data/books для backtest.py
+        'record_interval': 30,   # Не чаще раза в N секунд на рынок
+        'record_depth': 20       # Сколько уровней стакана сохранять
+    },
+    'telegram': {
+        'num_threads': 8,                # Потоков для обработчиков команд
+        'slow_command_threshold': 10,    # Команды дольше N секунд пишутся в лог
+        'store_command_metrics': True    # Сохранять время команд в safetrade_performance_metrics
+    },
     'cache': {
         'markets_duration': 14400,  # 4 часа
         'prices_duration': 300,     # 5 минут
-        'orderbook_duration': 60    # 1 минута
+        'orderbook_duration': 60,   # 1 минута
+        'precision_rejection_ttl': 86400  # Сколько секунд помнить отклоненную биржей точность
+    },
+    'database': {
+        'local_store': {
+            'enabled': True,         # Писать и читать локально (SQLite WAL), Supabase - фоновой синхронизацией;
+                                     # заменяет очередь записи db_write_queue (она только для работы без хранилища)
+            'path': 'safetrade.db',  # Файл в data/
+            'sync_interval': 5,      # Пауза между проходами синхронизации (сек)
+            'sync_batch_size': 500   # Строк на один запрос к Supabase
+        },
+        'rollup': {
+            'enabled': True,         # Сворачивать историю цен в свечи по расписанию
+            'interval': 3600,        # Период запуска (сек)
+            'raw_retention_days': 3, # Сколько дней хранить сырые строки safetrade_price_history
+            'candle_retention_days': {'1m': 14, '1h': 365, '1d': 0}  # 0 - хранить всегда
+        },
+        'migration': {
+            'source_timezone': 'UTC',  # Часовой пояс хоста, писавшего старые текстовые метки
+            'batch_size': 5000,        # Строк истории цен за одну транзакцию переноса
+            'pause': 0                 # Пауза между пачками (сек)
+        }
     }
 }
 
@@ -289,9 +399,11 @@ def validate_environment():
         missing_vars.append("SAFETRADE_API_KEY")
     if not API_SECRET:
         missing_vars.append("SAFETRADE_API_SECRET")
-    if not SUPABASE_URL:
+    # С локальным хранилищем Supabase необязателен: записи синхронизируются, когда он настроен
+    supabase_required = not CONFIG.get('database', {}).get('local_store', {}).get('enabled', True)
+    if supabase_required and not SUPABASE_URL:
         missing_vars.append("SUPABASE_URL")
-    if not SUPABASE_KEY:
+    if supabase_required and not SUPABASE_KEY:
         missing_vars.append("SUPABASE_KEY")
     
     if missing_vars:
@@ -321,13 +433,14 @@ DONATE_URL = "https://boosty.to/vokforever/donate"
 
 # Убедимся, что секрет в байтовом представлении для hmac
 API_SECRET_BYTES = API_SECRET.encode('utf-8') if API_SECRET else None
-BASE_URL = "https://safe.trade/api/v2"
+# SAFETRADE_BASE_URL позволяет направить бота на локальный симулятор (exchange_simulator.py)
+BASE_URL = os.getenv("SAFETRADE_BASE_URL", "https://safe.trade/api/v2").rstrip('/')
 
 # Инициализируем API клиент
 def initialize_api_client():
     global api_client
     if API_KEY and API_SECRET:
-        api_client = SafeTradeAPI(API_KEY, API_SECRET)
+        api_client = SafeTradeAPI(API_KEY, API_SECRET, BASE_URL)
         return True
     else:
         api_client = None
@@ -391,17 +504,28 @@ orderbook_cache = {
     "cache_duration": CONFIG['cache']['orderbook_duration']
 }
 
-# Semaphore для ограничения concurrent продаж
+# Кэш точности, которую биржа реально принимает для рынков
+precision_cache = PrecisionCache(log_dir / "precision_cache.json",
+                                 rejection_ttl=CONFIG['cache'].get('precision_rejection_ttl', 86400))
+
+# Запись снимков стакана для бэктеста стратегий (backtest.py)
+backtest_config = CONFIG.get('backtest', DEFAULT_CONFIG['backtest'])
+book_recorder = BookRecorder(
+    log_dir / "books",
+    interval=backtest_config.get('record_interval', 30),
+    depth=backtest_config.get('record_depth', 20)
+) if backtest_config.get('record_books') else None
+
+# Учет доступных/заблокированных средств: точный объем продажи без повторов на 99%/95%/90%
+balance_ledger = BalanceLedger()
+
+# Журнал жизненного цикла ордеров: после перезапуска открытые ордера известны без запроса истории
+order_journal = OrderJournal(log_dir / "order_journal.jsonl")
+
+# Semaphore для ограничения числа одновременно продаваемых валют (см. sell_currency)
 sales_sem = Semaphore(MAX_CONCURRENT_SALES)
 
 # Стратегии продаж (импортируются из ai_assistant при необходимости)
-class OrderStatus(Enum):
-    PENDING = "pending"
-    PARTIAL = "partial"
-    FILLED = "filled"
-    CANCELLED = "cancelled"
-    FAILED = "failed"
-
 # Определяем MarketData здесь, чтобы он был доступен всегда
 @dataclass
 class MarketData:
@@ -433,12 +557,93 @@ class PriorityScore:
 
 # --- УПРАВЛЕНИЕ БАЗОЙ ДАННЫХ ---
 class DatabaseManager:
-    def __init__(self, supabase_client: Client):
-        if not supabase_client:
+    # Естественные ключи таблиц: уникальные индексы из supabase_dedup.sql, по ним делается upsert.
+    # Ключ секционированной таблицы ордеров обязан включать timestamp - в него пишется время
+    # создания ордера на бирже, так что ключ по сути один на order_id
+    UNIQUE_KEYS = {
+        'safetrade_trading_pairs': 'symbol',
+        'safetrade_price_history': 'symbol,timestamp',
+        'safetrade_order_history': 'order_id,timestamp',
+        'safetrade_ai_decisions': 'decision_type,timestamp',
+        'safetrade_performance_metrics': 'metric_type,metric_name,timestamp',
+    }
+
+    def __init__(self, supabase_client: Optional[Client], local_store: Optional[LocalStore] = None):
+        if not supabase_client and not local_store:
             raise ValueError("Supabase client is required")
         self.supabase = supabase_client
+        self.local = local_store     # Основная цель записи и чтения, если включено локальное хранилище
+        self.syncer: Optional[SupabaseSyncer] = None
         self.lock = Lock()
-        self.init_database()
+        self._stats_cache = None  # (время, статистика) для get_database_stats
+        self.write_queue: Optional[DBWriteQueue] = None
+        self._upsert_supported = True  # False, пока в Supabase не созданы уникальные индексы
+        if self.supabase:
+            try:
+                self.init_database()
+            except Exception:
+                if not self.local:
+                    raise
+                logging.warning("Supabase недоступен, данные пишутся локально и будут синхронизированы позже")
+
+    def start_write_queue(self, spill_path: Path):
+        """
+        Записи истории и статусов ордеров уходят в фоновую очередь вместо синхронного запроса.
+        
+        С локальным хранилищем очередь не создается: ее заменяют SQLite (быстрая надежная
+        запись на пути исполнения) и SupabaseSyncer (пакетная отправка с повторами), и
+        отдельный файл очереди не ведется. Файл, оставшийся от запуска без хранилища,
+        один раз переносится в хранилище и удаляется.
+        """
+        if self.local:
+            if spill_path.exists():
+                leftover = DBWriteQueue(self.local.insert_rows, self.local.set_order_status, spill_path, start=False)
+                if leftover.flush():
+                    logging.info(f"Записи из {spill_path.name} перенесены в локальное хранилище")
+                else:
+                    leftover.spill()
+            return
+        self.write_queue = DBWriteQueue(self._insert_rows, self._apply_order_status, spill_path)
+
+    def start_sync(self, interval: float = 5, batch_size: int = 500):
+        """Фоновая отправка локальных записей в Supabase"""
+        if self.local and self.supabase:
+            self.syncer = SupabaseSyncer(self.local, self._insert_rows, self._upsert_pair_rows,
+                                         self._apply_order_status, batch_size=batch_size, interval=interval)
+
+    def _insert_rows(self, table: str, rows: List[dict]):
+        """
+        Пакетная вставка строк (ошибки пробрасываются очереди записи).
+        Строки с уже существующим естественным ключом пропускаются сервером, поэтому
+        повторы после сбоев и повторная синхронизация не создают дубликатов.
+        """
+        key = self.UNIQUE_KEYS.get(table)
+        if key and self._upsert_supported:
+            try:
+                result = self.supabase.table(table).upsert(rows, on_conflict=key, ignore_duplicates=True).execute()
+                # Сервер возвращает только вставленные строки - остальные уже были в таблице
+                skipped = len(rows) - len(result.data or [])
+                if skipped > 0:
+                    logging.info(f"{table}: пропущено {skipped} из {len(rows)} строк с уже существующим ключом ({key})")
+                return result
+            except Exception as e:
+                # 42P10: нет уникального индекса под ON CONFLICT - supabase_dedup.sql еще не применен
+                if getattr(e, 'code', None) != '42P10' and '42P10' not in str(e):
+                    raise
+                self._upsert_supported = False
+                logging.warning("В Supabase нет уникальных индексов для upsert, пишем обычной вставкой. "
+                                "Выполните supabase_dedup.sql и `python main.py cleanup`")
+        return self.supabase.table(table).insert(rows).execute()
+
+    def _apply_order_status(self, order_id: str, status: str):
+        data = {
+            'status': status,
+            'updated_at': to_utc_iso()
+        }
+        return self.supabase.table('safetrade_order_history').update(data).eq('order_id', order_id).execute()
+
+    def _upsert_pair_rows(self, rows: List[dict]):
+        return self.supabase.table('safetrade_trading_pairs').upsert(rows, on_conflict='symbol').execute()
     
     def init_database(self):
         """Инициализация базы данных в Supabase"""
@@ -472,15 +677,17 @@ class DatabaseManager:
         """Вставка исторических данных о ценах"""
         try:
             data = {
-                "timestamp": timestamp,
+                "timestamp": to_utc_iso(timestamp),
                 "symbol": symbol,
                 "price": price,
                 "volume": volume,
                 "high": high,
                 "low": low,
-                "created_at": datetime.now().isoformat()
+                "created_at": to_utc_iso()
             }
-            result = self.supabase.table('safetrade_price_history').insert(data).execute()
+            if self.local:
+                return self.local.insert('safetrade_price_history', data)
+            result = self._insert_rows('safetrade_price_history', [data])
             return result.data[0] if result.data else None
         except Exception as e:
             logging.error(f"Ошибка вставки данных о ценах: {e}")
@@ -489,11 +696,15 @@ class DatabaseManager:
     def insert_order_history(self, order_id: str, timestamp: str, symbol: str, 
                            side: str, order_type: str, amount: float, 
                            price: Optional[float] = None, total: Optional[float] = None, status: str = "pending"):
-        """Вставка истории ордеров"""
+        """
+        Вставка истории ордеров.
+        timestamp - время создания ордера на бирже: оно одно для всех записей ордера,
+        поэтому ключ (order_id, timestamp) секционированной таблицы не пропускает повторы.
+        """
         try:
             data = {
                 'order_id': order_id,
-                'timestamp': timestamp,
+                'timestamp': to_utc_iso(timestamp),
                 'symbol': symbol,
                 'side': side,
                 'order_type': order_type,
@@ -501,10 +712,15 @@ class DatabaseManager:
                 'price': price,
                 'total': total,
                 'status': status,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
+                'created_at': to_utc_iso(),
+                'updated_at': to_utc_iso()
             }
-            result = self.supabase.table('safetrade_order_history').insert(data).execute()
+            if self.local:
+                return self.local.insert('safetrade_order_history', data)
+            if self.write_queue:
+                self.write_queue.insert('safetrade_order_history', data)
+                return data
+            result = self._insert_rows('safetrade_order_history', [data])
             return result.data[0] if result.data else None
         except Exception as e:
             logging.error(f"Ошибка вставки истории ордеров: {e}")
@@ -513,11 +729,13 @@ class DatabaseManager:
     def update_order_status(self, order_id: str, status: str):
         """Обновление статуса ордера"""
         try:
-            data = {
-                'status': status,
-                'updated_at': datetime.now().isoformat()
-            }
-            result = self.supabase.table('safetrade_order_history').update(data).eq('order_id', order_id).execute()
+            if self.local:
+                self.local.set_order_status(order_id, status)
+                return None
+            if self.write_queue:
+                self.write_queue.set_status(order_id, status)
+                return None
+            result = self._apply_order_status(order_id, status)
             return result.data[0] if result.data else None
         except Exception as e:
             logging.error(f"Ошибка обновления статуса ордера: {e}")
@@ -528,15 +746,17 @@ class DatabaseManager:
         """Вставка решений ИИ"""
         try:
             data = {
-                'timestamp': timestamp,
+                'timestamp': to_utc_iso(timestamp),
                 'decision_type': decision_type,
                 'decision_data': decision_data,
                 'market_data': market_data,
                 'reasoning': reasoning,
                 'confidence': confidence,
-                'created_at': datetime.now().isoformat()
+                'created_at': to_utc_iso()
             }
-            result = self.supabase.table('safetrade_ai_decisions').insert(data).execute()
+            if self.local:
+                return self.local.insert('safetrade_ai_decisions', data)
+            result = self._insert_rows('safetrade_ai_decisions', [data])
             return result.data[0] if result.data else None
         except Exception as e:
             logging.error(f"Ошибка вставки решения ИИ: {e}")
@@ -550,9 +770,12 @@ class DatabaseManager:
                 'base_currency': base_currency,
                 'quote_currency': quote_currency,
                 'is_active': is_active,
-                'last_updated': datetime.now().isoformat(),
-                'created_at': datetime.now().isoformat()
+                'last_updated': to_utc_iso(),
+                'created_at': to_utc_iso()
             }
+            if self.local:
+                self.local.upsert_trading_pairs([data])
+                return data
             
             # Используем upsert с указанием конфликтного поля
             result = self.supabase.table('safetrade_trading_pairs').upsert(
@@ -580,147 +803,232 @@ class DatabaseManager:
         """Вставка метрики производительности"""
         try:
             data = {
-                'timestamp': timestamp,
+                'timestamp': to_utc_iso(timestamp),
                 'metric_type': metric_type,
                 'metric_name': metric_name,
                 'value': value,
                 'metadata': metadata,
-                'created_at': datetime.now().isoformat()
+                'created_at': to_utc_iso()
             }
-            result = self.supabase.table('safetrade_performance_metrics').insert(data).execute()
+            if self.local:
+                return self.local.insert('safetrade_performance_metrics', data)
+            result = self._insert_rows('safetrade_performance_metrics', [data])
             return result.data[0] if result.data else None
         except Exception as e:
             logging.error(f"Ошибка вставки метрики: {e}")
             return None
 
+    def get_price_history(self, symbol: str, days: int = 7):
+        """Получение истории цен и объемов по паре за последние days дней"""
+        try:
+            since = to_utc_iso(datetime.now() - timedelta(days=days))
+            if self.local:
+                return self._localize(self.local.price_history(symbol, since))
+            result = (self.supabase.table('safetrade_price_history')
+                      .select('timestamp,volume')
+                      .eq('symbol', symbol)
+                      .gte('timestamp', since)
+                      .order('timestamp')
+                      .execute())
+            rows = result.data or []
+            return self._localize(self._price_candles_before(symbol, since, rows) + rows)
+        except Exception as e:
+            logging.error(f"Ошибка получения истории цен {symbol}: {e}")
+            return []
+
+    def _price_candles_before(self, symbol: str, since: str, rows: List[dict]) -> List[dict]:
+        """Часовые свечи Supabase за период, сырые строки которого уже удалены сверткой"""
+        try:
+            query = (self.supabase.table('safetrade_price_candles')
+                     .select('bucket_start,volume')
+                     .eq('symbol', symbol)
+                     .eq('resolution', '1h')
+                     .gte('bucket_start', since))
+            if rows:
+                # Часовая свеча, в которую попадает первая сырая строка, не дублирует ее
+                first = parse_db_timestamp(rows[0]['timestamp']).astimezone(timezone.utc)
+                query = query.lt('bucket_start', first.replace(minute=0, second=0, microsecond=0).isoformat())
+            result = query.order('bucket_start').execute()
+            return [{'timestamp': c['bucket_start'], 'volume': c['volume']} for c in (result.data or [])]
+        except Exception as e:
+            logging.debug(f"Свечи {symbol} недоступны: {e}")
+            return []
+
+    @staticmethod
+    def _localize(rows: List[dict]) -> List[dict]:
+        """Метки timestamp из базы (UTC) - в локальное наивное время ISO, как их ожидает остальной код"""
+        for row in rows:
+            local = to_local(row.get('timestamp'))
+            if local is not None:
+                row['timestamp'] = local.isoformat()
+        return rows
+
     def get_ai_decisions(self, limit: int = 10):
         """Получение последних решений ИИ"""
         try:
+            if self.local:
+                return self._localize(self.local.recent('safetrade_ai_decisions', limit))
             result = self.supabase.table('safetrade_ai_decisions').select('*').order('created_at', desc=True).limit(limit).execute()
-            return result.data
+            return self._localize(result.data or [])
         except Exception as e:
             logging.error(f"Ошибка получения решений ИИ: {e}")
             return []
 
-    def cleanup_duplicate_trading_pairs(self):
-        """Очистка дублирующихся торговых пар"""
+    def get_order_history(self, limit: int = 10):
+        """Последние ордера бота (новые первыми)"""
         try:
-            # SQL запрос для удаления дубликатов, оставляя только первую запись
-            cleanup_sql = """
-            DELETE FROM safetrade_trading_pairs 
-            WHERE id NOT IN (
-                SELECT MIN(id) 
-                FROM safetrade_trading_pairs 
-                GROUP BY symbol
-            );
-            """
-            
-            # Выполняем SQL запрос через Supabase
-            result = self.supabase.rpc('exec_sql', {'sql': cleanup_sql}).execute()
-            logging.info("Очистка дублирующихся торговых пар завершена")
-            return True
+            if self.local:
+                return self._localize(self.local.recent('safetrade_order_history', limit))
+            result = self.supabase.table('safetrade_order_history').select('*').order('created_at', desc=True).limit(limit).execute()
+            return self._localize(result.data or [])
         except Exception as e:
-            # Если RPC не работает, используем альтернативный метод
+            logging.error(f"Ошибка получения истории ордеров: {e}")
+            return []
+
+    def get_trading_pairs(self, active_only: bool = True):
+        """Торговые пары из базы"""
+        if self.local:
+            return self.local.trading_pairs(active_only)
+        query = self.supabase.table('safetrade_trading_pairs').select('*')
+        if active_only:
+            query = query.eq('is_active', True)
+        return query.execute().data or []
+
+    def rollup_price_history(self, raw_retention_days: int = 3, candle_retention_days: Optional[Dict[str, int]] = None):
+        """
+        Свертка истории цен в свечи 1m/1h/1d и удаление старых сырых строк:
+        локально (price_rollup.py) и в Supabase (функция safetrade_rollup_price_history).
+        """
+        candle_retention_days = candle_retention_days or {}
+        stats = {}
+        if self.local:
+            # Пока Supabase настроен, локально удаляются только уже отправленные строки
+            stats['local'] = rollup_local(self.local, raw_retention_days, candle_retention_days,
+                                          synced_only=self.supabase is not None)
+        if self.supabase:
             try:
-                logging.info("Попытка альтернативной очистки дубликатов...")
-                # Получаем все записи
-                result = self.supabase.table('safetrade_trading_pairs').select('*').execute()
-                
-                if result.data:
-                    # Создаем словарь для отслеживания уникальных символов
-                    unique_pairs = {}
-                    duplicates_to_delete = []
-                    
-                    for row in result.data:
-                        symbol = row['symbol']
-                        row_id = row['id']
-                        
-                        if symbol in unique_pairs:
-                            # Это дубликат, помечаем для удаления
-                            duplicates_to_delete.append(row_id)
-                        else:
-                            # Первый раз видим этот символ
-                            unique_pairs[symbol] = row_id
-                    
-                    # Удаляем дубликаты
-                    if duplicates_to_delete:
-                        for dup_id in duplicates_to_delete:
-                            try:
-                                self.supabase.table('safetrade_trading_pairs').delete().eq('id', dup_id).execute()
-                            except Exception as delete_error:
-                                logging.warning(f"Не удалось удалить дубликат с id {dup_id}: {delete_error}")
-                        
-                        logging.info(f"Удалено {len(duplicates_to_delete)} дублирующихся записей")
-                    
-                    return True
-                else:
-                    logging.info("Нет записей для очистки")
-                    return True
-                    
-            except Exception as alt_error:
-                logging.error(f"Ошибка альтернативной очистки дубликатов: {alt_error}")
-                return False
+                result = self.supabase.rpc('safetrade_rollup_price_history', {
+                    'raw_retention_days': raw_retention_days,
+                    'minute_retention_days': candle_retention_days.get('1m', 0),
+                    'hour_retention_days': candle_retention_days.get('1h', 0)
+                }).execute()
+                stats['supabase'] = result.data[0] if result.data else {}
+                logging.info(f"Свертка истории цен в Supabase: {stats['supabase']}")
+            except Exception as e:
+                logging.warning(f"Функция safetrade_rollup_price_history недоступна: {e}")
+        return stats
+
+    def _rpc(self, name: str, params: dict):
+        """Вызов функции Supabase; ошибки пробрасываются"""
+        return self.supabase.rpc(name, params).execute().data
+
+    def migrate_timestamps(self, source_tz: str = 'UTC', batch_size: int = 5000, pause: float = 0.0):
+        """Перевод таблиц Supabase на timestamptz и помесячные секции (supabase_migrate_timestamptz.sql)"""
+        if not self.supabase:
+            raise RuntimeError("Supabase не настроен")
+        return run_timestamptz_migration(self._rpc, source_tz=source_tz, batch_size=batch_size, pause=pause)
+
+    def ensure_partitions(self, months_ahead: int = 2):
+        """Создает помесячные секции истории цен и ордеров на months_ahead месяцев вперед"""
+        if not self.supabase:
+            return
+        for table in ('safetrade_price_history', 'safetrade_order_history'):
+            try:
+                self._rpc('safetrade_ensure_partitions', {'parent': table, 'months_ahead': months_ahead})
+            except Exception as e:
+                logging.debug(f"Секции {table} не созданы: {e}")
 
-    def get_duplicate_count(self):
-        """Получение количества дублирующихся записей"""
+    def manual_cleanup_if_needed(self):
+        """
+        Удаление дубликатов и создание уникальных индексов на сервере одним вызовом
+        safetrade_dedup_all (supabase_dedup.sql). Строки таблиц не выгружаются.
+        """
         try:
-            result = self.supabase.table('safetrade_trading_pairs').select('symbol').execute()
-            
-            if not result.data:
-                return 0
-            
-            symbols = [row['symbol'] for row in result.data]
-            unique_symbols = set(symbols)
-            return len(symbols) - len(unique_symbols)
+            removed = self._rpc('safetrade_dedup_all', {}) or []
+            for row in removed:
+                logging.info(f"{row['table_name']}: удалено дубликатов {row['removed']}")
+            self._upsert_supported = True
+            return True
         except Exception as e:
-            logging.error(f"Ошибка получения количества дубликатов: {e}")
-            return 0
+            logging.error(f"Ошибка очистки дубликатов (выполнен ли supabase_dedup.sql?): {e}")
+            return False
 
-    def get_trading_pairs_count(self):
-        """Получение количества торговых пар в базе"""
+    def get_missing_unique_keys(self) -> Optional[List[str]]:
+        """Таблицы без уникального индекса по естественному ключу (только каталог, без сканирования таблиц)"""
+        try:
+            indexed = {row['table_name'] for row in (self._rpc('safetrade_unique_keys', {}) or [])}
+        except Exception as e:
+            logging.debug(f"Функция safetrade_unique_keys недоступна: {e}")
+            return None
+        return [table for table in self.UNIQUE_KEYS if table not in indexed]
+
+    def count_rows(self, table: str, count: str = 'exact') -> Optional[int]:
+        """Количество строк таблицы, посчитанное на сервере (count=exact|planned|estimated), без выгрузки строк"""
+        if self.local:
+            # Локальное хранилище - источник истины: в нем и строки, еще не дошедшие до Supabase
+            return self.local.count(table)
         try:
-            result = self.supabase.table('safetrade_trading_pairs').select('symbol').execute()
-            return len(result.data) if result.data else 0
+            result = self.supabase.table(table).select('id', count=count).limit(1).execute()
+            return result.count
         except Exception as e:
-            logging.error(f"Ошибка получения количества торговых пар: {e}")
-            return 0
+            logging.error(f"Ошибка подсчета строк {table}: {e}")
+            return None
+
+    def get_trading_pairs_count(self):
+        """Получение количества торговых пар в базе"""
+        return self.count_rows('safetrade_trading_pairs') or 0
+
+    def upsert_trading_pairs(self, pairs: List[dict], chunk_size: int = 500) -> int:
+        """
+        Массовый upsert торговых пар ({symbol, base_currency, quote_currency}) по уникальному symbol.
+        Один запрос на chunk_size пар. Возвращает число отправленных пар.
+        """
+        now = to_utc_iso()
+        rows = [
+            {
+                'symbol': pair['symbol'],
+                'base_currency': pair.get('base_currency', ''),
+                'quote_currency': pair.get('quote_currency', ''),
+                'is_active': pair.get('is_active', True),
+                'last_updated': now
+            }
+            for pair in pairs if pair.get('symbol')
+        ]
+        if self.local:
+            return self.local.upsert_trading_pairs(rows)
+        for start in range(0, len(rows), chunk_size):
+            self.supabase.table('safetrade_trading_pairs').upsert(
+                rows[start:start + chunk_size],
+                on_conflict='symbol'
+            ).execute()
+        return len(rows)
 
     def check_database_health(self):
-        """Проверка здоровья базы данных и автоматическая очистка при необходимости"""
+        """Проверка здоровья базы данных: соединение и наличие уникальных ключей"""
         try:
             # Сначала проверяем соединение с базой
             if not self.check_connection():
                 logging.error("Нет соединения с базой данных")
                 return False
-            
-            total_count = self.get_trading_pairs_count()
-            duplicate_count = self.get_duplicate_count()
-            
-            if duplicate_count > 0:
-                logging.warning(f"Обнаружено {duplicate_count} дублирующихся записей из {total_count} общих")
-                
-                # Если дубликатов больше 5% от общего количества, запускаем автоматическую очистку
-                if duplicate_count > total_count * 0.05:
-                    logging.info("Запуск автоматической очистки дубликатов...")
-                    if self.cleanup_duplicate_trading_pairs():
-                        logging.info("Автоматическая очистка завершена успешно")
-                        return True
-                    else:
-                        logging.error("Автоматическая очистка завершилась с ошибкой")
-                        return False
-                else:
-                    logging.info("Количество дубликатов в допустимых пределах")
-                    return True
+
+            missing = self.get_missing_unique_keys()
+            if missing is None:
+                logging.warning("Не удалось проверить уникальные ключи: выполните supabase_dedup.sql в Supabase")
+            elif missing:
+                logging.warning(f"Нет уникальных ключей для {', '.join(missing)}: "
+                                f"выполните supabase_dedup.sql и `python main.py cleanup`")
             else:
-                logging.info("Дублирующихся записей не обнаружено")
-                return True
-                
+                logging.info("Уникальные ключи на месте, дубликаты исключены базой")
+            return True
+
         except Exception as e:
             logging.error(f"Ошибка при проверке здоровья БД: {e}")
             return False
 
     def check_connection(self):
         """Проверка соединения с Supabase"""
+        if not self.supabase:
+            return False
         try:
             # Простой тест соединения
             result = self.supabase.table('safetrade_trading_pairs').select('symbol').limit(1).execute()
@@ -729,6 +1037,91 @@ class DatabaseManager:
             logging.error(f"Ошибка соединения с Supabase: {e}")
             return False
 
+    STATS_TABLES = {
+        'trading_pairs': ('safetrade_trading_pairs', 'exact'),
+        'price_history': ('safetrade_price_history', 'estimated'),   # Самая большая таблица - оценка планировщика
+        'order_history': ('safetrade_order_history', 'exact'),
+        'ai_decisions': ('safetrade_ai_decisions', 'exact'),
+        'performance_metrics': ('safetrade_performance_metrics', 'exact')
+    }
+    # id - случайный UUID и порядка не задает; секционированные таблицы сортируются по ключу секций
+    PARTITIONED_TABLES = ('safetrade_price_history', 'safetrade_order_history')
+
+    def get_last_insert_time(self, table: str) -> Optional[str]:
+        """Время последней вставки: одна строка, самая поздняя по created_at (timestamp для секционированных)"""
+        if self.local:
+            # Локально id растет с каждой вставкой - последняя строка и есть последняя вставка
+            rows = self.local.recent(table, 1)
+            return (rows[0].get('created_at') or rows[0].get('timestamp')) if rows else None
+        order_column = 'timestamp' if table in self.PARTITIONED_TABLES else 'created_at'
+        try:
+            result = self.supabase.table(table).select('created_at').order(order_column, desc=True).limit(1).execute()
+            return result.data[0].get('created_at') if result.data else None
+        except Exception as e:
+            logging.debug(f"Не удалось получить время последней вставки {table}: {e}")
+            return None
+
+    def get_table_sizes(self) -> Dict[str, dict]:
+        """Размер и оценка строк таблиц из каталога (функция safetrade_table_stats из supabase_setup.sql)"""
+        try:
+            result = self.supabase.rpc('safetrade_table_stats', {}).execute()
+            return {row['table_name']: row for row in (result.data or [])}
+        except Exception as e:
+            logging.debug(f"Функция safetrade_table_stats недоступна: {e}")
+            return {}
+
+    def get_database_stats(self, max_age: float = 60):
+        """
+        Получение статистики базы данных для мониторинга.
+        Количество строк считается на сервере (с локальным хранилищем - в нем),
+        результат кэшируется на max_age секунд.
+        """
+        if self._stats_cache and time.time() - self._stats_cache[0] < max_age:
+            return self._stats_cache[1]
+        try:
+            stats = {
+                'missing_unique_keys': self.get_missing_unique_keys(),
+                'connection_healthy': self.check_connection(),
+                'tables': {}
+            }
+            sizes = self.get_table_sizes()
+            with ThreadPoolExecutor(max_workers=len(self.STATS_TABLES)) as executor:
+                counts = {key: executor.submit(self.count_rows, table, count)
+                          for key, (table, count) in self.STATS_TABLES.items()}
+                last_inserts = {key: executor.submit(self.get_last_insert_time, table)
+                                for key, (table, _) in self.STATS_TABLES.items()}
+                for key, (table, _) in self.STATS_TABLES.items():
+                    stats[key] = counts[key].result() or 0
+                    stats['tables'][table] = {
+                        'rows': stats[key],
+                        'size_bytes': sizes.get(table, {}).get('total_bytes'),
+                        'last_insert': last_inserts[key].result()
+                    }
+            
+            self._stats_cache = (time.time(), stats)
+            return stats
+        except Exception as e:
+            logging.error(f"Ошибка получения статистики БД: {e}")
+            return None
+
+    def close_connection(self):
+        """Безопасное закрытие соединения с базой данных"""
+        if self.write_queue:
+            # Дописываем очередь (или сохраняем ее на диск) до выхода
+            self.write_queue.close()
+        if self.syncer:
+            self.syncer.close()
+        if self.local:
+            self.local.close()
+        if not self.supabase:
+            return
+        try:
+            if hasattr(self.supabase, 'auth') and hasattr(self.supabase.auth, 'sign_out'):
+                self.supabase.auth.sign_out()
+                logging.info("Соединение с Supabase закрыто")
+        except Exception as e:
+            logging.warning(f"Ошибка при закрытии соединения: {e}")
+
 def test_api_permissions():
     """Проверяет права API ключа"""
     global api_client
@@ -793,64 +1186,30 @@ def test_api_permissions():
                 time.sleep(delay)
                 delay *= 2  # Экспоненциальная задержка
 
-    def get_database_stats(self):
-        """Получение статистики базы данных для мониторинга"""
-        try:
-            stats = {
-                'trading_pairs': self.get_trading_pairs_count(),
-                'price_history': 0,
-                'order_history': 0,
-                'ai_decisions': 0,
-                'performance_metrics': 0,
-                'duplicates': self.get_duplicate_count(),
-                'connection_healthy': self.check_connection()
-            }
-            
-            # Получаем количество записей в других таблицах
-            try:
-                result = self.supabase.table('safetrade_price_history').select('*').execute()
-                stats['price_history'] = len(result.data or [])
-            except:
-                pass
-                
-            try:
-                result = self.supabase.table('safetrade_order_history').select('*').execute()
-                stats['order_history'] = len(result.data or [])
-            except:
-                pass
-                
-            try:
-                result = self.supabase.table('safetrade_ai_decisions').select('*').execute()
-                stats['ai_decisions'] = len(result.data or [])
-            except:
-                pass
-                
-            try:
-                result = self.supabase.table('safetrade_performance_metrics').select('*').execute()
-                stats['performance_metrics'] = len(result.data or [])
-            except:
-                pass
-            
-            return stats
-        except Exception as e:
-            logging.error(f"Ошибка получения статистики БД: {e}")
-            return None
-
-    def close_connection(self):
-        """Безопасное закрытие соединения с базой данных"""
-        try:
-            if hasattr(self.supabase, 'auth') and hasattr(self.supabase.auth, 'sign_out'):
-                self.supabase.auth.sign_out()
-                logging.info("Соединение с Supabase закрыто")
-        except Exception as e:
-            logging.warning(f"Ошибка при закрытии соединения: {e}")
-
 # Инициализация менеджера базы данных будет выполнена после создания Supabase клиента
 
 # --- УЛУЧШЕННЫЙ TELEGRAM BOT С RETRY МЕХАНИЗМОМ ---
 class RobustTeleBot(telebot.TeleBot):
-    def __init__(self, token, **kwargs):
+    def __init__(self, token, command_metrics: Optional[CommandMetrics] = None, **kwargs):
         super().__init__(token, **kwargs)
+        self.command_metrics = command_metrics
+
+    def _timed(self, register, name: Optional[str]):
+        """Регистрирует обработчик через register, замеряя время его выполнения"""
+        def decorator(handler):
+            if self.command_metrics:
+                register(self.command_metrics.wrap(name or handler.__name__, handler))
+            else:
+                register(handler)
+            return handler
+        return decorator
+
+    def message_handler(self, commands=None, *args, **kwargs):
+        register = super().message_handler(commands, *args, **kwargs)
+        return self._timed(register, commands[0] if commands else None)
+
+    def callback_query_handler(self, *args, **kwargs):
+        return self._timed(super().callback_query_handler(*args, **kwargs), None)
         
     def infinity_polling_with_retry(self, timeout=20, long_polling_timeout=20, 
                                    retry_attempts=5, retry_delay=30):
@@ -883,34 +1242,67 @@ class RobustTeleBot(telebot.TeleBot):
 scraper = cloudscraper.create_scraper()
 
 # Инициализируем бота только если есть токен
+telegram_config = CONFIG.get('telegram', {})
+
+def record_command_metric(command: str, seconds: float, ok: bool):
+    """Сохраняет время выполнения команды Telegram в метрики производительности"""
+    if telegram_config.get('store_command_metrics', True):
+        db_manager.insert_performance_metric(
+            timestamp=to_utc_iso(),
+            metric_type="telegram_command",
+            metric_name=command,
+            value=seconds,
+            metadata=json.dumps({"ok": ok})
+        )
+
+command_metrics = CommandMetrics(slow_threshold=telegram_config.get('slow_command_threshold', 10),
+                                 sink=record_command_metric)
+
 bot = None
 if TELEGRAM_BOT_TOKEN:
-    bot = RobustTeleBot(TELEGRAM_BOT_TOKEN)
+    # Обработчики выполняются в ограниченном пуле потоков, polling-поток только раздает обновления
+    bot = RobustTeleBot(TELEGRAM_BOT_TOKEN, command_metrics=command_metrics,
+                        threaded=True, num_threads=telegram_config.get('num_threads', 8))
 else:
     logging.warning("TELEGRAM_BOT_TOKEN не указан. Telegram бот будет отключен.")
 
-# Инициализируем Supabase (обязательно)
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logging.error("❌ Supabase настройки обязательны!")
-    logging.error("   - SAFETRADE_SUPABASE_URL")
-    logging.error("   - SAFETRADE_SUPABASE_KEY")
-    logging.error("Бот не может работать без Supabase")
-    sys.exit(1)
+# Локальное хранилище SQLite - основная цель записи; Supabase синхронизируется в фоне
+local_store_config = CONFIG.get('database', {}).get('local_store', {})
+local_store = None
+if local_store_config.get('enabled', True):
+    local_store = LocalStore(log_dir / local_store_config.get('path', 'safetrade.db'))
+    logging.info(f"✅ Локальное хранилище: {local_store.path}")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Инициализируем Supabase (обязателен только без локального хранилища)
+supabase = None
+if not SUPABASE_URL or not SUPABASE_KEY:
+    if not local_store:
+        logging.error("❌ Supabase настройки обязательны!")
+        logging.error("   - SAFETRADE_SUPABASE_URL")
+        logging.error("   - SAFETRADE_SUPABASE_KEY")
+        logging.error("Бот не может работать без Supabase")
+        sys.exit(1)
+    logging.warning("Supabase не настроен, данные хранятся только локально")
+else:
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Тестируем соединение с Supabase
-try:
-    # Простой тест соединения
-    test_result = supabase.table('safetrade_trading_pairs').select('symbol').limit(1).execute()
-    logging.info("✅ Supabase подключен и соединение протестировано")
-except Exception as e:
-    logging.error(f"❌ Ошибка подключения к Supabase: {e}")
-    logging.error("Проверьте URL, ключ и доступность сервера")
-    sys.exit(1)
+    # Тестируем соединение с Supabase
+    try:
+        # Простой тест соединения
+        test_result = supabase.table('safetrade_trading_pairs').select('symbol').limit(1).execute()
+        logging.info("✅ Supabase подключен и соединение протестировано")
+    except Exception as e:
+        logging.error(f"❌ Ошибка подключения к Supabase: {e}")
+        if not local_store:
+            logging.error("Проверьте URL, ключ и доступность сервера")
+            sys.exit(1)
+        logging.warning("Продолжаем с локальным хранилищем, синхронизация возобновится при доступности Supabase")
 
 # Инициализация менеджера базы данных
-db_manager = DatabaseManager(supabase)
+db_manager = DatabaseManager(supabase, local_store)
+db_manager.start_write_queue(log_dir / "db_write_queue.jsonl")
+db_manager.start_sync(interval=local_store_config.get('sync_interval', 5),
+                      batch_size=local_store_config.get('sync_batch_size', 500))
 logging.info("✅ Менеджер базы данных инициализирован")
 
 # Инициализируем Cerebras только если включен и есть ключ
@@ -1157,85 +1549,30 @@ def get_all_markets():
     # В случае ошибки, пробуем получить из базы данных
     return get_markets_from_db()
 
+# Набор пар, уже сохраненный в этом процессе: повторная синхронизация того же списка не нужна
+saved_market_symbols = frozenset()
+
 def save_markets_to_db(markets):
-    """Сохраняет торговые пары в базу данных с улучшенной обработкой дубликатов"""
-    global db_manager
+    """Сохраняет торговые пары в базу одним массовым upsert (дубликаты исключает UNIQUE(symbol))"""
+    global saved_market_symbols
     try:
-        saved_count = 0
-        skipped_count = 0
-        error_count = 0
-        
-        # Получаем текущее количество записей
-        current_count = db_manager.get_trading_pairs_count()
-        logging.info(f"Текущее количество торговых пар в БД: {current_count}")
-        
-        # Получаем существующие символы для проверки
-        existing_symbols = set()
-        try:
-            result = db_manager.supabase.table('safetrade_trading_pairs').select('symbol').execute()
-            existing_symbols = {row['symbol'] for row in result.data}
-        except Exception as e:
-            logging.warning(f"Не удалось получить существующие символы: {e}")
-        
-        # Если все торговые пары уже существуют, просто логируем и выходим
-        if len(existing_symbols) >= len(markets):
-            logging.info(f"Все {len(markets)} торговых пар уже существуют в БД. Обновление не требуется.")
-            logging.info(f"Текущее количество в БД: {len(existing_symbols)}, получено с API: {len(markets)}")
-            return
-        
-        # Фильтруем только новые торговые пары
-        new_markets = []
-        for market in markets:
-            symbol = market.get('id', '')
-            if symbol and symbol not in existing_symbols:
-                new_markets.append(market)
-            else:
-                skipped_count += 1
-        
-        if not new_markets:
-            logging.info(f"Новых торговых пар не найдено. Пропущено: {skipped_count}")
+        pairs = [
+            {
+                'symbol': market.get('id', ''),
+                'base_currency': market.get('base_unit', ''),
+                'quote_currency': market.get('quote_unit', '')
+            }
+            for market in markets if market.get('id')
+        ]
+        symbols = frozenset(pair['symbol'] for pair in pairs)
+        if symbols == saved_market_symbols:
+            logging.debug(f"Список из {len(symbols)} торговых пар не изменился, сохранение не требуется")
             return
         
-        logging.info(f"Найдено {len(new_markets)} новых торговых пар для добавления")
-        
-        # Вставляем новые торговые пары
-        for market in new_markets:
-            symbol = market.get('id', '')
-            try:
-                result = db_manager.insert_trading_pair(
-                    symbol=symbol,
-                    base_currency=market.get('base_unit', ''),
-                    quote_currency=market.get('quote_unit', ''),
-                    is_active=True
-                )
-                if result:
-                    saved_count += 1
-                else:
-                    error_count += 1
-            except Exception as e:
-                error_count += 1
-                # Логируем только серьезные ошибки
-                if "duplicate key" not in str(e).lower() and "23505" not in str(e):
-                    logging.debug(f"Ошибка при сохранении пары {symbol}: {e}")
-                continue
-        
-        final_count = db_manager.get_trading_pairs_count()
-        logging.info(f"Сохранено {saved_count} новых торговых пар, пропущено {skipped_count}, ошибок: {error_count}")
-        logging.info(f"Общее количество торговых пар в БД: {final_count}")
-        
-        # Проверяем здоровье базы данных после сохранения
-        if error_count > 0 or skipped_count > 0:
-            logging.info("Проверка здоровья базы данных...")
-            db_manager.check_database_health()
-        
-        # Если много ошибок дублирования, предлагаем очистку
-        if error_count > len(new_markets) * 0.3:  # Если больше 30% ошибок
-            logging.info("Обнаружено много дублирующихся записей. Рекомендуется очистка БД.")
-            logging.info("Для принудительной очистки используйте: db_manager.force_cleanup_duplicates()")
-        
-        # Проверяем общее здоровье БД
-        db_manager.check_database_health()
-        
+        saved_count = db_manager.upsert_trading_pairs(pairs)
+        saved_market_symbols = symbols
+        total_count = db_manager.get_trading_pairs_count()
+        logging.info(f"Сохранено {saved_count} торговых пар одним upsert, всего в БД: {total_count}")
     except Exception as e:
         logging.error(f"Ошибка при сохранении торговых пар: {e}")
 
@@ -1243,10 +1580,8 @@ def get_markets_from_db():
     """Получает торговые пары из базы данных"""
     global db_manager
     try:
-        result = db_manager.supabase.table('safetrade_trading_pairs').select('*').eq('is_active', True).execute()
-        
         markets = []
-        for row in result.data:
+        for row in db_manager.get_trading_pairs():
             markets.append({
                 'id': row['symbol'],
                 'base_unit': row['base_currency'],
@@ -1403,11 +1738,26 @@ def get_mexc_history_str(coin: str = None):
     except Exception as e:
         return f"⚠️ Ошибка получения истории MEXC для {symbol}: {str(e)}"
 
+def get_local_order_history(limit: int = 5):
+    """Ордера бота из базы в формате ответа биржи для get_sf_history_str"""
+    states = {'filled': 'done', 'cancelled': 'cancel', 'failed': 'reject'}
+    return [
+        {
+            'id': row['order_id'], 'market': row['symbol'], 'side': row['side'],
+            'amount': row['amount'], 'price': row.get('price') or 'N/A', 'total': row.get('total') or 'N/A',
+            'state': states.get(row['status'], row['status']), 'created_at': row['timestamp']
+        }
+        for row in db_manager.get_order_history(limit)
+    ]
+
 def get_sf_history_str():
     """Получает и форматирует историю сделок с биржи SafeTrade."""
     try:
         # Получаем историю ордеров через существующую функцию
         orders = get_safetrade_order_history()
+        if not orders:
+            # Биржа недоступна или вернула пусто - показываем ордера бота из локальной истории
+            orders = get_local_order_history()
         
         if not orders or len(orders) == 0:
             return "📜 **История SafeTrade пуста**\n\nУ вас пока нет совершенных сделок."
@@ -1478,6 +1828,7 @@ def get_sellable_balances():
         logging.info("🔍 НАЧАЛО ПОЛУЧЕНИЯ БАЛАНСОВ...")
         
         # Используем новый API клиент для получения балансов
+        taken_at = time.time()
         balances = api_client.get_balances()
         
         logging.info(f"🔍 Получено балансов: {len(balances) if isinstance(balances, list) else 'не список'}")
@@ -1489,6 +1840,8 @@ def get_sellable_balances():
             logging.warning("Некорректный формат балансов")
             return None
         
+        balance_ledger.update_from_balances(balances, taken_at)
+        
         # Получаем доступные торговые пары
         markets = get_all_markets()
         available_currencies = {market.get('base_unit', '').upper() for market in markets}
@@ -1550,6 +1903,19 @@ def get_sellable_balances():
         logging.error(f"Ошибка при получении балансов: {e}")
         return None
 
+def refresh_balance_ledger():
+    """Обновляет учет средств свежим снимком балансов биржи"""
+    try:
+        taken_at = time.time()
+        balances = api_client.get_balances()
+        if isinstance(balances, list):
+            balance_ledger.update_from_balances(balances, taken_at)
+            return True
+        logging.warning(f"Некорректный формат балансов при обновлении учета средств: {balances}")
+    except Exception as e:
+        logging.error(f"Ошибка обновления учета средств: {e}")
+    return False
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def get_ticker_price(symbol):
     """Получает текущую цену для указанной торговой пары"""
@@ -1599,6 +1965,8 @@ def get_ticker_price(symbol):
                 with cache_lock:
                     prices_cache["data"][symbol] = price
                     prices_cache["last_update"] = time.time()
+                    if ticker.get('vol'):
+                        prices_cache.setdefault("volume", {})[symbol] = float(ticker.get('vol'))
                 
                 # Сохраняем в базу данных
                 try:
@@ -1677,12 +2045,13 @@ def get_ticker_price_internal(symbol):
     return None
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_orderbook(symbol):
-    """Получение книги ордеров для указанной пары"""
+def get_orderbook(symbol, force_refresh=False):
+    """Получение книги ордеров для указанной пары (force_refresh - в обход кэша)"""
     global orderbook_cache
     
     with cache_lock:
-        if (symbol in orderbook_cache["data"] and 
+        if (not force_refresh and
+            symbol in orderbook_cache["data"] and 
             symbol in orderbook_cache["last_update"] and 
             time.time() - orderbook_cache["last_update"][symbol] < orderbook_cache["cache_duration"]):
             return orderbook_cache["data"][symbol]
@@ -1709,6 +2078,11 @@ def get_orderbook(symbol):
             with cache_lock:
                 orderbook_cache["data"][symbol] = orderbook
                 orderbook_cache["last_update"][symbol] = time.time()
+                last_price = prices_cache["data"].get(symbol)
+                last_volume = prices_cache.get("volume", {}).get(symbol)
+            
+            if book_recorder:
+                book_recorder.record(symbol, orderbook, last_price, last_volume)
             
             logging.info(f"✅ Успешно получена книга ордеров для {symbol} через {endpoint}")
             return orderbook
@@ -1934,6 +2308,7 @@ def execute_trading_strategy(priority_score: PriorityScore, ai_decision: "Tradin
                     TWAP = "twap"
                     ICEBERG = "iceberg"
                     ADAPTIVE = "adaptive"
+                    VWAP = "vwap"
             
             strategy = ai_decision.strategy
             parameters = ai_decision.parameters
@@ -1949,6 +2324,7 @@ def execute_trading_strategy(priority_score: PriorityScore, ai_decision: "Tradin
                     TWAP = "twap"
                     ICEBERG = "iceberg"
                     ADAPTIVE = "adaptive"
+                    VWAP = "vwap"
             
             # Используем стандартную логику выбора стратегии
             if priority_score.usd_value < 50:
@@ -1980,6 +2356,11 @@ def execute_trading_strategy(priority_score: PriorityScore, ai_decision: "Tradin
             return execute_iceberg_sell(market_symbol, amount, visible_ratio, max_attempts)
         elif strategy == SellStrategy.ADAPTIVE:
             return execute_adaptive_sell(market_symbol, amount)
+        elif strategy == SellStrategy.VWAP:
+            vwap_config = CONFIG['trading']['strategies'].get('vwap', {})
+            duration = parameters.get("duration_minutes", vwap_config.get('default_duration', 60))
+            chunks = parameters.get("chunks", vwap_config.get('default_chunks', 6))
+            return execute_vwap_sell(market_symbol, amount, duration, chunks)
         
         return False
     except Exception as e:
@@ -1989,36 +2370,16 @@ def execute_trading_strategy(priority_score: PriorityScore, ai_decision: "Tradin
 def execute_market_sell(market_symbol, amount):
     """Исполнение рыночной продажи"""
     try:
-        # Для NOCK используем специальную обработку
-        if "nock" in market_symbol.lower():
-            # Округляем количество до допустимой точности
-            rounded_amount = round_amount_for_market(market_symbol, amount)
-            # Дополнительно округляем для NOCK до 4 знаков после запятой
-            rounded_amount = round(rounded_amount, 4)
-            logging.info(f"Дополнительно округляем NOCK до 4 знаков: {rounded_amount}")
-            
-            # Пробуем создать ордер
-            result = create_sell_order_safetrade(market_symbol, rounded_amount, "market")
-            
-            # Если ошибка insufficient_balance, пробуем с меньшей суммой
-            if result and isinstance(result, str) and "insufficient_balance" in result:
-                logging.warning(f"Ошибка insufficient_balance для NOCK, пробуем с 95% от суммы")
-                reduced_amount = rounded_amount * 0.95
-                reduced_amount = round(reduced_amount, 4)
-                logging.info(f"Пробуем с уменьшенной суммой: {reduced_amount}")
-                result = create_sell_order_safetrade(market_symbol, reduced_amount, "market")
-            
-            # Если все еще ошибка, пробуем еще меньше
-            if result and isinstance(result, str) and "insufficient_balance" in result:
-                logging.warning(f"Все еще ошибка insufficient_balance, пробуем с 90% от суммы")
-                reduced_amount = rounded_amount * 0.9
-                reduced_amount = round(reduced_amount, 4)
-                logging.info(f"Пробуем с еще меньшей суммой: {reduced_amount}")
-                result = create_sell_order_safetrade(market_symbol, reduced_amount, "market")
-        else:
-            # Для других валют стандартная обработка
-            rounded_amount = round_amount_for_market(market_symbol, amount)
-            result = create_sell_order_safetrade(market_symbol, rounded_amount, "market")
+        # Объем уже ограничен свободным остатком из balance_ledger внутри create_sell_order_safetrade
+        rounded_amount = round_amount_for_market(market_symbol, amount)
+        result = create_sell_order_safetrade(market_symbol, rounded_amount, "market")
+        
+        # insufficient_balance означает, что снимок балансов устарел: обновляем его
+        # и выставляем ровно свободный остаток, без перебора процентов
+        if result and isinstance(result, str) and "insufficient_balance" in result:
+            logging.warning(f"Ошибка insufficient_balance для {market_symbol}, обновляем балансы и пробуем точный остаток")
+            if refresh_balance_ledger():
+                result = create_sell_order_safetrade(market_symbol, rounded_amount, "market")
         
         # Проверяем успешность создания ордера
         if result and isinstance(result, str):
@@ -2075,14 +2436,11 @@ def execute_twap_sell(market_symbol, total_amount, duration_minutes=60, chunks=6
             
             # Размещаем лимитный ордер чуть выше текущей цены
             limit_price = current_price * 1.001
-            result = create_sell_order_safetrade(market_symbol, chunk_amount, "limit", limit_price)
+            result = create_sell_order_safetrade(market_symbol, chunk_amount, "limit", limit_price, strategy="twap")
             
             if result and isinstance(result, str) and "✅" in result and "Успешно размещен ордер" in result:
                 successful_chunks += 1
-                order_id = extract_order_id_from_result(result)
-                if order_id:
-                    # Отслеживаем исполнение ордера
-                    threading.Thread(target=track_order_execution, args=(order_id, 300)).start()
+                # Исполнение части отслеживает order_tracker (ордер зарегистрирован при создании)
             
             # Ждем до следующего интервала
             if i < chunks - 1:
@@ -2092,56 +2450,230 @@ def execute_twap_sell(market_symbol, total_amount, duration_minutes=60, chunks=6
     
     return successful_chunks > 0
 
-def execute_iceberg_sell(market_symbol, total_amount, visible_ratio=0.1, max_attempts=20):
-    """Исполнение Iceberg продажи"""
-    if total_amount <= 0 or visible_ratio <= 0 or max_attempts <= 0:
-        logging.warning("Некорректные параметры для Iceberg")
+def execute_vwap_sell(market_symbol, total_amount, duration_minutes=60, chunks=6):
+    """
+    Исполнение VWAP продажи.
+    Части выставляются через равные промежутки, но их размер пропорционален
+    ожидаемому объему торгов в этот час суток (профиль из safetrade_price_history).
+    """
+    if total_amount <= 0 or chunks <= 0:
+        logging.warning("Некорректные параметры для VWAP")
         return False
     
-    remaining = total_amount
-    attempts = 0
-    successful_orders = 0
+    vwap_config = CONFIG['trading']['strategies'].get('vwap', {})
+    history = db_manager.get_price_history(market_symbol.upper(), days=int(vwap_config.get('history_days', 7)))
+    profile = build_hourly_profile(history, min_observed_hours=int(vwap_config.get('min_observed_hours', 12)))
+    started_at = datetime.now()
+    schedule = schedule_slices(profile, started_at, duration_minutes, chunks)
+    logging.info(f"VWAP {market_symbol}: {len(history)} записей истории, доли частей {[round(share, 3) for _, share in schedule]}")
     
-    while remaining > 0 and attempts < max_attempts:
+    rules = get_sizing_rules(market_symbol)
+    total = to_decimal(total_amount)
+    allocated = Decimal("0")        # Объем только подтвержденных биржей частей
+    scheduled_share = Decimal("0")
+    successful_chunks = 0
+    
+    for i, (offset_seconds, share) in enumerate(schedule):
+        scheduled_share += to_decimal(share)
         try:
-            # Определяем размер видимой части
-            current_visible = min(visible_ratio * total_amount, remaining)
-            
-            # Получаем лучшую цену покупки из книги ордеров
-            orderbook = get_orderbook(market_symbol)
-            if not orderbook or not orderbook.get('bids'):
-                attempts += 1
-                time.sleep(5)
+            # Ждем начала интервала части
+            wait_seconds = offset_seconds - (datetime.now() - started_at).total_seconds()
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+            
+            # Часть догоняет план с начала исполнения: объем неудачных и пропущенных
+            # частей переносится в следующую, последняя забирает весь остаток
+            if i == len(schedule) - 1:
+                chunk_amount = total - allocated
+            else:
+                chunk_amount = quantize_amount(total * scheduled_share - allocated, rules)
+            if chunk_amount <= 0:
                 continue
             
-            best_bid = float(orderbook['bids'][0][0])
+            # Продаем по лучшему bid из свежего стакана, чтобы часть исполнилась в своем интервале
+            orderbook = get_orderbook(market_symbol, force_refresh=True)
+            if orderbook and orderbook.get('bids'):
+                limit_price = float(orderbook['bids'][0][0])
+            else:
+                limit_price = get_ticker_price(market_symbol)
+            if not limit_price:
+                continue
             
-            # Размещаем лимитный ордер
-            result = create_sell_order_safetrade(market_symbol, current_visible, "limit", best_bid)
+            result = create_sell_order_safetrade(market_symbol, float(chunk_amount), "limit", limit_price, strategy="vwap")
             
             if result and isinstance(result, str) and "✅" in result and "Успешно размещен ордер" in result:
-                successful_orders += 1
-                remaining -= current_visible
-                order_id = extract_order_id_from_result(result)
-                if order_id:
-                    threading.Thread(target=track_order_execution, args=(order_id, 60)).start()
-            
-            attempts += 1
-            time.sleep(5)
+                allocated += chunk_amount
+                successful_chunks += 1
+                # Исполнение части отслеживает order_tracker (ордер зарегистрирован при создании)
+            else:
+                logging.warning(f"VWAP {market_symbol}: часть {i + 1} ({format_decimal(chunk_amount)}) не размещена, объем переносится в следующую")
         except Exception as e:
-            logging.error(f"Ошибка в Iceberg исполнении: {e}")
-            attempts += 1
+            logging.error(f"Ошибка в VWAP исполнении части {i + 1}: {e}")
     
-    return successful_orders > 0
+    if allocated < total:
+        logging.warning(f"VWAP {market_symbol}: не размещено {format_decimal(total - allocated)} из {format_decimal(total)}")
+    return successful_chunks > 0
 
-def execute_adaptive_sell(market_symbol, total_amount):
-    """Адаптивная продажа на основе книги ордеров"""
-    if total_amount <= 0:
-        logging.warning("Некорректный amount для adaptive")
+def execute_iceberg_sell(market_symbol, total_amount, visible_ratio=0.1, max_attempts=20):
+    """
+    Исполнение Iceberg продажи.
+    Следующая видимая часть выставляется только после исполнения предыдущей
+    (или ее частичного исполнения не ниже refill_fill_ratio), цена берется из свежей книги ордеров.
+    """
+    if total_amount <= 0 or visible_ratio <= 0 or max_attempts <= 0:
+        logging.warning("Некорректные параметры для Iceberg")
         return False
     
-    try:
-        orderbook = get_orderbook(market_symbol)
+    iceberg_config = CONFIG['trading']['strategies']['iceberg']
+    max_open_slices = max(1, int(iceberg_config.get('max_open_slices', 1)))
+    refill_fill_ratio = float(iceberg_config.get('refill_fill_ratio', 0.9))
+    poll_interval = float(iceberg_config.get('poll_interval', 2))
+    slice_timeout = float(iceberg_config.get('slice_timeout', 120))
+    max_duration = float(iceberg_config.get('max_duration', 1800))
+    
+    slice_size = visible_ratio * total_amount
+    started_at = time.time()
+    unplaced = total_amount      # Объем, который еще не выставлен на биржу
+    filled_total = 0.0
+    open_slices = {}             # order_id -> {"amount", "placed_at", "refilled"}
+    attempts = 0
+    successful_orders = 0
+    
+    while unplaced > 0 or open_slices:
+        expired = time.time() - started_at > max_duration
+        # 1. Выставляем новые части, пока не достигнут лимит "незаполненных" частей
+        active_slices = sum(1 for s in open_slices.values() if not s["refilled"])
+        while unplaced > 0 and active_slices < max_open_slices and attempts < max_attempts and not expired:
+            attempts += 1
+            try:
+                orderbook = get_orderbook(market_symbol, force_refresh=True)
+                if not orderbook or not orderbook.get('bids'):
+                    logging.warning(f"Iceberg {market_symbol}: пустая книга ордеров, ждем")
+                    break
+                
+                best_bid = float(orderbook['bids'][0][0])
+                current_visible = min(slice_size, unplaced)
+                result = create_sell_order_safetrade(market_symbol, current_visible, "limit", best_bid, strategy="iceberg")
+                
+                order_id = None
+                if result and isinstance(result, str) and "✅" in result and "Успешно размещен ордер" in result:
+                    order_id = extract_order_id_from_result(result)
+                if order_id:
+                    successful_orders += 1
+                    unplaced -= current_visible
+                    open_slices[order_id] = {
+                        "amount": current_visible,
+                        "placed_at": time.time(),
+                        "refilled": False
+                    }
+                    active_slices += 1
+                    logging.info(f"Iceberg {market_symbol}: часть {current_visible} по {best_bid}, осталось выставить {unplaced}")
+                else:
+                    # Без ID исполнение части не отследить - считаем размещение неудачным
+                    logging.warning(f"Iceberg {market_symbol}: не удалось выставить часть: {result}")
+                    break
+            except Exception as e:
+                logging.error(f"Ошибка в Iceberg исполнении: {e}")
+                break
+        
+        if not open_slices and (unplaced <= 0 or attempts >= max_attempts or expired):
+            break
+        
+        time.sleep(poll_interval)
+        
+        # 2. Проверяем исполнение выставленных частей
+        for order_id in list(open_slices.keys()):
+            slice_info = open_slices[order_id]
+            try:
+                # Состояние части берем из order_tracker, а не отдельным запросом
+                tracked = order_tracker.get(order_id)
+                if tracked is not None and tracked.checks == 0 and not expired:
+                    continue
+                order = tracked.last_data if tracked is not None else get_order_details(order_id)
+                if not order:
+                    # Состояние неизвестно (ошибка запроса) - часть не считается исполненной
+                    if expired:
+                        logging.warning(f"Iceberg {market_symbol}: состояние части {order_id} неизвестно, снимаем по лимиту времени")
+                        cancel_order(order_id)
+                        del open_slices[order_id]
+                    continue
+                state = tracked.state if tracked is not None else order.get('state', 'unknown')
+                fill_ratio = get_order_fill_ratio(order)
+                
+                if state in ['done', 'filled']:
+                    filled_total += slice_info["amount"]
+                    del open_slices[order_id]
+                elif state in ['cancel', 'cancelled', 'reject', 'rejected']:
+                    filled_total += slice_info["amount"] * fill_ratio
+                    unplaced += slice_info["amount"] * (1 - fill_ratio)
+                    del open_slices[order_id]
+                elif expired or time.time() - slice_info["placed_at"] > slice_timeout:
+                    # Часть стоит слишком долго (в том числе почти исполненная) - снимаем,
+                    # остаток перевыставляется по новой цене, если не исчерпан общий лимит времени
+                    reason = f"лимит {max_duration} сек" if expired else f"не исполнена за {slice_timeout} сек"
+                    logging.info(f"Iceberg {market_symbol}: часть {order_id} {reason}, снимаем")
+                    if cancel_order(order_id, slice_info["amount"] * fill_ratio):
+                        filled_total += slice_info["amount"] * fill_ratio
+                        unplaced += slice_info["amount"] * (1 - fill_ratio)
+                        del open_slices[order_id]
+                        continue
+                    # Отмена не прошла - узнаем фактическое состояние части
+                    latest = get_order_details(order_id)
+                    latest_state = latest.get('state') if latest else None
+                    latest_ratio = get_order_fill_ratio(latest) if latest else fill_ratio
+                    if latest_state in ['done', 'filled']:
+                        filled_total += slice_info["amount"]
+                        del open_slices[order_id]
+                    elif latest_state in ['cancel', 'cancelled', 'reject', 'rejected']:
+                        filled_total += slice_info["amount"] * latest_ratio
+                        unplaced += slice_info["amount"] * (1 - latest_ratio)
+                        del open_slices[order_id]
+                    elif expired:
+                        logging.warning(f"Iceberg {market_symbol}: часть {order_id} не удалось снять, "
+                                        f"остаток {slice_info['amount'] * (1 - latest_ratio)} остается на бирже")
+                        filled_total += slice_info["amount"] * latest_ratio
+                        del open_slices[order_id]
+                    else:
+                        # Часть еще стоит на бирже - повторим отмену через slice_timeout
+                        slice_info["placed_at"] = time.time()
+                elif fill_ratio >= refill_fill_ratio:
+                    slice_info["refilled"] = True
+            except Exception as e:
+                logging.error(f"Ошибка проверки части {order_id} Iceberg: {e}")
+    
+    time_to_complete = time.time() - started_at
+    completed = unplaced <= 0 and not open_slices
+    logging.info(
+        f"Iceberg {market_symbol}: {'завершен' if completed else 'остановлен'} за {time_to_complete:.1f} сек, "
+        f"исполнено {filled_total:.8f} из {total_amount:.8f}, частей: {successful_orders}, попыток: {attempts}"
+    )
+    try:
+        db_manager.insert_performance_metric(
+            timestamp=datetime.now().isoformat(),
+            metric_type="strategy",
+            metric_name="iceberg_time_to_complete",
+            value=time_to_complete,
+            metadata=json.dumps({
+                "symbol": market_symbol,
+                "total_amount": total_amount,
+                "filled_amount": filled_total,
+                "slices": successful_orders,
+                "completed": completed
+            })
+        )
+    except Exception as e:
+        logging.warning(f"Не удалось сохранить метрику Iceberg: {e}")
+    
+    return successful_orders > 0
+
+def execute_adaptive_sell(market_symbol, total_amount):
+    """Адаптивная продажа на основе книги ордеров"""
+    if total_amount <= 0:
+        logging.warning("Некорректный amount для adaptive")
+        return False
+    
+    try:
+        orderbook = get_orderbook(market_symbol)
         if not orderbook or not orderbook.get('bids'):
             logging.warning(f"Пустая книга ордеров для {market_symbol}")
             return False
@@ -2157,10 +2689,10 @@ def execute_adaptive_sell(market_symbol, total_amount):
         # Сортируем по цене (от высокой к низкой)
         sorted_prices = sorted(price_levels.keys(), reverse=True)
         
-        # Размещаем ордера на разных уровнях
+        # Распределяем объем по уровням
         remaining = total_amount
-        placed_orders = 0
         liquidity_ratio = CONFIG['trading']['strategies']['adaptive']['liquidity_ratio']
+        ladder = []
         
         for price in sorted_prices:
             if remaining <= 0:
@@ -2170,17 +2702,17 @@ def execute_adaptive_sell(market_symbol, total_amount):
             order_size = min(remaining, liquidity_at_price * liquidity_ratio)
             
             if order_size > 0:
-                result = create_sell_order_safetrade(market_symbol, order_size, "limit", price)
-                if result and isinstance(result, str) and "✅" in result and "Успешно размещен ордер" in result:
-                    placed_orders += 1
-                    remaining -= order_size
-                    order_id = extract_order_id_from_result(result)
-                    if order_id:
-                        threading.Thread(target=track_order_execution, args=(order_id, 600)).start()
+                ladder.append((price, order_size))
+                remaining -= order_size
+        
+        # Выставляем всю лестницу одним пакетом
+        placed = submit_sell_ladder(market_symbol, ladder, strategy="adaptive")
+        placed_orders = len(placed)
+        remaining = total_amount - sum(level["amount"] for level in placed)
         
         # Если остались неразмещенные средства, используем рыночный ордер
         if remaining > 0:
-            result = create_sell_order_safetrade(market_symbol, remaining, "market")
+            result = create_sell_order_safetrade(market_symbol, remaining, "market", strategy="adaptive")
             if result and isinstance(result, str) and "✅" in result and "Успешно размещен ордер" in result:
                 placed_orders += 1
         
@@ -2189,6 +2721,88 @@ def execute_adaptive_sell(market_symbol, total_amount):
         logging.error(f"Ошибка в adaptive продаже {market_symbol}: {e}")
         return False
 
+def get_market_info(market_symbol):
+    """Возвращает описание рынка (точность, минимумы) из кэша торговых пар"""
+    markets = get_all_markets()
+    if markets:
+        for market in markets:
+            if market.get('id', '').lower() == market_symbol.lower():
+                return market
+    return None
+
+def submit_sell_ladder(market_symbol, levels, strategy=None):
+    """
+    Выставляет лестницу лимитных ордеров на продажу.
+    
+    Все уровни (price, amount) готовятся заранее из одного снимка рынка и
+    отправляются параллельно (не более max_parallel_submissions запросов одновременно).
+    Журнал, резерв баланса, запись в БД и отслеживание выполняются сразу после
+    отправки всех уровней, до возврата: иначе при остановке процесса живые
+    ордера не попали бы в восстановление после перезапуска.
+    Возвращает список размещенных уровней: {"price", "amount", "order"}.
+    """
+    if not levels:
+        return []
+    
+    max_parallel = max(1, int(CONFIG['trading']['strategies']['adaptive'].get('max_parallel_submissions', 4)))
+    
+    # Один снимок рынка на всю лестницу
+    rules = get_sizing_rules(market_symbol)
+    
+    prepared = []
+    for price, amount in levels:
+        try:
+            # Объем округляется ВНИЗ, чтобы не продать больше, чем есть
+            order_size = size_order(amount, rules, price=price)
+            order_validator.validate_order_params(market_symbol, float(order_size.amount), "limit", float(order_size.price))
+        except ValueError as e:
+            logging.info(f"Лестница {market_symbol}: пропускаем уровень {price}: {e}")
+            continue
+        prepared.append({"price": float(order_size.price), "amount": float(order_size.amount), "size": order_size})
+    
+    if not prepared:
+        return []
+    
+    def submit_level(level):
+        return api_client.create_order(
+            market=market_symbol,
+            side="sell",
+            amount=level["size"].amount_str,
+            order_type="limit",
+            price=level["size"].price_str
+        )
+    
+    started_at = time.time()
+    placed = []
+    with ThreadPoolExecutor(max_workers=min(max_parallel, len(prepared)), thread_name_prefix="ladder") as executor:
+        futures = {executor.submit(submit_level, level): level for level in prepared}
+        for future in as_completed(futures):
+            level = futures[future]
+            try:
+                order_details = future.result()
+                if order_details and order_details.get('id'):
+                    placed.append({**level, "order": order_details})
+                else:
+                    logging.warning(f"Лестница {market_symbol}: пустой ответ для уровня {level['price']}: {order_details}")
+            except Exception as e:
+                logging.warning(f"Лестница {market_symbol}: не удалось выставить уровень {level['price']}: {e}")
+    
+    logging.info(f"Лестница {market_symbol}: выставлено {len(placed)}/{len(prepared)} уровней за {time.time() - started_at:.2f} сек")
+    
+    # Регистрация после отправки всех уровней: сами запросы к бирже уже не задерживает
+    if placed:
+        register_placed_orders([level["order"] for level in placed], market_symbol, strategy)
+    
+    return placed
+
+def register_placed_orders(orders, market_symbol, strategy=None):
+    """Сохраняет уже размещенные ордера в БД и запускает их отслеживание"""
+    for order_details in orders:
+        try:
+            handle_successful_order(order_details, market_symbol, strategy)
+        except Exception as e:
+            logging.error(f"Ошибка регистрации ордера {order_details.get('id')}: {e}")
+
 def extract_order_id_from_result(result_text):
     """Извлекает ID ордера из результата создания ордера"""
     try:
@@ -2198,70 +2812,48 @@ def extract_order_id_from_result(result_text):
         pass
     return None
 
+def get_sizing_rules(market_symbol, market_info=None):
+    """Правила размера ордера для рынка SafeTrade с учетом выученной точности"""
+    if market_info is None:
+        market_info = get_market_info(market_symbol)
+    return rules_from_safetrade_market(market_info, amount_precision=precision_cache.get_precision(market_symbol))
+
 def round_amount_for_market(market_symbol, amount):
     """
     Округляет количество до допустимой точности для конкретной торговой пары.
-    Использует информацию о точности из API рынка.
-    ✅ ИСПРАВЛЕНО: Использует округление ВНИЗ (floor) для предотвращения ошибок insufficient_balance
+    Расчет выполняется в Decimal (order_sizing) с округлением ВНИЗ, чтобы никогда не продать больше, чем есть.
+    Если объем после округления меньше min_amount рынка, возвращает 0.0.
     """
-    import math
     try:
-        # Получаем информацию о всех рынках
-        markets = get_all_markets()
-        if not markets:
-            logging.warning(f"Не удалось получить рынки, используем стандартную точность для {market_symbol}")
-            # ✅ ИСПРАВЛЕНО: Используем floor для округления вниз
-            return math.floor(amount * 10**4) / 10**4  # Стандартная точность 4
-        
-        # Ищем информацию о нужном рынке
-        market_info = None
-        for market in markets:
-            if market.get('id', '').lower() == market_symbol.lower():
-                market_info = market
-                break
-        
+        market_info = get_market_info(market_symbol)
         if not market_info:
             logging.warning(f"Не найдена информация о рынке {market_symbol}, используем стандартную точность")
-            # ✅ ИСПРАВЛЕНО: Используем floor для округления вниз
-            return math.floor(amount * 10**4) / 10**4  # Стандартная точность 4
-        
-        # Получаем точность из информации о рынке
-        amount_precision = market_info.get('amount_precision', 4)
-        min_amount = float(market_info.get('min_amount', 0.01))
         
-        logging.info(f"Информация о рынке {market_symbol}: точность={amount_precision}, мин. количество={min_amount}")
+        rules = get_sizing_rules(market_symbol, market_info)
+        rounded_amount = quantize_amount(amount, rules)
         
-        # ✅ ИСПРАВЛЕНО: Округляем ВНИЗ (floor) чтобы никогда не продать больше, чем есть
-        rounded_amount = math.floor(amount * 10**amount_precision) / 10**amount_precision
+        logging.info(f"Информация о рынке {market_symbol}: шаг={format_decimal(rules.amount_step)}, мин. количество={format_decimal(rules.min_amount)}")
         
-        # Проверяем, что округленная сумма не меньше минимальной
-        if rounded_amount < min_amount:
-            logging.warning(f"Округленная сумма {rounded_amount} меньше минимальной {min_amount}")
-            logging.info(f"Используем минимальную сумму {min_amount} вместо {rounded_amount}")
-            return min_amount
+        # Объем ниже минимального биржа не примет - не подменяем его минимальным, чтобы не продать больше, чем есть
+        if rounded_amount < rules.min_amount:
+            logging.warning(f"Округленная сумма {format_decimal(rounded_amount)} меньше минимальной {format_decimal(rules.min_amount)} для {market_symbol}")
+            return 0.0
         
-        logging.info(f"Сумма {amount} округлена ВНИЗ до {rounded_amount} с точностью {amount_precision}")
-        return rounded_amount
+        logging.info(f"Сумма {amount} округлена ВНИЗ до {format_decimal(rounded_amount)}")
+        return float(rounded_amount)
         
     except Exception as e:
         logging.error(f"Ошибка при округлении суммы для {market_symbol}: {e}")
         # В случае ошибки используем стандартную точность с floor
-        import math
-        return math.floor(amount * 10**4) / 10**4
+        return float(quantize_to_step(amount, step_from_precision(4)))
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def create_sell_order_safetrade(market_symbol, amount, order_type="market", price=None):
+def create_sell_order_safetrade(market_symbol, amount, order_type="market", price=None, strategy=None):
     """Создает ордер на продажу, используя НОВЫЙ и ПРАВИЛЬНЫЙ API клиент."""
     global db_manager
     try:
         # Получаем информацию о рынке для проверки минимального размера ордера
-        markets = get_all_markets()
-        market_info = None
-        if markets:
-            for market in markets:
-                if market.get('id', '').lower() == market_symbol.lower():
-                    market_info = market
-                    break
+        market_info = get_market_info(market_symbol)
         
         # Получаем текущую цену
         current_price = get_ticker_price(market_symbol)
@@ -2269,57 +2861,50 @@ def create_sell_order_safetrade(market_symbol, amount, order_type="market", pric
             logging.error(f"Не удалось получить цену для {market_symbol}")
             return None
         
-        # Округляем количество до допустимой точности
-        rounded_amount = round_amount_for_market(market_symbol, amount)
+        # Точный расчет объема и цены в Decimal: шаг, min_amount, min_notional и строки для API
+        rules = get_sizing_rules(market_symbol, market_info)
+        base_currency = market_symbol.replace('usdt', '').upper()
+        
+        # Не продаем больше свободного остатка (снимок балансов минус наши резервы)
+        if balance_ledger.has_snapshot():
+            available = balance_ledger.get_available(base_currency)
+            if to_decimal(amount) > available:
+                logging.info(f"Объем {amount} {base_currency} больше свободного остатка {format_decimal(available)}, продаем остаток")
+                amount = available
         
-        if rounded_amount is None:
-            error_message = f"❌ Не удалось округлить сумму {amount} до допустимой точности для {market_symbol}"
+        try:
+            order_size = size_order(amount, rules, price=price, reference_price=current_price)
+        except OrderSizeError as size_error:
+            error_message = f"❌ Ордер {market_symbol} не может быть размещен: {size_error}"
             logging.error(error_message)
             return error_message
         
-        # Проверяем минимальный размер ордера в USD
-        if market_info:
-            min_amount = float(market_info.get('min_amount', 0.01))
-            min_order_usd = min_amount * current_price
-            
-            order_usd = rounded_amount * current_price
-            
-            logging.info(f"📊 Проверка ордера для {market_symbol}:")
-            logging.info(f"   • Сумма ордера: {rounded_amount} {market_symbol}")
-            logging.info(f"   • Стоимость ордера: ${order_usd:.6f}")
-            logging.info(f"   • Минимальная стоимость: ${min_order_usd:.6f}")
-            
-            if order_usd < min_order_usd:
-                error_message = f"❌ Стоимость ордера ${order_usd:.6f} меньше минимальной ${min_order_usd:.6f} для {market_symbol}"
-                logging.error(error_message)
-                return error_message
+        rounded_amount = float(order_size.amount)
         
-        # Форматируем как строку с точным количеством знаков после запятой для логирования
-        if market_symbol.lower() in ['btcusdt', 'ethusdt']:
-            formatted_amount = f"{rounded_amount:.6f}"
-        else:
-            formatted_amount = f"{rounded_amount:.8f}"
+        logging.info(f"📊 Проверка ордера для {market_symbol}:")
+        logging.info(f"   • Сумма ордера: {order_size.amount_str} {market_symbol}")
+        logging.info(f"   • Стоимость ордера: ${float(order_size.notional):.6f}")
+        logging.info(f"   • Минимальная стоимость: ${float(rules.min_amount) * current_price:.6f}")
         
-        logging.info(f"🛒 НАЧАЛО СОЗДАНИЯ ОРДЕРА: {market_symbol}, количество: {amount} (округлено до: {formatted_amount}), тип: {order_type}")
+        logging.info(f"🛒 НАЧАЛО СОЗДАНИЯ ОРДЕРА: {market_symbol}, количество: {amount} (округлено до: {order_size.amount_str}), тип: {order_type}")
         
         # Валидация параметров
         order_validator.validate_order_params(market_symbol, rounded_amount, order_type, price)
         
-        # Определяем валюты из символа
-        base_currency = market_symbol.replace('usdt', '').upper()
         logging.info(f"📊 Базовая валюта: {base_currency}")
 
         # !!! ИСПОЛЬЗУЕМ НОВЫЙ КЛИЕНТ И ПРАВИЛЬНЫЕ ПАРАМЕТРЫ !!!
         logging.info(f"📤 ОТПРАВКА ЗАПРОСА НА СОЗДАНИЕ ОРДЕРА...")
-        logging.info(f"   • Параметры: market={market_symbol}, side=sell, amount={rounded_amount}, type={order_type}")
+        logging.info(f"   • Параметры: market={market_symbol}, side=sell, amount={order_size.amount_str}, type={order_type}")
         
         try:
-            # ✅ ИСПРАВЛЕНО: Передаем amount как строку, как в примере API
+            # ✅ ИСПРАВЛЕНО: Передаем amount как каноническую строку без артефактов float
             order_details = api_client.create_order(
                 market=market_symbol,
                 side="sell",
-                amount=str(rounded_amount),   # ✅ Передаем amount как строку
-                order_type=order_type   # ✅ Используем 'order_type' а не 'ord_type'
+                amount=order_size.amount_str,
+                order_type=order_type,  # ✅ Используем 'order_type' а не 'ord_type'
+                price=order_size.price_str  # Цена нужна для limit ордеров
             )
             logging.info(f"📥 ПОЛУЧЕН ОТВЕТ: {order_details}")
         except Exception as api_error:
@@ -2336,11 +2921,15 @@ def create_sell_order_safetrade(market_symbol, amount, order_type="market", pric
         
         order_id = order_details.get('id')
         order_amount = order_details.get('amount', rounded_amount)  # Используем 'amount' из ответа
+        balance_ledger.reserve(base_currency, order_size.amount, order_id)
+        if order_id:
+            order_journal.open(order_id, market_symbol, "sell", order_size.amount,
+                               price if order_type == "limit" else None, order_type, strategy)
         
         # Сохраняем данные об ордере в локальную базу
         db_manager.insert_order_history(
             order_id=order_id,
-            timestamp=datetime.now().isoformat(),
+            timestamp=order_details.get('created_at') or datetime.now().isoformat(),
             symbol=order_details.get('market', 'N/A'),
             side=order_details.get('side', 'N/A'),
             order_type=order_details.get('type', 'N/A'),  # ✅ Используем 'type' а не 'ord_type'
@@ -2351,7 +2940,7 @@ def create_sell_order_safetrade(market_symbol, amount, order_type="market", pric
         )
         
         if order_id:
-            threading.Thread(target=track_order, args=(order_id,)).start()
+            track_order(order_id, market_symbol, price if order_type == "limit" else None)
         
         success_message = (
             f"✅ *Успешно размещен ордер на продажу!*\n\n"
@@ -2367,12 +2956,12 @@ def create_sell_order_safetrade(market_symbol, amount, order_type="market", pric
     except requests.exceptions.HTTPError as e:
         # Обрабатываем специфичную ошибку "market.order.non_round_amount"
         logging.error(f"🚨 HTTP ошибка при создании ордера: {e}")
-        return handle_precision_error(market_symbol, amount, order_type, price, e)
+        return handle_precision_error(market_symbol, amount, order_type, price, e, strategy)
     except Exception as e:
         # Проверяем, является ли это ошибкой точности
         if "market.order.non_round_amount" in str(e):
             logging.error(f"🚨 Ошибка точности при создании ордера: {e}")
-            return handle_precision_error(market_symbol, amount, order_type, price, e)
+            return handle_precision_error(market_symbol, amount, order_type, price, e, strategy)
         else:
             # Другая ошибка
             error_message = f"❌ Ошибка при создании ордера на продажу: {e}"
@@ -2397,90 +2986,92 @@ def create_sell_order_safetrade(market_symbol, amount, order_type="market", pric
             logging.error(error_message)
             return error_message
 
-def handle_precision_error(market_symbol, amount, order_type, price, original_error):
+def is_precision_error(error):
+    """Проверяет, что биржа отклонила ордер из-за точности объема (market.order.non_round_amount)"""
+    if "non_round_amount" in str(error):
+        return True
+    response = getattr(error, 'response', None)
+    try:
+        return response is not None and "non_round_amount" in response.text
+    except Exception:
+        return False
+
+def handle_precision_error(market_symbol, amount, order_type, price, original_error, strategy=None):
     """Обрабатывает ошибку точности и пробует разные уровни точности
     ✅ ИСПРАВЛЕНО: Использует округление ВНИЗ (floor) для предотвращения ошибок insufficient_balance
+    Принятая биржей точность сохраняется в precision_cache, поэтому перебор
+    для рынка выполняется только один раз.
     """
-    import math
     logging.warning(f"Получена ошибка точности для {market_symbol}, пробуем другие уровни точности...")
     
+    advertised_precision = None
+    market_info = None
     try:
         # Получаем информацию о точности из рынка
-        markets = get_all_markets()
-        if markets:
-            for market in markets:
-                if market.get('id', '').lower() == market_symbol.lower():
-                    amount_precision = market.get('amount_precision', 4)
-                    min_amount = float(market.get('min_amount', 0.01))
-                    
-                    logging.info(f"Используем точность из API: {amount_precision} знаков, мин. сумма: {min_amount}")
-                    
-                    # ✅ ИСПРАВЛЕНО: Округляем ВНИЗ (floor) чтобы никогда не продать больше, чем есть
-                    new_rounded_amount = math.floor(amount * 10**amount_precision) / 10**amount_precision
-                    
-                    # Проверяем, что сумма не меньше минимальной
-                    if new_rounded_amount < min_amount:
-                        error_message = f"❌ Сумма {new_rounded_amount} меньше минимальной {min_amount} для {market_symbol}"
-                        logging.error(error_message)
-                        return error_message
-                    
-                    try:
-                        # ✅ ИСПРАВЛЕНО: Передаем amount как строку, как в примере API
-                        order_details = api_client.create_order(
-                            market=market_symbol,
-                            side="sell",
-                            amount=str(new_rounded_amount),  # ✅ Передаем amount как строку
-                            order_type=order_type
-                        )
-                        
-                        logging.info(f"✅ Успешно создан ордер с точностью {amount_precision} (округлено вниз до {new_rounded_amount})")
-                        
-                        # Обработка успешного результата
-                        return handle_successful_order(order_details, market_symbol)
-                    except Exception as precision_error:
-                        logging.warning(f"Не удалось создать ордер с точностью {amount_precision}: {precision_error}")
-                        # Если не получилось с правильной точностью, пробуем другие
-                        break
+        market_info = get_market_info(market_symbol)
+        if market_info:
+            advertised_precision = int(market_info.get('amount_precision', 4))
+            logging.info(f"Точность из API: {advertised_precision} знаков, мин. сумма: {market_info.get('min_amount')}")
     except Exception as e:
         logging.warning(f"Не удалось получить информацию о точности для {market_symbol}: {e}")
     
-    # Если не получилось с информацией из API, пробуем стандартные уровни точности
-    precision_levels = [8, 7, 6, 5, 4, 3, 2] if market_symbol.lower() not in ['btcusdt', 'ethusdt'] else [6, 5, 4, 3, 2]
+    # Точность первой (отклоненной) попытки - та же, что использует round_amount_for_market
+    if is_precision_error(original_error):
+        first_precision = precision_cache.get_precision(market_symbol)
+        if first_precision is None:
+            first_precision = advertised_precision
+        if first_precision is not None:
+            precision_cache.record_rejection(market_symbol, first_precision, advertised_precision)
+    
+    fallback_levels = [8, 7, 6, 5, 4, 3, 2] if market_symbol.lower() not in ['btcusdt', 'ethusdt'] else [6, 5, 4, 3, 2]
+    precision_levels = precision_cache.candidate_precisions(market_symbol, advertised_precision, fallback_levels)
+    
+    # Оценка цены для проверки min_notional рыночного ордера
+    reference_price = get_ticker_price(market_symbol) if price is None else None
     
     for precision in precision_levels:
         try:
-            # ✅ ИСПРАВЛЕНО: Форматируем с округлением ВНИЗ (floor)
-            new_rounded_amount = math.floor(amount * 10**precision) / 10**precision
-            
-            logging.info(f"Пробуем точность {precision}: {new_rounded_amount}")
-            
-            # Проверяем, что новая сумма больше 0
-            if new_rounded_amount <= 0:
+            # Тот же расчет в Decimal, что и для первой попытки: объем ВНИЗ по шагу, цена по шагу,
+            # min_amount и min_notional; меняется только точность объема
+            rules = rules_from_safetrade_market(market_info, amount_precision=precision)
+            try:
+                order_size = size_order(amount, rules, price=price, reference_price=reference_price)
+            except OrderSizeError as size_error:
+                logging.info(f"Точность {precision} не подходит: {size_error}")
                 continue
             
-            # ✅ ИСПРАВЛЕНО: Передаем amount как строку, как в примере API
+            logging.info(f"Пробуем точность {precision}: {order_size.amount_str}")
+            
             order_details = api_client.create_order(
                 market=market_symbol,
                 side="sell",
-                amount=str(new_rounded_amount),  # ✅ Передаем amount как строку
-                order_type=order_type
+                amount=order_size.amount_str,  # ✅ Каноническая строка
+                order_type=order_type,
+                price=order_size.price_str
             )
             
-            logging.info(f"✅ Успешно создан ордер с точностью {precision}")
+            logging.info(f"✅ Успешно создан ордер с точностью {precision} (округлено вниз до {order_size.amount_str})")
+            precision_cache.record_success(market_symbol, precision, advertised_precision)
             
             # Обработка успешного результата
-            return handle_successful_order(order_details, market_symbol)
+            return handle_successful_order(order_details, market_symbol, strategy)
         except Exception as precision_error:
             logging.warning(f"Не удалось создать ордер с точностью {precision}: {precision_error}")
-            continue
+            if is_precision_error(precision_error):
+                precision_cache.record_rejection(market_symbol, precision, advertised_precision)
+                continue
+            # Ошибка не связана с точностью - перебор других уровней не поможет
+            error_message = f"❌ Ошибка при создании ордера для {market_symbol}: {precision_error}"
+            logging.error(error_message)
+            return error_message
     
     # Если ни один уровень точности не сработал
     error_message = f"❌ Не удалось создать ордер для {market_symbol} - ни один уровень точности не подошел"
     logging.error(error_message)
     return error_message
 
-def handle_successful_order(order_details, market_symbol):
-    """Обрабатывает успешное создание ордера"""
+def handle_successful_order(order_details, market_symbol, strategy=None):
+    """Обрабатывает успешное создание ордера (strategy - стратегия для журнала ордеров)"""
     global db_manager
     
     order_id = order_details.get('id')
@@ -2489,10 +3080,16 @@ def handle_successful_order(order_details, market_symbol):
     # Определяем валюты из символа
     base_currency = market_symbol.replace('usdt', '').upper()
     
+    if order_id:
+        # Резерв до следующего снимка балансов, как при обычном размещении в create_sell_order_safetrade
+        balance_ledger.reserve(base_currency, order_amount, order_id)
+        order_journal.open(order_id, market_symbol, order_details.get('side', 'sell'), order_amount,
+                           order_details.get('price'), order_details.get('type', 'limit'), strategy)
+    
     # Сохраняем данные об ордере в локальную базу
     db_manager.insert_order_history(
         order_id=order_id,
-        timestamp=datetime.now().isoformat(),
+        timestamp=order_details.get('created_at') or datetime.now().isoformat(),
         symbol=order_details.get('market', 'N/A'),
         side=order_details.get('side', 'N/A'),
         order_type=order_details.get('type', 'N/A'),
@@ -2503,7 +3100,7 @@ def handle_successful_order(order_details, market_symbol):
     )
     
     if order_id:
-        threading.Thread(target=track_order, args=(order_id,)).start()
+        track_order(order_id, market_symbol, order_details.get('price'))
     
     return (
         f"✅ *Успешно размещен ордер на продажу!*\n\n"
@@ -2515,121 +3112,84 @@ def handle_successful_order(order_details, market_symbol):
         f"*ID ордера:* `{order_id}`"
     )
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def track_order_execution(order_id, timeout=300):
-    """Отслеживает исполнение ордера и возвращает trades"""
-    global db_manager
-    start_time = time.time()
+    """Ждет итогового состояния ордера через общий трекер и возвращает trades (None - отменен или таймаут)"""
+    if order_tracker.get(order_id) is None:
+        order_tracker.track(order_id)
     
-    while time.time() - start_time < timeout:
-        try:
-            # Получаем статус ордера
-            order_details = get_order_details(order_id)
-            
-            if order_details is None:
-                logging.warning(f"Ордер {order_id} не найден - возможно уже исполнен или отменён")
-                # Попробуем найти сделки через общий endpoint
-                return find_order_trades_alternative(order_id)
-            
-            order_state = order_details.get('state', 'unknown')
-            logging.info(f"Ордер {order_id} статус: {order_state}")
-            
-            if order_state in ['done', 'filled']:
-                # Ордер исполнен
-                logging.info(f"Ордер {order_id} исполнен")
-                db_manager.update_order_status(order_id=order_id, status="filled")
-                
-                # Пытаемся получить сделки, но не критично если не получится
-                trades = find_order_trades_alternative(order_id)
-                return trades if trades else []
-            
-            elif order_state in ['cancel', 'cancelled']:
-                logging.info(f"Ордер {order_id} отменён")
-                db_manager.update_order_status(order_id=order_id, status="cancelled")
-                return None
-            
-            elif order_state in ['wait', 'pending']:
-                # Ордер ожидает исполнения
-                logging.debug(f"Ордер {order_id} ожидает исполнения")
-            
-            time.sleep(10)
-        except Exception as e:
-            logging.error(f"Ошибка отслеживания ордера {order_id}: {e}")
-            time.sleep(10)
+    tracked = order_tracker.wait(order_id, timeout)
+    if tracked is None:
+        logging.warning(f"Таймаут отслеживания ордера {order_id}")
+        return None
+    if tracked.state not in ['done', 'filled']:
+        return None
     
-    logging.warning(f"Таймаут отслеживания ордера {order_id}")
-    return None
+    # Пытаемся получить сделки, но не критично если не получится
+    trades = find_order_trades_alternative(order_id)
+    return trades if trades else []
 
 def find_order_trades_alternative(order_id):
-    """Альтернативный способ поиска сделок по ордеру"""
+    """Сделки ордера из локального индекса (с инкрементальной догрузкой новых сделок)"""
     try:
-        # Пытаемся получить сделки через общий endpoint
-        all_trades_response = scraper.get(f"{BASE_URL}/trade/market/trades", headers=get_auth_headers(), timeout=30)
-        if all_trades_response.status_code == 200:
-            all_trades = all_trades_response.json()
-            # Фильтруем сделки по order_id
-            order_trades = [t for t in all_trades if t.get('order_id') == str(order_id)]
-            if order_trades:
-                logging.info(f"Найдено {len(order_trades)} сделок для ордера {order_id} через альтернативный endpoint")
-                return order_trades
-        
-        # Если сделки не найдены, это нормально для некоторых ордеров
-        logging.info(f"Сделки для ордера {order_id} не найдены через альтернативный endpoint")
-        return []
-        
+        order_trades = trade_sync.trades_for_order(order_id)
+        if order_trades:
+            logging.info(f"Найдено {len(order_trades)} сделок для ордера {order_id}")
+        else:
+            # Если сделки не найдены, это нормально для некоторых ордеров
+            logging.info(f"Сделки для ордера {order_id} не найдены")
+        return order_trades
     except Exception as e:
-        logging.warning(f"Ошибка при поиске сделок через альтернативный endpoint для ордера {order_id}: {e}")
+        logging.warning(f"Ошибка при поиске сделок для ордера {order_id}: {e}")
         return []
 
 def setup_websocket_order_tracking():
-    """Настройка WebSocket для отслеживания ордеров в реальном времени"""
+    """Запускает приватный WebSocket-поток ордеров, сделок и балансов (один на процесс)"""
+    if private_stream is None:
+        return False
     try:
-        # Проверяем доступность WebSocket
-        ws_url = BASE_URL.replace("https://", "wss://").replace('http://', 'ws://') + "/websocket/"
-        logging.info(f"WebSocket URL: {ws_url}")
-        
-        # Здесь можно добавить WebSocket подключение для отслеживания ордеров
-        # Пока что используем REST API с улучшенной обработкой ошибок
-        logging.info("WebSocket отслеживание ордеров доступно (требует дополнительной настройки)")
+        private_stream.start()
         return True
-        
     except Exception as e:
         logging.warning(f"WebSocket недоступен: {e}")
         return False
 
+# Последний полный снимок ордеров: несколько проверок подряд обходятся одним проходом по страницам
+order_snapshot_cache = {
+    "data": None,
+    "cache_duration": 5
+}
+
+def get_order_snapshot(force_refresh=False):
+    """Снимок всех ордеров аккаунта с индексом по id (кэшируется на несколько секунд)"""
+    with cache_lock:
+        snapshot = order_snapshot_cache["data"]
+        if (not force_refresh and snapshot is not None and
+                time.time() - snapshot.taken_at < order_snapshot_cache["cache_duration"]):
+            return snapshot
+    
+    snapshot = fetch_order_snapshot(api_client.get_orders)
+    with cache_lock:
+        order_snapshot_cache["data"] = snapshot
+    return snapshot
+
 def batch_check_orders_status(order_ids):
-    """Пакетная проверка статуса нескольких ордеров"""
+    """Пакетная проверка статуса нескольких ордеров по одному снимку"""
     try:
-        # Получаем все активные ордера
-        response = scraper.get(f"{BASE_URL}/trade/market/orders", headers=get_auth_headers(), timeout=30)
-        if response.status_code == 200:
-            all_orders = response.json()
-            order_statuses = {}
-            
-            for order_id in order_ids:
-                order = next((o for o in all_orders if o.get('id') == order_id), None)
-                if order:
-                    order_statuses[order_id] = order.get('state', 'unknown')
-                else:
-                    order_statuses[order_id] = 'not_found'
-            
-            return order_statuses
-        else:
-            logging.warning(f"Не удалось получить статусы ордеров: {response.status_code}")
-            return {}
-            
+        return get_order_snapshot(force_refresh=True).statuses(order_ids)
     except Exception as e:
         logging.error(f"Ошибка пакетной проверки статусов ордеров: {e}")
         return {}
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def cancel_order(order_id):
-    """Отменяет ордер"""
+def cancel_order(order_id, filled_amount=0):
+    """Отменяет ордер. filled_amount - уже исполненная часть (остается списанной в balance_ledger)"""
     global db_manager
     try:
         # Используем новый API клиент для отмены ордера
         result = api_client.cancel_order(order_id)
         logging.info(f"Ордер {order_id} отменён: {result}")
+        balance_ledger.release(order_id, filled_amount)
+        order_journal.transition(order_id, OrderStatus.CANCELLED, filled_amount or None)
         
         # Обновляем статус в базе данных
         db_manager.update_order_status(
@@ -2675,60 +3235,158 @@ def get_order_details(order_id):
             if order:
                 return order
         except:
-            # Если не удалось получить по ID, получаем все ордера и ищем нужный
-            orders = api_client.get_orders()
-            if isinstance(orders, list):
-                for order in orders:
-                    if str(order.get('id')) == str(order_id):
-                        return order
+            # Если не удалось получить по ID, ищем в снимке всех ордеров
+            return get_order_snapshot().get(order_id)
         
         return None
     except Exception as e:
         logging.error(f"Ошибка получения деталей ордера {order_id}: {e}")
         return None
 
-def track_order(order_id):
-    """Фоновая функция для отслеживания ордера"""
-    logging.info(f"Отслеживание ордера {order_id} начато")
-    
-    # Сначала проверяем, существует ли ордер
-    if not check_order_exists(order_id):
-        logging.warning(f"Ордер {order_id} не существует, прекращаем отслеживание")
-        return
-    
+def get_order_fill_ratio(order):
+    """Возвращает долю исполнения ордера (0..1) по ответу API"""
+    if not order:
+        return 0.0
     try:
-        # Устанавливаем WebSocket отслеживание если доступно
-        websocket_available = setup_websocket_order_tracking()
-        
-        trades = track_order_execution(order_id, timeout=3600)  # 1 час
-        if trades is not None:
-            if trades:
-                logging.info(f"Ордер {order_id} исполнен: {len(trades)} сделок")
-            else:
-                logging.info(f"Ордер {order_id} исполнен, но сделки не найдены")
+        origin = float(order.get('origin_amount') or order.get('origin_volume') or order.get('amount') or 0)
+        if origin <= 0:
+            return 0.0
+        
+        if order.get('filled_amount') is not None:
+            filled = float(order['filled_amount'])
+        elif order.get('executed_volume') is not None:
+            filled = float(order['executed_volume'])
+        elif order.get('remaining_amount') is not None:
+            filled = origin - float(order['remaining_amount'])
+        elif order.get('remaining_volume') is not None:
+            filled = origin - float(order['remaining_volume'])
         else:
-            logging.warning(f"Ордер {order_id} не исполнен в течение часа")
-            # Попробуем отменить неисполненный ордер
-            cancel_order(order_id)
+            filled = origin if order.get('state') in ['done', 'filled'] else 0.0
+        
+        return max(0.0, min(filled / origin, 1.0))
+    except (ValueError, TypeError):
+        return 0.0
+
+def track_order(order_id, market=None, price=None):
+    """Ставит ордер на отслеживание в общий трекер (без отдельного потока на ордер)"""
+    order_tracker.track(order_id, market=market, price=price)
+    logging.info(f"Отслеживание ордера {order_id} начато")
+
+def fetch_open_orders():
+    """Все ожидающие ордера аккаунта постранично. None - запрос не удался"""
+    try:
+        return fetch_order_snapshot(api_client.get_orders, state="wait").orders
     except Exception as e:
-        logging.error(f"Ошибка отслеживания ордера {order_id}: {e}")
-        # Не прекращаем отслеживание при ошибке, продолжаем попытки
+        logging.error(f"Ошибка получения открытых ордеров: {e}")
+        return None
+
+def get_top_of_book(market_symbol):
+    """Лучшие bid и ask из кэша книги ордеров"""
+    orderbook = get_orderbook(market_symbol)
+    if not orderbook or not orderbook.get('bids') or not orderbook.get('asks'):
+        return None
+    return float(orderbook['bids'][0][0]), float(orderbook['asks'][0][0])
+
+def on_tracked_order_fill(tracked, order):
+    logging.info(f"Ордер {tracked.order_id} исполнен на {tracked.filled}")
+    order_journal.transition(tracked.order_id, OrderStatus.PARTIAL, tracked.filled)
+
+def on_tracked_order_done(tracked, order):
+    logging.info(f"Ордер {tracked.order_id} исполнен")
+    order_journal.transition(tracked.order_id, OrderStatus.FILLED, tracked.filled)
+    db_manager.update_order_status(order_id=tracked.order_id, status="filled")
+
+def on_tracked_order_cancel(tracked, order):
+    rejected = tracked.state in ['reject', 'rejected']
+    logging.info(f"Ордер {tracked.order_id} {'отклонён биржей' if rejected else 'отменён'}")
+    order_journal.transition(tracked.order_id, OrderStatus.FAILED if rejected else OrderStatus.CANCELLED, tracked.filled)
+    balance_ledger.release(tracked.order_id, tracked.filled)
+    db_manager.update_order_status(order_id=tracked.order_id, status="failed" if rejected else "cancelled")
+
+def on_tracked_order_timeout(tracked, order):
+    logging.warning(f"Ордер {tracked.order_id} не исполнен за {tracked.timeout:.0f} сек, отменяем")
+    cancel_order(tracked.order_id, tracked.filled)
+
+# Единый трекер ордеров: один поток и один пакетный запрос get_orders(state=wait) за такт
+tracker_config = CONFIG['trading'].get('order_tracker', DEFAULT_CONFIG['trading']['order_tracker'])
+order_tracker = OrderTracker(
+    fetch_open_orders=fetch_open_orders,
+    fetch_order=get_order_details,
+    get_top_of_book=get_top_of_book,
+    min_interval=float(tracker_config.get('min_interval', 2)),
+    max_interval=float(tracker_config.get('max_interval', 30)),
+    far_distance=float(tracker_config.get('far_distance', 0.05)),
+    default_timeout=float(tracker_config.get('timeout', 3600)),
+    push_interval=float(tracker_config.get('push_interval', 300))
+)
+order_tracker.on("fill", on_tracked_order_fill)
+order_tracker.on("done", on_tracked_order_done)
+order_tracker.on("cancel", on_tracked_order_cancel)
+order_tracker.on("timeout", on_tracked_order_timeout)
+
+def on_stream_balance(balance):
+    """Событие balance приватного потока обновляет учет средств без запроса /account/balances"""
+    if balance.get('currency'):
+        balance_ledger.update_currency(balance['currency'], balance.get('balance'), balance.get('locked'))
+
+def on_stream_state(connected):
+    logging.info(f"Приватный поток {'подключен - опрос ордеров снижен' if connected else 'отключен - опрос ордеров по REST'}")
+    order_tracker.set_push_active(connected)
+
+# Локальный индекс сделок аккаунта: догружаются только сделки новее последней сохраненной
+trade_store = TradeStore(log_dir / "trades.jsonl")
+trade_sync = TradeSync(lambda **params: api_client.get_trades(**params), trade_store)
+
+def on_stream_trade(trade):
+    """Сделка из приватного потока: в индекс сделок и в трекер ордеров"""
+    trade_store.add([trade])
+    order_tracker.push_trade(trade)
+
+# Приватный поток: исполнение ордеров приходит событиями, REST-опрос остается страховкой
+private_stream = PrivateStream(
+    private_stream_url(BASE_URL),
+    headers_factory=get_auth_headers,
+    on_order=order_tracker.push_order,
+    on_trade=on_stream_trade,
+    on_balance=on_stream_balance,
+    on_state=on_stream_state
+) if tracker_config.get('private_stream', True) and API_KEY else None
 
 def cancel_all_active_orders():
-    """Отменяет все активные ордера при завершении работы"""
+    """Отменяет все ожидающие ордера при завершении работы (параллельно, с общим дедлайном)"""
+    shutdown_config = CONFIG['trading'].get('shutdown_cancel', {})
     try:
-        # Используем новый API клиент для получения всех ордеров
-        orders = api_client.get_orders()
-        
-        if isinstance(orders, list):
-            for order in orders:
-                if order.get('state') in ['wait', 'pending']:
-                    cancel_order(order.get('id'))
-        
-        logging.info("Все активные ордера отменены")
+        report = cancel_open_orders(
+            fetch_open_orders,
+            cancel_one=api_client.cancel_order,
+            cancel_market=api_client.cancel_orders if shutdown_config.get('bulk_by_market', True) else None,
+            deadline=float(shutdown_config.get('deadline', 8)),
+            max_workers=int(shutdown_config.get('max_workers', 8))
+        )
+        # Статусы уходят в очередь записи: при остановке она сохраняется на диск и дописывается при запуске
+        for order_id in report.cancelled:
+            order_journal.transition(order_id, OrderStatus.CANCELLED)
+            db_manager.update_order_status(order_id=order_id, status="cancelled")
+        logging.info(
+            f"Отмена ордеров за {report.elapsed:.1f} сек: отменено {len(report.cancelled)}"
+            f" (рынков целиком: {len(report.bulk_markets)}), ошибок {len(report.failed)},"
+            f" не успели {len(report.unfinished)}"
+        )
+        if report.failed or report.unfinished:
+            logging.warning(f"Ордера, которые могли остаться открытыми: {report.failed + report.unfinished}")
     except Exception as e:
         logging.error(f"Ошибка отмены активных ордеров: {e}")
 
+def resume_journaled_orders():
+    """Возобновляет отслеживание ордеров, открытых по журналу на момент прошлой остановки"""
+    open_orders = order_journal.open_orders()
+    for record in open_orders:
+        track_order(record.order_id, record.market, record.price)
+    if open_orders:
+        strategies = sorted({record.strategy or "single" for record in open_orders})
+        logging.info(f"Возобновлено отслеживание {len(open_orders)} ордеров из журнала ({', '.join(strategies)})")
+    return len(open_orders)
+
 def save_cache_state():
     """Сохраняет состояние кэша при завершении работы"""
     try:
@@ -2769,9 +3427,288 @@ def invalidate_cache():
         orderbook_cache["last_update"] = {}
         logging.info("Кэш инвалидирован после операций")
 
+# --- МАРШРУТИЗАЦИЯ ПРОДАЖИ МЕЖДУ SAFETRADE И MEXC ---
+
+mexc_sweeper = None
+mexc_sweeper_lock = Lock()
+
+def get_mexc_sweeper():
+    """Ленивая инициализация MexcSweeper ради правил торговли MEXC (stepSize, minQty, minNotional)"""
+    global mexc_sweeper
+    if mexc_client is None:
+        return None
+    with mexc_sweeper_lock:
+        if mexc_sweeper is None:
+            try:
+                from mexc_autosell import MexcSweeper
+                mexc_sweeper = MexcSweeper(MEXC_API_KEY, MEXC_SECRET_KEY)
+            except Exception as e:
+                logging.error(f"Не удалось загрузить правила торговли MEXC: {e}")
+                return None
+        return mexc_sweeper
+
+def get_mexc_free_balance(currency):
+    """Свободный баланс монеты на MEXC"""
+    info = mexc_client.account.get_account_info()
+    for b in info.get('balances', []):
+        if b.get('asset', '').upper() == currency.upper():
+            return to_decimal(b.get('free') or 0)
+    return Decimal("0")
+
+def get_router_quotes(currency, safetrade_amount, rules):
+    """
+    Параллельно получает стаканы и балансы обеих бирж и собирает котировки для маршрутизатора.
+    Возвращает список VenueQuote (пустой, если монета не торгуется на MEXC).
+    """
+    router_config = CONFIG['trading'].get('router', {})
+    depth = int(router_config.get('depth_levels', 20))
+    sweeper = get_mexc_sweeper()
+    mexc_symbol = f"{currency.upper()}USDT"
+    mexc_rules = sweeper.sizing_rules(mexc_symbol) if sweeper else None
+    if mexc_rules is None:
+        return []
+    
+    market_symbol = f"{currency.lower()}usdt"
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        safetrade_book = executor.submit(get_orderbook, market_symbol, True)
+        mexc_book = executor.submit(mexc_client.market.order_book, symbol=mexc_symbol, limit=depth)
+        mexc_balance = executor.submit(get_mexc_free_balance, currency)
+        
+        quotes = []
+        try:
+            book = safetrade_book.result()
+            if book:
+                quotes.append(VenueQuote(
+                    venue="safetrade",
+                    bids=parse_bids(book.get('bids'), depth),
+                    rules=rules,
+                    available=to_decimal(safetrade_amount),
+                    fee=to_decimal(router_config.get('safetrade_fee', 0.002))
+                ))
+        except Exception as e:
+            logging.warning(f"Маршрутизатор: нет стакана SafeTrade для {market_symbol}: {e}")
+        try:
+            quotes.append(VenueQuote(
+                venue="mexc",
+                bids=parse_bids(mexc_book.result().get('bids'), depth),
+                rules=mexc_rules,
+                available=mexc_balance.result(),
+                fee=to_decimal(router_config.get('mexc_fee', 0.001))
+            ))
+        except Exception as e:
+            logging.warning(f"Маршрутизатор: нет данных MEXC для {mexc_symbol}: {e}")
+    return quotes
+
+def sell_on_mexc(currency, amount):
+    """Рыночная продажа на MEXC с каноническим количеством"""
+    try:
+        response = mexc_client.account.new_order(
+            symbol=f"{currency.upper()}USDT",
+            side="SELL",
+            order_type="MARKET",
+            options={"quantity": format_decimal(amount)}
+        )
+        logging.info(f"✅ MEXC: продано {format_decimal(amount)} {currency}: {response}")
+        return True
+    except Exception as e:
+        logging.error(f"❌ MEXC: ошибка продажи {format_decimal(amount)} {currency}: {e}")
+        return False
+
+def route_cross_venue_sell(score: PriorityScore, safetrade_amount, rules):
+    """
+    Продает монету, которая торгуется и на SafeTrade, и на MEXC, распределяя объем
+    по ожидаемой чистой выручке. Возвращает None, если маршрутизация неприменима
+    (монеты нет на MEXC, нет стаканов) - тогда продажа идет обычным путем на SafeTrade.
+    Иначе возвращает {биржа: успех} по каждой части плана.
+    
+    Балансы читаются и продаются под блокировкой монеты, общей с MexcSweeper,
+    чтобы сборщик пыли MEXC не продал тот же баланс параллельно.
+    """
+    with currency_locks.get(score.currency):
+        quotes = get_router_quotes(score.currency, safetrade_amount, rules)
+        if len(quotes) < 2:
+            return None
+        
+        max_slippage = CONFIG['trading'].get('router', {}).get('max_slippage')
+        plan = route_sell(quotes, max_slippage=max_slippage)
+        if plan is None:
+            logging.info(f"Маршрутизатор: нет исполнимого плана для {score.currency}")
+            return None
+        
+        for venue, amount in plan.allocations.items():
+            estimate = plan.estimates[venue]
+            logging.info(f"Маршрутизатор {score.currency}: {venue} {format_decimal(amount)} "
+                         f"по ~{float(estimate.avg_price):.8f}, выручка ~${float(estimate.proceeds):.4f}")
+        
+        market_symbol = f"{score.currency.lower()}usdt"
+        with ThreadPoolExecutor(max_workers=len(plan.allocations)) as executor:
+            futures = {}
+            for venue, amount in plan.allocations.items():
+                if venue == "safetrade":
+                    futures[executor.submit(execute_market_sell, market_symbol, float(amount))] = venue
+                else:
+                    futures[executor.submit(sell_on_mexc, score.currency, amount)] = venue
+            results = {futures[f]: bool(f.result()) for f in as_completed(futures)}
+    
+    logging.info(f"Маршрутизатор {score.currency}: результаты {results}, ожидаемая выручка ~${float(plan.total_proceeds):.4f}")
+    return results
+
+def sell_in_depth_slices(score: PriorityScore, rules):
+    """
+    Продает свободный остаток частями, размер которых рассчитан по стакану:
+    проскальзывание каждой части не превышает impact_budget из конфигурации.
+    Перед каждой следующей частью стакан перечитывается. Возвращает (частей, успешных).
+    """
+    slicing_config = CONFIG['trading'].get('easy_mode_slicing', {})
+    impact_budget = to_decimal(slicing_config.get('impact_budget', 0.01))
+    max_slices = int(slicing_config.get('max_slices', 10))
+    slice_interval = float(slicing_config.get('slice_interval', 1))
+    market_symbol = f"{score.currency.lower()}usdt"
+    
+    remaining = balance_ledger.sellable(score.currency, rules, requested=score.balance)
+    parts_total = 0
+    parts_success = 0
+    while remaining > 0 and parts_total < max_slices:
+        orderbook = get_orderbook(market_symbol, force_refresh=parts_total > 0)
+        if orderbook and orderbook.get('bids'):
+            depth = BookDepth.from_bids(parse_bids(orderbook['bids']))
+            size = next_slice(remaining, depth, rules, impact_budget, max_slices - parts_total)
+            impact = depth.impact(size)
+            impact_str = f"{float(impact) * 100:.2f}%" if impact is not None else "больше глубины стакана"
+        else:
+            # Без стакана оценить проскальзывание нельзя - продаем остаток одной частью
+            size = remaining
+            impact_str = "неизвестно"
+        if size <= 0:
+            break
+        
+        parts_total += 1
+        logging.info(f"Часть {parts_total} {score.currency}: {format_decimal(size)} из {format_decimal(remaining)}, "
+                     f"ожидаемое проскальзывание {impact_str} (бюджет {float(impact_budget) * 100:.2f}%)")
+        part_score = PriorityScore(
+            currency=score.currency,
+            balance=float(size),
+            usd_value=float(size) * score.market_data.current_price,
+            priority_score=score.priority_score,
+            market_data=score.market_data
+        )
+        if not execute_trading_strategy(part_score, None):
+            logging.warning(f"❌ Не удалось продать часть {parts_total} {score.currency}, остаток {format_decimal(remaining)} остается до следующего цикла")
+            break
+        parts_success += 1
+        remaining -= size
+        
+        # Пауза, чтобы стакан восстановился перед следующей частью
+        if remaining > 0:
+            time.sleep(slice_interval)
+    
+    return parts_total, parts_success
+
+def sell_currency(score: PriorityScore):
+    """
+    Продает одну валюту и возвращает результат с таймингом.
+    Вызывается из пула воркеров в auto_sell_all_altcoins.
+    """
+    started_at = time.time()
+    result = {
+        "currency": score.currency,
+        "usd_value": score.usd_value,
+        "success": False,
+        "parts_total": 1,
+        "parts_success": 0,
+        "duration": 0.0,
+        "error": None
+    }
+    
+    # Семафор ограничивает общее число одновременных продаж даже при пересекающихся циклах
+    with sales_sem:
+        try:
+            logging.info(f"Обработка {score.currency}: {score.balance} (${score.usd_value:.2f})")
+            
+            # Точный объем из учета средств вместо 99% от баланса
+            market_symbol = f"{score.currency.lower()}usdt"
+            rules = get_sizing_rules(market_symbol)
+            if not balance_ledger.has_snapshot():
+                refresh_balance_ledger()
+            
+            # Монеты, которые торгуются и на MEXC, продаем через маршрутизатор
+            if CONFIG['trading'].get('router', {}).get('enabled') and mexc_client is not None:
+                routed = route_cross_venue_sell(
+                    score, balance_ledger.sellable(score.currency, rules, requested=score.balance), rules
+                )
+                if routed is not None:
+                    # Продажа баланса SafeTrade успешна, только если исполнена его часть плана;
+                    # части на каждой бирже отражаются отдельно
+                    result["venues"] = routed
+                    result["success"] = routed.get("safetrade", False)
+                    result["parts_total"] = len(routed)
+                    result["parts_success"] = sum(1 for ok in routed.values() if ok)
+                    result["duration"] = time.time() - started_at
+                    return result
+            
+            def score_for(amount):
+                return PriorityScore(
+                    currency=score.currency,
+                    balance=float(amount),
+                    usd_value=float(amount) * score.market_data.current_price,
+                    priority_score=score.priority_score,
+                    market_data=score.market_data
+                )
+            
+            # В простом режиме размер и число частей определяются глубиной стакана
+            if EASY_MODE:
+                parts_total, part_success = sell_in_depth_slices(score, rules)
+                result["parts_total"] = max(parts_total, 1)
+                result["parts_success"] = part_success
+                # Если хотя бы одна часть успешно продана, считаем продажу успешной
+                result["success"] = part_success > 0
+                if parts_total > 1:
+                    if result["success"]:
+                        logging.info(f"✅ Успешно продано {part_success}/{parts_total} частей {score.currency}")
+                    else:
+                        logging.warning(f"❌ Не удалось продать ни одной части {score.currency}")
+            else:
+                sellable = balance_ledger.sellable(score.currency, rules, requested=score.balance)
+                if sellable <= 0:
+                    logging.warning(f"Нет свободного остатка {score.currency} для продажи (баланс {score.balance}, мин. {format_decimal(rules.min_amount)})")
+                    result["error"] = "no_available_balance"
+                    result["duration"] = time.time() - started_at
+                    return result
+                
+                exact_score = score_for(sellable)
+                logging.info(f"Продаем свободный остаток {score.currency}: {format_decimal(sellable)} (баланс {score.balance:.8f})")
+                
+                ai_decision = None
+                # Получаем решение ИИ, только если он включен и мы не в простом режиме
+                if AI_ENABLED and not EASY_MODE and cerebras_client:
+                    ai_decision = ai_assistant.get_ai_trading_decision(
+                        exact_score.currency,
+                        exact_score.balance,
+                        exact_score.market_data,
+                        db_manager  # Передаем db_manager
+                    )
+                
+                # Исполняем торговую стратегию
+                result["success"] = bool(execute_trading_strategy(exact_score, ai_decision))
+            
+            if not (EASY_MODE and result["parts_total"] > 1):
+                result["parts_success"] = 1 if result["success"] else 0
+                if result["success"]:
+                    logging.info(f"✅ Успешно продан {score.currency}")
+                else:
+                    logging.warning(f"❌ Не удалось продать {score.currency}")
+        except Exception as e:
+            logging.error(f"Ошибка при продаже {score.currency}: {e}")
+            result["error"] = str(e)
+    
+    result["duration"] = time.time() - started_at
+    return result
+
 def auto_sell_all_altcoins():
     """
-    Главная функция автоматической продажи всех альткоинов
+    Главная функция автоматической продажи всех альткоинов.
+    Валюты продаются параллельно пулом из MAX_CONCURRENT_SALES воркеров,
+    задачи отправляются в пул в порядке приоритета.
     """
     logging.info("Запуск автоматической продажи всех альткоинов")
     if EASY_MODE:
@@ -2780,187 +3717,102 @@ def auto_sell_all_altcoins():
         logging.info("🤖 РЕЖИМ: Продвинутая продажа со стратегиями")
     
     try:
-        with sales_sem:  # Ограничиваем количество одновременных продаж
-            # Получаем все продаваемые балансы
-            balances = get_sellable_balances()
-            if not balances:
-                logging.info("Нет балансов для продажи")
-                return {"success": False, "message": "Нет балансов для продажи"}
-            
-            # Определяем приоритет продаж
-            priority_scores = prioritize_sales(balances)
-            if not priority_scores:
-                logging.info("Нет валют, подходящих для продажи")
-                return {"success": False, "message": "Нет валют, подходящих для продажи"}
-            
-            total_processed = 0
-            successful_sales = 0
-            failed_sales = 0
-            
-            # Обрабатываем каждую валюту по приоритету
-            for score in priority_scores:
+        cycle_started_at = time.time()
+        
+        # Получаем все продаваемые балансы
+        balances = get_sellable_balances()
+        if not balances:
+            logging.info("Нет балансов для продажи")
+            return {"success": False, "message": "Нет балансов для продажи"}
+        
+        # Определяем приоритет продаж
+        priority_scores = prioritize_sales(balances)
+        if not priority_scores:
+            logging.info("Нет валют, подходящих для продажи")
+            return {"success": False, "message": "Нет валют, подходящих для продажи"}
+        
+        # Пул воркеров: задачи ставятся в очередь в порядке приоритета,
+        # поэтому валюты с высоким приоритетом стартуют первыми
+        workers = max(1, min(MAX_CONCURRENT_SALES, len(priority_scores)))
+        logging.info(f"🚀 Параллельная продажа {len(priority_scores)} валют, воркеров: {workers}")
+        
+        results_by_currency = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sell") as executor:
+            futures = {executor.submit(sell_currency, score): score for score in priority_scores}
+            for future in as_completed(futures):
+                score = futures[future]
                 try:
-                    logging.info(f"Обработка {score.currency}: {score.balance} (${score.usd_value:.2f})")
-                    
-                    # В простом режиме разбиваем большие ордера на несколько частей
-                    if EASY_MODE:
-                        # Для NOCK всегда используем множественные ордера из-за особенностей биржи
-                        if score.currency == "NOCK" or score.balance > 100:
-                            # Определяем количество частей в зависимости от размера баланса
-                            if score.balance > 500:
-                                num_parts = 5
-                            elif score.balance > 200:
-                                num_parts = 3
-                            else:
-                                num_parts = 2
-                            
-                            # Используем 99% от баланса, чтобы избежать ошибки insufficient_balance
-                            adjusted_balance = score.balance * 0.99
-                            part_size = adjusted_balance / num_parts
-                            
-                            logging.info(f"Разбиваем {score.currency} на {num_parts} части по {part_size:.4f} каждая (используем 99% от баланса)")
-                            
-                            part_success = 0
-                            for i in range(num_parts):
-                                try:
-                                    # Создаем новый объект PriorityScore для части
-                                    part_score = PriorityScore(
-                                        currency=score.currency,
-                                        balance=part_size,
-                                        usd_value=part_size * score.market_data.current_price,
-                                        priority_score=score.priority_score,
-                                        market_data=score.market_data
-                                    )
-                                    
-                                    # Исполняем торговую стратегию для части
-                                    part_success_result = execute_trading_strategy(part_score, None)
-                                    if part_success_result:
-                                        part_success += 1
-                                        logging.info(f"✅ Успешно продана часть {i+1}/{num_parts} {score.currency}")
-                                    else:
-                                        logging.warning(f"❌ Не удалось продать часть {i+1}/{num_parts} {score.currency}")
-                                    
-                                    # Небольшая задержка между частями
-                                    time.sleep(1)
-                                except Exception as part_error:
-                                    logging.error(f"Ошибка при продаже части {i+1}/{num_parts} {score.currency}: {part_error}")
-                            
-                            # Если хотя бы одна часть успешно продана, считаем продажу успешной
-                            if part_success > 0:
-                                successful_sales += 1
-                                logging.info(f"✅ Успешно продано {part_success}/{num_parts} частей {score.currency}")
-                            else:
-                                failed_sales += 1
-                                logging.warning(f"❌ Не удалось продать ни одной части {score.currency}")
-                        else:
-                            # Для малых балансов (не NOCK) используем 99% от баланса
-                            adjusted_balance = score.balance * 0.99
-                            adjusted_score = PriorityScore(
-                                currency=score.currency,
-                                balance=adjusted_balance,
-                                usd_value=adjusted_balance * score.market_data.current_price,
-                                priority_score=score.priority_score,
-                                market_data=score.market_data
-                            )
-                            
-                            logging.info(f"Используем 99% от баланса для {score.currency}: {adjusted_balance:.8f} (было {score.balance:.8f})")
-                            
-                            # Исполняем торговую стратегию
-                            success = execute_trading_strategy(adjusted_score, None)
-                            
-                            if success:
-                                successful_sales += 1
-                                logging.info(f"✅ Успешно продан {score.currency}")
-                            else:
-                                failed_sales += 1
-                                logging.warning(f"❌ Не удалось продать {score.currency}")
-                    else:
-                        # Стандартная обработка для продвинутого режима
-                        # Используем 99% от баланса, чтобы избежать ошибки insufficient_balance
-                        adjusted_balance = score.balance * 0.99
-                        adjusted_score = PriorityScore(
-                            currency=score.currency,
-                            balance=adjusted_balance,
-                            usd_value=adjusted_balance * score.market_data.current_price,
-                            priority_score=score.priority_score,
-                            market_data=score.market_data
-                        )
-                        
-                        logging.info(f"Используем 99% от баланса для {score.currency}: {adjusted_balance:.8f} (было {score.balance:.8f})")
-                        
-                        ai_decision = None
-                        # Получаем решение ИИ, только если он включен и мы не в простом режиме
-                        if AI_ENABLED and not EASY_MODE and cerebras_client:
-                            ai_decision = ai_assistant.get_ai_trading_decision(
-                                adjusted_score.currency,
-                                adjusted_score.balance,
-                                adjusted_score.market_data,
-                                db_manager  # Передаем db_manager
-                            )
-                        
-                        # Исполняем торговую стратегию
-                        success = execute_trading_strategy(adjusted_score, ai_decision)
-                        
-                        if success:
-                            successful_sales += 1
-                            logging.info(f"✅ Успешно продан {score.currency}")
-                        else:
-                            failed_sales += 1
-                            logging.warning(f"❌ Не удалось продать {score.currency}")
-                    
-                    total_processed += 1
-                    
-                    # Небольшая задержка между продажами
-                    time.sleep(2)
-                    
+                    results_by_currency[score.currency] = future.result()
                 except Exception as e:
                     logging.error(f"Ошибка при продаже {score.currency}: {e}")
-                    failed_sales += 1
-                    total_processed += 1
-            
-            # Инвалидируем кэш после всех операций
-            invalidate_cache()
-            
-            # Отправляем отчет администратору (если бот настроен)
-            if bot and ADMIN_CHAT_ID:
-                mode_text = "Простой режим" if EASY_MODE else "Продвинутый режим"
-                report = (
-                    f"🤖 **Отчет по автопродажам**\n\n"
-                    f"🔧 **Режим:** {mode_text}\n"
-                    f"📊 **Статистика:**\n"
-                    f"• Обработано валют: {total_processed}\n"
-                    f"• Успешных продаж: {successful_sales}\n"
-                    f"• Неудачных попыток: {failed_sales}\n"
-                    f"• Время выполнения: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                    f"💰 **Обработанные валюты:**\n"
+                    results_by_currency[score.currency] = {
+                        "currency": score.currency,
+                        "usd_value": score.usd_value,
+                        "success": False,
+                        "parts_total": 1,
+                        "parts_success": 0,
+                        "duration": 0.0,
+                        "error": str(e)
+                    }
+        
+        # Результаты в порядке приоритета
+        results = [results_by_currency[score.currency] for score in priority_scores]
+        total_processed = len(results)
+        successful_sales = sum(1 for r in results if r["success"])
+        failed_sales = total_processed - successful_sales
+        cycle_duration = time.time() - cycle_started_at
+        
+        # Инвалидируем кэш после всех операций
+        invalidate_cache()
+        
+        # Отправляем отчет администратору (если бот настроен)
+        if bot and ADMIN_CHAT_ID:
+            mode_text = "Простой режим" if EASY_MODE else "Продвинутый режим"
+            report = (
+                f"🤖 **Отчет по автопродажам**\n\n"
+                f"🔧 **Режим:** {mode_text}\n"
+                f"📊 **Статистика:**\n"
+                f"• Обработано валют: {total_processed}\n"
+                f"• Успешных продаж: {successful_sales}\n"
+                f"• Неудачных попыток: {failed_sales}\n"
+                f"• Длительность цикла: {cycle_duration:.1f} сек (воркеров: {workers})\n"
+                f"• Время выполнения: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+                f"💰 **Обработанные валюты:**\n"
+            )
+            
+            for r in results[:5]:  # Показываем только топ-5
+                status = "✅" if r["success"] else "❌"
+                parts_text = f", частей {r['parts_success']}/{r['parts_total']}" if r["parts_total"] > 1 else ""
+                report += f"{status} {r['currency']}: ${r['usd_value']:.2f} ({r['duration']:.1f} сек{parts_text})\n"
+            
+            try:
+                bot.send_message(
+                    ADMIN_CHAT_ID,
+                    report,
+                    parse_mode='Markdown'
                 )
-                
-                for score in priority_scores[:5]:  # Показываем только топ-5
-                    status = "✅" if score.currency in [s.currency for s in priority_scores] else "❌"
-                    report += f"{status} {score.currency}: ${score.usd_value:.2f}\n"
-                
-                try:
-                    bot.send_message(
-                        ADMIN_CHAT_ID,
-                        report,
-                        parse_mode='Markdown'
-                    )
-                    logging.info("📱 Отчет отправлен администратору")
-                except Exception as e:
-                    logging.error(f"Ошибка отправки отчета админу: {e}")
-            else:
-                logging.info("📊 Отчет по автопродажам:")
-                logging.info(f"   Обработано валют: {total_processed}")
-                logging.info(f"   Успешных продаж: {successful_sales}")
-                logging.info(f"   Неудачных попыток: {failed_sales}")
-            
-            return {
-                "success": True,
-                "total_processed": total_processed,
-                "successful_sales": successful_sales,
-                "failed_sales": failed_sales,
-                "message": f"Обработано {total_processed} валют, успешно продано {successful_sales}"
-            }
+                logging.info("📱 Отчет отправлен администратору")
+            except Exception as e:
+                logging.error(f"Ошибка отправки отчета админу: {e}")
+        else:
+            logging.info("📊 Отчет по автопродажам:")
+            logging.info(f"   Обработано валют: {total_processed}")
+            logging.info(f"   Успешных продаж: {successful_sales}")
+            logging.info(f"   Неудачных попыток: {failed_sales}")
+            logging.info(f"   Длительность цикла: {cycle_duration:.1f} сек (воркеров: {workers})")
+            for r in results:
+                status = "✅" if r["success"] else "❌"
+                logging.info(f"   {status} {r['currency']}: ${r['usd_value']:.2f} за {r['duration']:.1f} сек")
+        
+        return {
+            "success": True,
+            "total_processed": total_processed,
+            "successful_sales": successful_sales,
+            "failed_sales": failed_sales,
+            "duration": cycle_duration,
+            "results": results,
+            "message": f"Обработано {total_processed} валют, успешно продано {successful_sales}"
+        }
     
     except Exception as e:
         error_msg = f"Критическая ошибка в автопродаже: {e}"
@@ -3031,6 +3883,31 @@ def start_auto_sell_scheduler():
     scheduler_thread.start()
     logging.info(f"Планировщик автопродаж запущен с интервалом {AUTO_SELL_INTERVAL} секунд")
 
+def run_price_rollup():
+    """Свертка истории цен с настройками database.rollup"""
+    rollup_config = CONFIG.get('database', {}).get('rollup', {})
+    # Секции следующих месяцев должны существовать до первой записи в них
+    db_manager.ensure_partitions()
+    return db_manager.rollup_price_history(
+        raw_retention_days=rollup_config.get('raw_retention_days', 3),
+        candle_retention_days=rollup_config.get('candle_retention_days', {'1m': 14, '1h': 365, '1d': 0})
+    )
+
+def start_rollup_scheduler():
+    """Запускает периодическую свертку истории цен"""
+    interval = CONFIG.get('database', {}).get('rollup', {}).get('interval', 3600)
+
+    def scheduler():
+        while True:
+            try:
+                run_price_rollup()
+            except Exception as e:
+                logging.error(f"Ошибка свертки истории цен: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=scheduler, name="price-rollup", daemon=True).start()
+    logging.info(f"Свертка истории цен запущена с интервалом {interval} секунд")
+
 # --- TELEGRAM BOT HANDLERS ---
 # Проверяем, что бот инициализирован перед регистрацией обработчиков
 if bot:
@@ -3072,7 +3949,9 @@ if bot:
         """Проверка состояния бота"""
         if str(message.chat.id) == ADMIN_CHAT_ID:
             network_status = "✅ OK" if check_network_connectivity() else "❌ Error"
-            bot.reply_to(message, f"🤖 Бот: Активен\n🌐 Сеть: {network_status}")
+            latency = command_metrics.summary()
+            latency_text = f"\n\n⏱ Время выполнения команд:\n{latency}" if latency else ""
+            bot.reply_to(message, f"🤖 Бот: Активен\n🌐 Сеть: {network_status}{latency_text}")
         else:
             bot.reply_to(message, "❌ У вас нет прав для выполнения этой команды")
 
@@ -3117,9 +3996,12 @@ if bot:
         try:
             bot.reply_to(message, "🔍 Сбор данных по всем биржам...")
             
-            # Собираем данные с обеих бирж
-            sf_report = get_sf_balance_str()
-            mexc_report = get_mexc_balance_str()
+            # Собираем данные с обеих бирж параллельно
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="balance") as executor:
+                sf_future = executor.submit(get_sf_balance_str)
+                mexc_future = executor.submit(get_mexc_balance_str)
+                sf_report = sf_future.result()
+                mexc_report = mexc_future.result()
             
             # Формируем общий ответ
             full_report = (
@@ -3822,8 +4704,12 @@ def main():
                     print(f"   • История ордеров: {stats['order_history']}")
                     print(f"   • Решения ИИ: {stats['ai_decisions']}")
                     print(f"   • Метрики производительности: {stats['performance_metrics']}")
-                    print(f"   • Дубликаты: {stats['duplicates']}")
+                    missing = stats['missing_unique_keys']
+                    print(f"   • Уникальные ключи: {'н/д' if missing is None else ('нет для ' + ', '.join(missing)) if missing else '✅'}")
                     print(f"   • Соединение: {'✅' if stats['connection_healthy'] else '❌'}")
+                    for table, info in stats['tables'].items():
+                        size = f"{info['size_bytes'] / 1024 / 1024:.1f} МБ" if info['size_bytes'] is not None else "н/д"
+                        print(f"   • {table}: {info['rows']} строк, {size}, последняя вставка: {info['last_insert'] or 'н/д'}")
                 
                 # Проверяем здоровье
                 health_result = db_manager.check_database_health()
@@ -3832,11 +4718,41 @@ def main():
             except Exception as e:
                 logging.error(f"❌ Ошибка при проверке здоровья: {e}")
                 return
+        elif command == "rollup":
+            logging.info("🕯 Свертка истории цен в свечи...")
+            try:
+                stats = run_price_rollup()
+                for target, result in stats.items():
+                    print(f"   • {target}: {result}")
+            except Exception as e:
+                logging.error(f"❌ Ошибка свертки истории цен: {e}")
+            finally:
+                db_manager.close_connection()
+            return
+        elif command == "migrate":
+            migration_config = CONFIG.get('database', {}).get('migration', {})
+            logging.info("🗄 Миграция Supabase на timestamptz и помесячные секции...")
+            try:
+                report = db_manager.migrate_timestamps(
+                    source_tz=migration_config.get('source_timezone', 'UTC'),
+                    batch_size=migration_config.get('batch_size', 5000),
+                    pause=migration_config.get('pause', 0)
+                )
+                print(f"   • Подготовка: {report['prepare']}")
+                print(f"   • Перенесено строк истории цен: {report['moved']} ({report['chunks']} пачек)")
+                print(f"   • Завершение: {report['finish'] or 'не завершено, запустите команду снова'}")
+            except Exception as e:
+                logging.error(f"❌ Ошибка миграции (выполните supabase_migrate_timestamptz.sql и повторите): {e}")
+            finally:
+                db_manager.close_connection()
+            return
         elif command == "help":
             print("SafeTrade Trading Bot - Команды:")
             print("  python main.py          - Запуск бота")
             print("  python main.py cleanup  - Очистка дубликатов в БД")
             print("  python main.py health   - Проверка здоровья БД")
+            print("  python main.py rollup   - Свертка истории цен в свечи и очистка старых строк")
+            print("  python main.py migrate  - Перевод Supabase на timestamptz и помесячные секции")
             print("  python main.py help     - Показать эту справку")
             return
         elif command == "env":
@@ -3901,10 +4817,11 @@ def main():
         # Инициализируем менеджер базы данных
         logging.info("🔍 Проверка здоровья базы данных при запуске...")
         try:
-            if SUPABASE_URL and SUPABASE_KEY:
-                supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-                db_manager = DatabaseManager(supabase)
+            # db_manager создан при импорте (с локальным хранилищем, очередью записи и синхронизацией)
+            if db_manager.supabase and db_manager.check_connection():
                 db_manager.check_database_health()
+            elif db_manager.local:
+                logging.warning("⚠️ Supabase недоступен, работаем с локальным хранилищем")
             else:
                 logging.error("❌ Supabase URL или ключ не настроены")
                 return
@@ -3915,6 +4832,15 @@ def main():
         # Загружаем состояние кэша
         load_cache_state()
         
+        # Приватный поток ордеров запускается один раз на процесс, до возобновления отслеживания
+        setup_websocket_order_tracking()
+        
+        # Ордера, оставшиеся открытыми по журналу, снова под отслеживанием
+        resume_journaled_orders()
+        
+        if CONFIG.get('database', {}).get('rollup', {}).get('enabled', True):
+            start_rollup_scheduler()
+        
         # Запускаем планировщик автопродаж (если настроен)
         if AUTO_SELL_INTERVAL > 0:
             start_auto_sell_scheduler()
@@ -3988,6 +4914,7 @@ def main():
         save_cache_state()
         if bot:  # Проверяем, что бот инициализирован
             cancel_all_active_orders()
+        db_manager.close_connection()
 
 def save_trade_history_to_db(trade_history_client):
     """Сохраняет историю сделок в базу данных для кэширования"""
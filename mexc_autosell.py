@@ -13,9 +13,12 @@ MEXC Auto-Sell Script (Dust Sweeper)
 import os
 import time
 import logging
-from decimal import Decimal, ROUND_FLOOR, InvalidOperation
+from decimal import Decimal, InvalidOperation
 from dotenv import load_dotenv
 from mexc_api.spot import Spot
+from typing import Optional
+from order_router import currency_locks
+from order_sizing import SizingRules, format_decimal, quantize_to_step, step_from_precision
 from requests.exceptions import RequestException
 
 # Загружаем переменные окружения из .env файла
@@ -132,29 +135,44 @@ class MexcSweeper:
             Округленное количество как Decimal
         """
         try:
-            q = Decimal(str(quantity))
-            
             # Если step_size это число знаков (int), например 2:
             if isinstance(step_size, int) or (
                 isinstance(step_size, Decimal) and 
                 step_size >= 1 and 
                 step_size % 1 == 0
             ):
-                precision = int(step_size)
-                if precision == 0:
-                    return q.quantize(Decimal('1'), rounding=ROUND_FLOOR)
-                else:
-                    format_str = "1." + "0" * precision
-                    return q.quantize(Decimal(format_str), rounding=ROUND_FLOOR)
+                return quantize_to_step(quantity, step_from_precision(int(step_size)))
             
-            # Если step_size это float или Decimal, например 0.01:
-            step = Decimal(str(step_size))
-            return q.quantize(step, rounding=ROUND_FLOOR)
+            # Если step_size это float или Decimal, например 0.01 или 0.5 - округляем до кратного шагу
+            return quantize_to_step(quantity, step_size)
             
         except (InvalidOperation, ValueError) as e:
             self.logger.error(f"Error rounding quantity {quantity} with step {step_size}: {e}")
             return Decimal('0')
     
+    def sizing_rules(self, symbol: str) -> Optional[SizingRules]:
+        """
+        Правила пары в формате order_sizing (для маршрутизации между биржами).
+        Шаг интерпретируется так же, как в _round_step.
+        
+        Args:
+            symbol: Торговая пара (например, "BTCUSDT")
+            
+        Returns:
+            SizingRules или None, если пара не торгуется
+        """
+        rules = self.symbol_rules.get(symbol)
+        if not rules:
+            return None
+        step_size = rules['step_size']
+        if step_size >= 1 and step_size % 1 == 0:
+            step_size = step_from_precision(int(step_size))
+        return SizingRules(
+            amount_step=step_size,
+            min_amount=rules['min_qty'],
+            min_notional=rules['min_notional']
+        )
+    
     def _get_current_price(self, symbol: str) -> Decimal:
         """
         Получает текущую цену для символа.
@@ -275,6 +293,16 @@ class MexcSweeper:
                     })
                     continue
             
+            # Монету сейчас продает маршрутизатор - ее баланс уже занят
+            sale_lock = currency_locks.get(asset)
+            if not sale_lock.acquire(blocking=False):
+                self.logger.info(f"Skipping {asset}: sale in progress elsewhere")
+                results['skipped'].append({
+                    'asset': asset,
+                    'reason': 'Sale in progress elsewhere'
+                })
+                continue
+            
             # Продаем
             try:
                 if dry_run:
@@ -283,7 +311,7 @@ class MexcSweeper:
                     )
                     results['sold'].append({
                         'asset': asset,
-                        'quantity': str(formatted_qty),
+                        'quantity': format_decimal(formatted_qty),
                         'dry_run': True
                     })
                 else:
@@ -295,14 +323,14 @@ class MexcSweeper:
                         side="SELL",
                         order_type="MARKET",
                         options={
-                            "quantity": str(formatted_qty)
+                            "quantity": format_decimal(formatted_qty)
                         }
                     )
                     
                     self.logger.info(f"Successfully sold {asset}: {order_response}")
                     results['sold'].append({
                         'asset': asset,
-                        'quantity': str(formatted_qty),
+                        'quantity': format_decimal(formatted_qty),
                         'response': order_response
                     })
                     
@@ -321,6 +349,8 @@ class MexcSweeper:
                 if 'too many requests' in error_msg.lower() or 'rate limit' in error_msg.lower():
                     self.logger.info("Rate limit hit, waiting 2 seconds...")
                     time.sleep(2)
+            finally:
+                sale_lock.release()
         
         return results
     
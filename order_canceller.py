@@ -0,0 +1,92 @@
+"""
+Быстрая отмена всех открытых ордеров при завершении работы.
+
+Docker дает процессу несколько секунд после SIGTERM. Последовательная отмена
+через cancel_order (tenacity-повторы с ожиданием 4-10 сек и запись в Supabase
+на каждый ордер) в это время не укладывается. Здесь:
+
+- запрашиваются только ордера в состоянии wait;
+- рынки с несколькими ордерами отменяются одним запросом на рынок (если биржа
+  его принимает), остальные ордера - параллельно по одному;
+- вся операция ограничена общим дедлайном;
+- статусы для базы не пишутся здесь: вызывающий код ставит их в очередь записи.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class CancelReport:
+    cancelled: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    unfinished: List[str] = field(default_factory=list)   # Не успели до дедлайна
+    bulk_markets: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def cancel_open_orders(fetch_open_orders: Callable[[], Optional[list]],
+                       cancel_one: Callable[[str], object],
+                       cancel_market: Optional[Callable[[str], object]] = None,
+                       deadline: float = 8, max_workers: int = 8,
+                       clock=time.monotonic) -> CancelReport:
+    """
+    Отменяет все ожидающие ордера параллельно в пределах deadline секунд.
+    cancel_market(market) - массовая отмена рынка; при ошибке ордера рынка
+    отменяются по одному.
+    """
+    started = clock()
+    report = CancelReport()
+    orders = fetch_open_orders() or []
+    by_market: Dict[str, List[str]] = {}
+    for order in orders:
+        if isinstance(order, dict) and order.get('id') is not None:
+            by_market.setdefault(str(order.get('market') or ''), []).append(str(order['id']))
+    if not by_market:
+        report.elapsed = clock() - started
+        return report
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="cancel")
+    pending = {}   # future -> ("market", market, ids) | ("order", order_id)
+
+    def submit_singles(ids):
+        for order_id in ids:
+            pending[executor.submit(cancel_one, order_id)] = ("order", order_id)
+
+    for market, ids in by_market.items():
+        if cancel_market and market and len(ids) > 1:
+            pending[executor.submit(cancel_market, market)] = ("market", market, ids)
+        else:
+            submit_singles(ids)
+
+    try:
+        while pending:
+            remaining = deadline - (clock() - started)
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                error = future.exception()
+                if task[0] == "market":
+                    if error is None:
+                        report.bulk_markets.append(task[1])
+                        report.cancelled.extend(task[2])
+                    else:
+                        logging.warning(f"Массовая отмена {task[1]} не удалась ({error}), отменяем по одному")
+                        submit_singles(task[2])
+                elif error is None:
+                    report.cancelled.append(task[1])
+                else:
+                    logging.warning(f"Ордер {task[1]} не отменен: {error}")
+                    report.failed.append(task[1])
+    finally:
+        for task in pending.values():
+            report.unfinished.extend(task[2] if task[0] == "market" else [task[1]])
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    report.elapsed = clock() - started
+    return report
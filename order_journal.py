@@ -0,0 +1,175 @@
+"""
+Журнал жизненного цикла ордеров.
+
+Каждое изменение состояния ордера дописывается строкой в JSONL-файл, а
+состояние в памяти получается проигрыванием журнала при запуске. Так после
+перезапуска известно, какие ордера бот выставил и какие из них (включая
+части TWAP/VWAP/Iceberg) еще открыты, - без запроса истории ордеров с биржи.
+
+Переходы: pending -> partial -> filled / cancelled, pending -> failed.
+Недопустимые переходы (например, из filled обратно в partial при запоздавшем
+событии) игнорируются.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class OrderStatus(Enum):
+    PENDING = "pending"
+    PARTIAL = "partial"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+
+TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PARTIAL, OrderStatus.FILLED, OrderStatus.CANCELLED, OrderStatus.FAILED},
+    OrderStatus.PARTIAL: {OrderStatus.PARTIAL, OrderStatus.FILLED, OrderStatus.CANCELLED},
+    OrderStatus.FILLED: set(),
+    OrderStatus.CANCELLED: set(),
+    OrderStatus.FAILED: set(),
+}
+
+TERMINAL = {OrderStatus.FILLED, OrderStatus.CANCELLED, OrderStatus.FAILED}
+
+
+@dataclass
+class OrderRecord:
+    order_id: str
+    market: str
+    side: str
+    amount: float
+    price: Optional[float] = None
+    order_type: str = "limit"
+    strategy: Optional[str] = None
+    status: str = OrderStatus.PENDING.value
+    filled: float = 0.0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def state(self) -> OrderStatus:
+        return OrderStatus(self.status)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state not in TERMINAL
+
+
+class OrderJournal:
+    """Append-only журнал ордеров с состоянием в памяти."""
+
+    def __init__(self, path: Path, compact_threshold: int = 5000, keep_closed: int = 500):
+        self.path = Path(path)
+        self.compact_threshold = compact_threshold
+        self.keep_closed = keep_closed
+        self.lock = threading.Lock()
+        self.records: Dict[str, OrderRecord] = {}
+        self.lines = 0
+        if self.path.exists():
+            self._replay()
+
+    # --- Журнал ---
+
+    def _replay(self) -> None:
+        started = time.perf_counter()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                self.lines += 1
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    logging.debug(f"Пропущена строка журнала ордеров: {e}")
+        logging.info(
+            f"Журнал ордеров: {len(self.records)} ордеров ({len(self.open_orders())} открытых) "
+            f"за {(time.perf_counter() - started) * 1000:.1f} мс"
+        )
+        if self.lines > self.compact_threshold:
+            self.compact()
+
+    def _apply(self, event: dict) -> bool:
+        """Применяет событие к состоянию в памяти. Вызывается под self.lock или при проигрывании."""
+        order_id = str(event["order_id"])
+        if event["op"] == "open":
+            fields = {k: v for k, v in event.items() if k in OrderRecord.__dataclass_fields__}
+            fields["order_id"] = order_id
+            self.records[order_id] = OrderRecord(**fields)
+            return True
+
+        record = self.records.get(order_id)
+        if record is None:
+            return False
+        status = OrderStatus(event["status"])
+        if status not in TRANSITIONS[record.state]:
+            return False
+        record.status = status.value
+        if event.get("filled") is not None:
+            record.filled = max(record.filled, float(event["filled"]))
+        record.updated_at = event.get("ts", record.updated_at)
+        return True
+
+    def _write(self, event: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.lines += 1
+
+    def compact(self) -> None:
+        """Переписывает журнал: открытые ордера и последние keep_closed закрытых, по одной строке на ордер."""
+        with self.lock:
+            closed = sorted((r for r in self.records.values() if not r.is_open), key=lambda r: r.updated_at)
+            keep = [r for r in self.records.values() if r.is_open]
+            if self.keep_closed:
+                keep += closed[-self.keep_closed:]
+            self.records = {r.order_id: r for r in keep}
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in keep:
+                    f.write(json.dumps(dict(asdict(record), op="open"), ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self.lines = len(keep)
+        logging.info(f"Журнал ордеров сжат до {len(keep)} записей")
+
+    # --- Состояние ---
+
+    def open(self, order_id, market: str, side: str, amount, price=None, order_type: str = "limit",
+             strategy: Optional[str] = None) -> OrderRecord:
+        """Записывает новый выставленный ордер в состоянии pending."""
+        now = time.time()
+        event = {
+            "op": "open", "order_id": str(order_id), "market": market.lower(), "side": side,
+            "amount": float(amount), "price": float(price) if price else None,
+            "order_type": order_type, "strategy": strategy, "status": OrderStatus.PENDING.value,
+            "filled": 0.0, "created_at": now, "updated_at": now,
+        }
+        with self.lock:
+            self._apply(event)
+            self._write(event)
+            return self.records[str(order_id)]
+
+    def transition(self, order_id, status: OrderStatus, filled=None) -> bool:
+        """Переводит ордер в status. False - ордер не в журнале или переход недопустим."""
+        event = {"op": "update", "order_id": str(order_id), "status": status.value,
+                 "filled": float(filled) if filled is not None else None, "ts": time.time()}
+        with self.lock:
+            if not self._apply(event):
+                return False
+            self._write(event)
+        return True
+
+    def get(self, order_id) -> Optional[OrderRecord]:
+        with self.lock:
+            return self.records.get(str(order_id))
+
+    def open_orders(self, strategy: Optional[str] = None) -> List[OrderRecord]:
+        """Незавершенные ордера (pending/partial), при strategy - только этой стратегии."""
+        return [r for r in list(self.records.values())
+                if r.is_open and (strategy is None or r.strategy == strategy)]
@@ -0,0 +1,196 @@
+"""
+Маршрутизация продажи между биржами (SafeTrade и MEXC).
+
+По стаканам обеих бирж оценивается ожидаемое исполнение рыночной продажи
+с учетом комиссии, и объем распределяется так, чтобы чистая выручка в USDT
+была максимальной. Объем каждой биржи ограничен ее свободным балансом и
+приводится к ее правилам округления (order_sizing.SizingRules).
+
+currency_locks - блокировки продаж по монете, общие для маршрутизатора и
+MexcSweeper: пока маршрутизатор продает монету, сборщик пыли MEXC ее не трогает.
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from order_sizing import SizingRules, quantize_amount, to_decimal
+
+
+class CurrencyLocks:
+    """Реестр блокировок продаж по монете (без учета регистра)."""
+
+    def __init__(self):
+        self._guard = Lock()
+        self._locks: Dict[str, Lock] = {}
+
+    def get(self, currency: str) -> Lock:
+        with self._guard:
+            return self._locks.setdefault(currency.upper(), Lock())
+
+
+currency_locks = CurrencyLocks()
+
+
+@dataclass
+class VenueQuote:
+    """Стакан и ограничения одной биржи для маршрутизации."""
+    venue: str
+    bids: List[Tuple[Decimal, Decimal]]  # (цена, объем), лучшие цены первыми
+    rules: SizingRules
+    available: Decimal                   # Свободный баланс монеты на бирже
+    fee: Decimal = Decimal("0")          # Комиссия тейкера, доля
+
+
+@dataclass
+class FillEstimate:
+    """Ожидаемое исполнение рыночной продажи по стакану."""
+    amount: Decimal = Decimal("0")       # Исполненный объем
+    proceeds: Decimal = Decimal("0")     # Чистая выручка после комиссии
+    unfilled: Decimal = Decimal("0")     # Объем, на который не хватило стакана
+
+    @property
+    def avg_price(self) -> Decimal:
+        return self.proceeds / self.amount if self.amount > 0 else Decimal("0")
+
+
+@dataclass
+class RoutePlan:
+    """Распределение продажи по биржам."""
+    allocations: Dict[str, Decimal] = field(default_factory=dict)
+    estimates: Dict[str, FillEstimate] = field(default_factory=dict)
+
+    @property
+    def total_amount(self) -> Decimal:
+        return sum(self.allocations.values(), Decimal("0"))
+
+    @property
+    def total_proceeds(self) -> Decimal:
+        return sum((e.proceeds for e in self.estimates.values()), Decimal("0"))
+
+
+def parse_bids(raw_bids: Sequence, depth: Optional[int] = None) -> List[Tuple[Decimal, Decimal]]:
+    """Приводит bids из ответа биржи ([[цена, объем], ...] или [{'price','amount'}]) к Decimal."""
+    bids = []
+    for level in list(raw_bids or [])[:depth]:
+        if isinstance(level, dict):
+            price = level.get('price')
+            amount = level.get('amount', level.get('quantity', level.get('volume')))
+        else:
+            price, amount = level[0], level[1]
+        price, amount = to_decimal(price), to_decimal(amount)
+        if price > 0 and amount > 0:
+            bids.append((price, amount))
+    bids.sort(key=lambda level: level[0], reverse=True)
+    return bids
+
+
+def expected_fill(bids: Sequence[Tuple[Decimal, Decimal]], amount, fee=0,
+                  min_price: Optional[Decimal] = None) -> FillEstimate:
+    """Проходит по стакану сверху вниз и считает чистую выручку продажи amount."""
+    remaining = to_decimal(amount)
+    fee_factor = 1 - to_decimal(fee)
+    estimate = FillEstimate()
+    for price, size in bids:
+        if remaining <= 0 or (min_price is not None and price < min_price):
+            break
+        take = min(remaining, size)
+        estimate.amount += take
+        estimate.proceeds += take * price * fee_factor
+        remaining -= take
+    estimate.unfilled = max(remaining, Decimal("0"))
+    return estimate
+
+
+def _is_tradeable(amount: Decimal, quote: VenueQuote) -> bool:
+    """Объем проходит min_amount и min_notional биржи (оценка по лучшему bid)."""
+    if amount <= 0 or amount < quote.rules.min_amount:
+        return False
+    if quote.rules.min_notional > 0 and quote.bids:
+        return amount * quote.bids[0][0] >= quote.rules.min_notional
+    return True
+
+
+def _evaluate(quotes: Dict[str, VenueQuote], allocations: Dict[str, Decimal],
+              min_net_price: Optional[Decimal]) -> Optional[RoutePlan]:
+    """Округляет распределение по правилам бирж и оценивает выручку. None - план неисполним."""
+    plan = RoutePlan()
+    for venue, amount in allocations.items():
+        quote = quotes[venue]
+        amount = quantize_amount(min(amount, quote.available), quote.rules)
+        if not _is_tradeable(amount, quote):
+            continue
+        min_price = None
+        if min_net_price is not None:
+            min_price = min_net_price / (1 - quote.fee)
+        estimate = expected_fill(quote.bids, amount, quote.fee, min_price)
+        if estimate.unfilled > 0:
+            # Стакана не хватает в пределах допустимого проскальзывания - продаем только исполнимое
+            amount = quantize_amount(estimate.amount, quote.rules)
+            if not _is_tradeable(amount, quote):
+                continue
+            estimate = expected_fill(quote.bids, amount, quote.fee, min_price)
+        plan.allocations[venue] = amount
+        plan.estimates[venue] = estimate
+    return plan if plan.allocations else None
+
+
+def route_sell(quotes: Sequence[VenueQuote], amount=None, max_slippage=None) -> Optional[RoutePlan]:
+    """
+    Распределяет продажу amount (по умолчанию - все свободные балансы) между биржами.
+
+    Уровни стаканов всех бирж сливаются по чистой цене (цена * (1 - комиссия)),
+    и объем набирается с лучших уровней, не превышая баланс каждой биржи.
+    max_slippage ограничивает худшую чистую цену относительно лучшей среди бирж.
+    Кроме разделенного плана рассматривается продажа целиком на каждой бирже
+    (в пределах ее баланса) - после округления и минимальных ограничений она
+    иногда выгоднее.
+    """
+    quotes_by_venue = {q.venue: q for q in quotes if q.bids and q.available > 0}
+    if not quotes_by_venue:
+        return None
+
+    target = to_decimal(amount) if amount is not None else sum(
+        (q.available for q in quotes_by_venue.values()), Decimal("0")
+    )
+    if target <= 0:
+        return None
+    # Бюджет биржи - ее собственный свободный баланс, но не больше всей продажи
+    budgets = {venue: min(q.available, target) for venue, q in quotes_by_venue.items()}
+
+    levels = []
+    for quote in quotes_by_venue.values():
+        fee_factor = 1 - quote.fee
+        for price, size in quote.bids:
+            levels.append((price * fee_factor, quote.venue, size))
+    levels.sort(key=lambda level: level[0], reverse=True)
+
+    min_net_price = None
+    if max_slippage is not None and levels:
+        min_net_price = levels[0][0] * (1 - to_decimal(max_slippage))
+
+    allocations = {venue: Decimal("0") for venue in quotes_by_venue}
+    remaining = target
+    for net_price, venue, size in levels:
+        if remaining <= 0 or (min_net_price is not None and net_price < min_net_price):
+            break
+        capacity = budgets[venue] - allocations[venue]
+        take = min(size, capacity, remaining)
+        if take <= 0:
+            continue
+        allocations[venue] += take
+        remaining -= take
+
+    candidates = [{v: a for v, a in allocations.items() if a > 0}]
+    for venue in quotes_by_venue:
+        candidates.append({venue: budgets[venue]})
+
+    best = None
+    for candidate in candidates:
+        plan = _evaluate(quotes_by_venue, candidate, min_net_price)
+        if plan is None:
+            continue
+        if best is None or plan.total_proceeds > best.total_proceeds:
+            best = plan
+    return best
@@ -0,0 +1,168 @@
+"""
+Точный расчет размера ордеров на Decimal для SafeTrade и MEXC.
+
+Вся арифметика объема и цены выполняется в Decimal, без float:
+    - объем и цена приводятся к шагу (step) или точности (число знаков)
+    - проверяются минимальный объем (min_amount) и минимальная сумма сделки (min_notional)
+    - значения отдаются в каноническом строковом виде без экспоненты и лишних нулей
+
+Это устраняет отказы биржи вида market.order.non_round_amount, которые возникали из-за
+артефактов float (0.30000000000000004, 1e-05 и т.п.).
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING, InvalidOperation
+from typing import Optional
+
+
+class OrderSizeError(ValueError):
+    """Ордер нельзя выставить: объем или сумма сделки ниже минимальных."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def to_decimal(value) -> Decimal:
+    """Преобразует число/строку в Decimal без артефактов двоичного представления float."""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        # repr(float) - кратчайшее десятичное представление, в отличие от Decimal(float)
+        return Decimal(repr(value))
+    try:
+        return Decimal(str(value).strip())
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f"Некорректное число: {value!r}") from e
+
+
+def step_from_precision(precision: int) -> Decimal:
+    """Шаг для заданного числа знаков после запятой: 4 -> 0.0001, 0 -> 1."""
+    precision = int(precision)
+    if precision < 0:
+        raise ValueError(f"Точность не может быть отрицательной: {precision}")
+    return Decimal(1).scaleb(-precision)
+
+
+def quantize_to_step(value, step, rounding=ROUND_FLOOR) -> Decimal:
+    """
+    Приводит значение к сетке шага step (0.01, 0.5, 10 ...).
+    По умолчанию округляет вниз - объем никогда не превышает исходный.
+    """
+    value = to_decimal(value)
+    step = to_decimal(step)
+    if step <= 0:
+        raise ValueError(f"Шаг должен быть положительным: {step}")
+    units = (value / step).to_integral_value(rounding=rounding)
+    # Фиксируем число знаков по шагу, чтобы 1.10 и 1.1 давали одинаковый результат
+    exponent = min(step.normalize().as_tuple().exponent, 0)
+    return (units * step).quantize(Decimal(1).scaleb(exponent))
+
+
+def format_decimal(value) -> str:
+    """Канонический вид для API: без экспоненты, без хвостовых нулей ('1.5', '100', '0.00001')."""
+    value = to_decimal(value)
+    if value == 0:
+        return "0"
+    return format(value.normalize(), "f")
+
+
+@dataclass(frozen=True)
+class SizingRules:
+    """Правила рынка для размера ордера."""
+    amount_step: Decimal
+    price_step: Optional[Decimal] = None
+    min_amount: Decimal = Decimal("0")
+    min_notional: Decimal = Decimal("0")
+
+    @classmethod
+    def from_precision(cls, amount_precision: int, price_precision: Optional[int] = None,
+                       min_amount=0, min_notional=0) -> "SizingRules":
+        return cls(
+            amount_step=step_from_precision(amount_precision),
+            price_step=step_from_precision(price_precision) if price_precision is not None else None,
+            min_amount=to_decimal(min_amount),
+            min_notional=to_decimal(min_notional),
+        )
+
+
+@dataclass(frozen=True)
+class OrderSize:
+    """Результат расчета: точные значения и их строки для API."""
+    amount: Decimal
+    amount_str: str
+    price: Optional[Decimal] = None
+    price_str: Optional[str] = None
+    notional: Optional[Decimal] = None
+
+
+def rules_from_safetrade_market(market_info: Optional[dict], amount_precision: Optional[int] = None,
+                                default_precision: int = 4) -> SizingRules:
+    """
+    Правила из описания рынка SafeTrade (/trade/public/markets).
+    amount_precision переопределяет точность из API (например, выученную precision_cache).
+    """
+    market_info = market_info or {}
+    if amount_precision is None:
+        amount_precision = market_info.get('amount_precision', default_precision)
+    price_precision = market_info.get('price_precision')
+    return SizingRules.from_precision(
+        amount_precision=int(amount_precision),
+        price_precision=int(price_precision) if price_precision is not None else None,
+        min_amount=market_info.get('min_amount') or 0,
+        min_notional=market_info.get('min_notional') or 0,
+    )
+
+
+def quantize_amount(amount, rules: SizingRules) -> Decimal:
+    """Объем по шагу рынка, округление вниз."""
+    return quantize_to_step(amount, rules.amount_step, rounding=ROUND_FLOOR)
+
+
+def quantize_price(price, rules: SizingRules, side: str = "sell") -> Decimal:
+    """
+    Цена по шагу рынка. Для продажи округляем вверх (не продаем дешевле заданного),
+    для покупки - вниз (не покупаем дороже).
+    """
+    if rules.price_step is None:
+        return to_decimal(price)
+    rounding = ROUND_CEILING if side == "sell" else ROUND_FLOOR
+    return quantize_to_step(price, rules.price_step, rounding=rounding)
+
+
+def size_order(amount, rules: SizingRules, price=None, reference_price=None, side: str = "sell") -> OrderSize:
+    """
+    Рассчитывает итоговый размер ордера.
+
+    price - цена лимитного ордера (приводится к шагу цены),
+    reference_price - оценка цены для проверки min_notional у рыночного ордера.
+    Бросает OrderSizeError, если ордер меньше минимальных ограничений рынка.
+    """
+    quantized_amount = quantize_amount(amount, rules)
+    if quantized_amount <= 0:
+        raise OrderSizeError("zero_amount", f"Объем {amount} после округления до шага {rules.amount_step} равен нулю")
+    if quantized_amount < rules.min_amount:
+        raise OrderSizeError(
+            "below_min_amount",
+            f"Объем {format_decimal(quantized_amount)} меньше минимального {format_decimal(rules.min_amount)}"
+        )
+
+    quantized_price = quantize_price(price, rules, side) if price is not None else None
+    notional_price = quantized_price if quantized_price is not None else (
+        to_decimal(reference_price) if reference_price is not None else None
+    )
+    notional = quantized_amount * notional_price if notional_price is not None else None
+
+    if notional is not None and rules.min_notional > 0 and notional < rules.min_notional:
+        raise OrderSizeError(
+            "below_min_notional",
+            f"Сумма сделки {format_decimal(notional)} меньше минимальной {format_decimal(rules.min_notional)}"
+        )
+
+    return OrderSize(
+        amount=quantized_amount,
+        amount_str=format_decimal(quantized_amount),
+        price=quantized_price,
+        price_str=format_decimal(quantized_price) if quantized_price is not None else None,
+        notional=notional,
+    )
@@ -0,0 +1,62 @@
+"""
+Снимок ордеров аккаунта с индексом по id.
+
+/trade/market/orders отдает ордера страницами (limit/offset). Снимок проходит
+все страницы, строит словарь id -> ордер и отвечает на любое число запросов
+статуса за O(1) без повторных обращений к бирже и без линейного поиска по списку.
+"""
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+NOT_FOUND = 'not_found'
+
+
+class OrderSnapshot:
+    """Ордера на момент taken_at, проиндексированные по id."""
+
+    def __init__(self, orders: Iterable[dict], taken_at: Optional[float] = None, complete: bool = True):
+        self.orders: List[dict] = [o for o in orders if isinstance(o, dict) and o.get('id') is not None]
+        self.by_id: Dict[str, dict] = {str(o['id']): o for o in self.orders}
+        self.taken_at = taken_at if taken_at is not None else time.time()
+        # False - страницы закончились по лимиту max_pages, отсутствие ордера не гарантирует not_found
+        self.complete = complete
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def __contains__(self, order_id) -> bool:
+        return str(order_id) in self.by_id
+
+    def get(self, order_id) -> Optional[dict]:
+        return self.by_id.get(str(order_id))
+
+    def status(self, order_id) -> str:
+        order = self.by_id.get(str(order_id))
+        if order is None:
+            return NOT_FOUND if self.complete else 'unknown'
+        return order.get('state', 'unknown')
+
+    def statuses(self, order_ids: Iterable) -> Dict:
+        """Статусы нескольких ордеров: {order_id: state | 'not_found'}."""
+        return {order_id: self.status(order_id) for order_id in order_ids}
+
+
+def fetch_order_snapshot(get_orders: Callable, state: Optional[str] = None, page_size: int = 100,
+                         max_pages: int = 20, clock=time.time) -> OrderSnapshot:
+    """
+    Собирает снимок, проходя страницы get_orders(state=..., limit=..., offset=...)
+    до первой неполной страницы. Ошибки запроса пробрасываются вызывающему.
+    """
+    taken_at = clock()
+    orders: List[dict] = []
+    complete = False
+    for page in range(max_pages):
+        batch = get_orders(state=state, limit=page_size, offset=page * page_size)
+        if not isinstance(batch, list):
+            raise ValueError(f"Неожиданный ответ списка ордеров: {type(batch).__name__}")
+        orders.extend(batch)
+        if len(batch) < page_size:
+            complete = True
+            break
+    return OrderSnapshot(orders, taken_at=taken_at, complete=complete)
@@ -0,0 +1,314 @@
+"""
+Централизованное отслеживание открытых ордеров.
+
+Вместо отдельного потока с опросом get_order_details на каждый ордер один
+фоновый поток держит реестр открытых ордеров и обновляет их все одним пакетным
+запросом get_orders(state=wait) за такт. Ордер, пропавший из списка ожидающих,
+запрашивается один раз, чтобы узнать итоговое состояние (done/cancel).
+
+Частота проверки ордера зависит от его удаленности от вершины стакана:
+лимитный ордер на продажу у лучшего ask проверяется каждые min_interval секунд,
+далекий - реже, вплоть до max_interval.
+
+События передаются в обработчики: on_fill (частичное исполнение), on_done,
+on_cancel, on_timeout. Дождаться итогового состояния можно через wait().
+
+Если подключен приватный WebSocket-поток, его события передаются в
+push_order/push_trade, а опрос REST остается страховкой с интервалом push_interval.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+FINAL_DONE = ('done', 'filled')
+FINAL_CANCEL = ('cancel', 'cancelled', 'reject', 'rejected')
+
+
+def order_filled_amount(order: Optional[dict]) -> float:
+    """Исполненный объем ордера по ответу API (filled_amount/executed_volume/remaining_*)."""
+    if not order:
+        return 0.0
+    try:
+        if order.get('filled_amount') is not None:
+            return float(order['filled_amount'])
+        if order.get('executed_volume') is not None:
+            return float(order['executed_volume'])
+        origin = float(order.get('origin_amount') or order.get('origin_volume') or order.get('amount') or 0)
+        if order.get('remaining_amount') is not None:
+            return origin - float(order['remaining_amount'])
+        if order.get('remaining_volume') is not None:
+            return origin - float(order['remaining_volume'])
+        return origin if order.get('state') in FINAL_DONE else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass
+class TrackedOrder:
+    order_id: str
+    market: Optional[str] = None
+    side: str = "sell"
+    price: Optional[float] = None
+    registered_at: float = 0.0
+    timeout: float = 3600
+    next_check: float = 0.0
+    filled: float = 0.0
+    trade_fills: Dict[str, float] = field(default_factory=dict)  # id сделки -> объем из потока
+    state: str = "wait"
+    checks: int = 0
+    last_data: Optional[dict] = None
+    callbacks: Dict[str, List[Callable]] = field(default_factory=dict)
+    finished: threading.Event = field(default_factory=threading.Event)
+
+
+class OrderTracker:
+    """Реестр открытых ордеров с одним потоком опроса."""
+
+    def __init__(self, fetch_open_orders: Callable[[], Optional[list]],
+                 fetch_order: Callable[[str], Optional[dict]],
+                 get_top_of_book: Optional[Callable[[str], Optional[Tuple[float, float]]]] = None,
+                 min_interval: float = 2, max_interval: float = 30, far_distance: float = 0.05,
+                 default_timeout: float = 3600, push_interval: float = 300, clock=time.time):
+        self.fetch_open_orders = fetch_open_orders
+        self.fetch_order = fetch_order
+        self.get_top_of_book = get_top_of_book
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.far_distance = far_distance
+        self.default_timeout = default_timeout
+        self.push_interval = push_interval
+        self.push_active = False
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.orders: Dict[str, TrackedOrder] = {}
+        self.finished_orders: Dict[str, TrackedOrder] = {}
+        self.default_callbacks: Dict[str, List[Callable]] = {}
+        self.stats = {"ticks": 0, "batch_requests": 0, "single_requests": 0, "pushed": 0}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # --- Регистрация ---
+
+    def on(self, event: str, callback: Callable) -> None:
+        """Обработчик по умолчанию для всех ордеров: fill, done, cancel, timeout."""
+        self.default_callbacks.setdefault(event, []).append(callback)
+
+    def track(self, order_id, market: Optional[str] = None, side: str = "sell", price=None,
+              timeout: Optional[float] = None, **callbacks) -> TrackedOrder:
+        """
+        Добавляет ордер в реестр (повторная регистрация только добавляет обработчики).
+        callbacks: on_fill, on_done, on_cancel, on_timeout - вызываются с (TrackedOrder, данные ордера).
+        """
+        order_id = str(order_id)
+        now = self.clock()
+        with self.lock:
+            tracked = self.orders.get(order_id) or self.finished_orders.get(order_id)
+            if tracked is None:
+                tracked = TrackedOrder(
+                    order_id=order_id,
+                    market=market.lower() if market else None,
+                    side=side,
+                    price=float(price) if price else None,
+                    registered_at=now,
+                    timeout=timeout or self.default_timeout,
+                    next_check=now,
+                )
+                self.orders[order_id] = tracked
+            for name, callback in callbacks.items():
+                if callback is not None and name.startswith("on_"):
+                    tracked.callbacks.setdefault(name[3:], []).append(callback)
+        self.start()
+        return tracked
+
+    def get(self, order_id) -> Optional[TrackedOrder]:
+        """Запись реестра ордера (открытого или недавно завершенного)."""
+        with self.lock:
+            return self.orders.get(str(order_id)) or self.finished_orders.get(str(order_id))
+
+    def latest(self, order_id) -> Optional[dict]:
+        """Последние известные данные ордера (без запроса к бирже)."""
+        with self.lock:
+            tracked = self.orders.get(str(order_id)) or self.finished_orders.get(str(order_id))
+            return dict(tracked.last_data) if tracked and tracked.last_data else None
+
+    def wait(self, order_id, timeout: Optional[float] = None) -> Optional[TrackedOrder]:
+        """Блокирует до итогового состояния ордера. None - ордер не отслеживается или таймаут."""
+        with self.lock:
+            tracked = self.orders.get(str(order_id)) or self.finished_orders.get(str(order_id))
+        if tracked is None:
+            return None
+        return tracked if tracked.finished.wait(timeout) else None
+
+    def open_count(self) -> int:
+        with self.lock:
+            return len(self.orders)
+
+    # --- События приватного потока ---
+
+    def set_push_active(self, active: bool) -> None:
+        """Поток событий подключен: опрос REST только как страховка раз в push_interval."""
+        self.push_active = active
+        if not active:
+            # Поток оборвался - события могли потеряться, проверяем все ордера сразу
+            now = self.clock()
+            with self.lock:
+                for tracked in self.orders.values():
+                    tracked.next_check = min(tracked.next_check, now)
+
+    def push_order(self, order: dict) -> None:
+        """Изменение ордера из потока (id, state, filled/executed объем)."""
+        order_id = str(order.get('id', ''))
+        with self.lock:
+            tracked = self.orders.get(order_id)
+        if tracked is None:
+            return
+        self.stats["pushed"] += 1
+        self._update(tracked, order, order.get('state', 'wait'), self.clock())
+
+    def push_trade(self, trade: dict) -> None:
+        """
+        Сделка из потока: увеличивает исполненный объем ордера до прихода обновления самого ордера.
+        Сделки учитываются по id, поэтому повторная доставка и обновление ордера с тем же
+        объемом не увеличивают исполнение дважды: filled = max(сумма сделок, executed_volume).
+        """
+        order_id = str(trade.get('order_id', ''))
+        try:
+            amount = float(trade.get('amount') or 0)
+        except (TypeError, ValueError):
+            return
+        with self.lock:
+            tracked = self.orders.get(order_id)
+            if tracked is None or amount <= 0:
+                return
+            trade_id = str(trade.get('id') or f"#{len(tracked.trade_fills)}")
+            if trade_id in tracked.trade_fills:
+                return
+            tracked.trade_fills[trade_id] = amount
+            filled = sum(tracked.trade_fills.values())
+            if filled <= tracked.filled:
+                return
+            tracked.filled = filled
+        self.stats["pushed"] += 1
+        self._dispatch("fill", tracked, trade)
+
+    # --- Опрос ---
+
+    def start(self) -> None:
+        with self.lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="order-tracker", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        logging.info("Трекер ордеров запущен")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logging.error(f"Ошибка трекера ордеров: {e}")
+            self._stop.wait(self.min_interval)
+
+    def _interval_for(self, tracked: TrackedOrder) -> float:
+        """Интервал проверки по удаленности цены ордера от вершины стакана."""
+        if self.push_active:
+            return self.push_interval
+        if tracked.price is None or not tracked.market or not self.get_top_of_book:
+            return self.min_interval
+        try:
+            top = self.get_top_of_book(tracked.market)
+        except Exception:
+            top = None
+        if not top:
+            return self.min_interval
+        best_bid, best_ask = top
+        if tracked.side == "sell":
+            reference = best_ask or best_bid
+            distance = (tracked.price - reference) / reference if reference else 0
+        else:
+            reference = best_bid or best_ask
+            distance = (reference - tracked.price) / reference if reference else 0
+        share = min(max(distance, 0) / self.far_distance, 1) if self.far_distance > 0 else 0
+        return self.min_interval + (self.max_interval - self.min_interval) * share
+
+    def tick(self) -> None:
+        """Один такт: пакетное обновление всех ордеров, срок проверки которых наступил."""
+        now = self.clock()
+        with self.lock:
+            due = [t for t in self.orders.values() if t.next_check <= now]
+        if not due:
+            return
+        self.stats["ticks"] += 1
+
+        open_orders = self.fetch_open_orders()
+        self.stats["batch_requests"] += 1
+        if open_orders is None:
+            # Пакетный запрос не удался - повторим на следующем такте
+            return
+        open_by_id = {str(o.get('id')): o for o in open_orders if isinstance(o, dict)}
+
+        for tracked in due:
+            data = open_by_id.get(tracked.order_id)
+            if data is None:
+                # Ордера нет среди ожидающих - узнаем итоговое состояние
+                data = self.fetch_order(tracked.order_id)
+                self.stats["single_requests"] += 1
+                # Ошибка запроса - состояние неизвестно: ордер остается в реестре до следующего такта
+                state = data.get('state', 'done') if data else tracked.state
+            else:
+                state = data.get('state', 'wait')
+            self._update(tracked, data, state, now)
+
+    def _update(self, tracked: TrackedOrder, data: Optional[dict], state: str, now: float) -> None:
+        reported = order_filled_amount(data) if data else 0.0
+        final = state in FINAL_DONE or state in FINAL_CANCEL or now - tracked.registered_at > tracked.timeout
+        # Интервал может запрашивать стакан по сети - считаем его до захвата блокировки
+        if final:
+            interval = None
+        elif data is None:
+            interval = self.min_interval  # Состояние не получено - повторяем как можно раньше
+        else:
+            interval = self._interval_for(tracked)
+        events = []
+        with self.lock:
+            tracked.checks += 1
+            if data:
+                tracked.last_data = data
+            filled = max(reported, sum(tracked.trade_fills.values()))
+            if filled > tracked.filled:
+                tracked.filled = filled
+                events.append("fill")
+            tracked.state = state
+            if state in FINAL_DONE:
+                events.append("done")
+            elif state in FINAL_CANCEL:
+                events.append("cancel")
+            elif now - tracked.registered_at > tracked.timeout:
+                events.append("timeout")
+            if events and events[-1] in ("done", "cancel", "timeout"):
+                self.orders.pop(tracked.order_id, None)
+                self.finished_orders[tracked.order_id] = tracked
+                # Держим только недавние завершенные ордера
+                if len(self.finished_orders) > 1000:
+                    self.finished_orders.pop(next(iter(self.finished_orders)))
+            else:
+                tracked.next_check = now + interval
+
+        for event in events:
+            self._dispatch(event, tracked, data)
+        if events and events[-1] in ("done", "cancel", "timeout"):
+            tracked.finished.set()
+
+    def _dispatch(self, event: str, tracked: TrackedOrder, data: Optional[dict]) -> None:
+        for callback in self.default_callbacks.get(event, []) + tracked.callbacks.get(event, []):
+            try:
+                callback(tracked, data)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика {event} ордера {tracked.order_id}: {e}")
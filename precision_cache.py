@@ -0,0 +1,138 @@
+"""
+Кэш точности объема ордеров по рынкам SafeTrade.
+
+Биржа иногда отклоняет ордера с ошибкой market.order.non_round_amount, даже если
+объем округлен до amount_precision из /trade/public/markets. Этот модуль запоминает,
+какую точность биржа реально приняла для каждого рынка, и была ли точность из API
+неверной, чтобы следующие ордера сразу форматировались правильно.
+
+Отклонение точности помнится rejection_ttl секунд: разовая ошибка биржи не
+должна навсегда исключать уровень, а последний оставшийся уровень не
+исключается никогда.
+
+Данные хранятся в JSON файле (по умолчанию data/precision_cache.json).
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+
+class PrecisionCache:
+    """Потокобезопасный персистентный кэш принятой биржей точности по рынкам."""
+
+    def __init__(self, path, rejection_ttl: float = 86400, clock=time.time):
+        self.path = Path(path)
+        self.rejection_ttl = rejection_ttl
+        self.clock = clock
+        self.lock = Lock()
+        self.records: Dict[str, dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Загружает кэш с диска. Поврежденный файл игнорируется."""
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    for record in data.values():
+                        # Старый формат - список без времени: такие отклонения уже устарели
+                        if isinstance(record.get("rejected"), list):
+                            record["rejected"] = {str(p): 0 for p in record["rejected"]}
+                    with self.lock:
+                        self.records = data
+                    logging.info(f"Кэш точности загружен: {len(data)} рынков")
+        except Exception as e:
+            logging.warning(f"Не удалось загрузить кэш точности {self.path}: {e}")
+
+    def _save(self) -> None:
+        """Атомарно сохраняет кэш на диск. Вызывается под self.lock."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.records, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить кэш точности {self.path}: {e}")
+
+    def get(self, market: str) -> Optional[dict]:
+        """Возвращает запись для рынка или None."""
+        with self.lock:
+            record = self.records.get(market.lower())
+            return dict(record) if record else None
+
+    def get_precision(self, market: str) -> Optional[int]:
+        """Возвращает точность, которую биржа уже принимала для рынка."""
+        record = self.get(market)
+        if record and record.get("accepted_precision") is not None:
+            return int(record["accepted_precision"])
+        return None
+
+    def record_success(self, market: str, precision: int, advertised_precision: Optional[int] = None) -> None:
+        """Запоминает точность, с которой биржа приняла ордер."""
+        market = market.lower()
+        with self.lock:
+            record = self.records.setdefault(market, {"rejected": {}})
+            changed = record.get("accepted_precision") != precision
+            record["accepted_precision"] = int(precision)
+            if advertised_precision is not None:
+                record["advertised_precision"] = int(advertised_precision)
+                record["advertised_wrong"] = int(advertised_precision) != int(precision)
+            record.get("rejected", {}).pop(str(int(precision)), None)
+            record["updated_at"] = self.clock()
+            self._save()
+        if changed:
+            logging.info(f"Кэш точности: для {market} биржа принимает {precision} знаков"
+                         + (f" (в API указано {advertised_precision})" if advertised_precision is not None else ""))
+
+    def record_rejection(self, market: str, precision: int, advertised_precision: Optional[int] = None) -> None:
+        """Запоминает точность, которую биржа отклонила с ошибкой non_round_amount."""
+        market = market.lower()
+        with self.lock:
+            record = self.records.setdefault(market, {"rejected": {}})
+            record.setdefault("rejected", {})[str(int(precision))] = self.clock()
+            if record.get("accepted_precision") == precision:
+                record.pop("accepted_precision", None)
+            if advertised_precision is not None:
+                record["advertised_precision"] = int(advertised_precision)
+                if int(advertised_precision) == int(precision):
+                    record["advertised_wrong"] = True
+            record["updated_at"] = self.clock()
+            self._save()
+
+    def candidate_precisions(self, market: str, advertised_precision: Optional[int], fallback_levels: List[int]) -> List[int]:
+        """
+        Возвращает порядок перебора точности для рынка:
+        сначала принятая ранее, затем указанная в API (если она не признана неверной),
+        затем остальные уровни, кроме отклоненных биржей за последние rejection_ttl секунд.
+        Если отклонены все, остается уровень с самым давним отклонением.
+        """
+        record = self.get(market) or {}
+        now = self.clock()
+        rejected = {int(p): at for p, at in record.get("rejected", {}).items() if now - at < self.rejection_ttl}
+        candidates = []
+
+        accepted = record.get("accepted_precision")
+        if accepted is not None:
+            candidates.append(int(accepted))
+
+        if advertised_precision is not None and not record.get("advertised_wrong"):
+            candidates.append(int(advertised_precision))
+
+        for precision in fallback_levels:
+            candidates.append(int(precision))
+
+        ordered = []
+        for precision in candidates:
+            if precision in ordered or precision in rejected:
+                continue
+            ordered.append(precision)
+        if not ordered and candidates:
+            ordered.append(min(candidates, key=lambda p: rejected.get(p, 0)))
+        return ordered
@@ -0,0 +1,108 @@
+"""
+Свертка safetrade_price_history в OHLCV-свечи и очистка старых записей.
+
+Каждый промах кэша тикера добавляет строку в историю цен, и таблица вместе с
+индексом (symbol, timestamp) растет без ограничений. Задача свертки:
+
+- строит свечи 1m, 1h и 1d по каждой паре (open/high/low/close по цене,
+  volume - скользящий 24ч объем тикера на закрытии свечи, как в сырых строках);
+- пересчитывает только свечи, начиная с последней суточной: она еще
+  незавершена, а все более ранние уже свернуты;
+- удаляет сырые строки старше raw_retention_days (граница выравнивается на
+  начало суток, поэтому свечи в окне хранения всегда строятся по полным данным)
+  и старые минутные/часовые свечи.
+
+Запускается командой `python main.py rollup` и по расписанию.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+INTERVALS = ('1m', '1h', '1d')
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+
+
+def bucket_start(ts: datetime, interval: str) -> datetime:
+    ts = ts.replace(second=0, microsecond=0)
+    if interval in ('1h', '1d'):
+        ts = ts.replace(minute=0)
+    if interval == '1d':
+        ts = ts.replace(hour=0)
+    return ts
+
+
+def build_candles(rows: Iterable[dict], interval: str) -> List[dict]:
+    """Свечи interval из сырых строк ({'symbol', 'timestamp', 'price', 'volume'})."""
+    samples = []
+    for row in rows:
+        ts = parse_timestamp(row.get('timestamp'))
+        if ts is None or row.get('price') is None:
+            continue
+        if ts.tzinfo is not None:
+            # Свечи выравниваются по UTC
+            ts = ts.astimezone(timezone.utc)
+        samples.append((row['symbol'], ts, float(row['price']), row.get('volume')))
+    samples.sort(key=lambda sample: (sample[0], sample[1]))
+
+    candles: Dict[tuple, dict] = {}
+    for symbol, ts, price, volume in samples:
+        key = (symbol, bucket_start(ts, interval))
+        candle = candles.get(key)
+        if candle is None:
+            candle = candles[key] = {
+                'symbol': symbol, 'resolution': interval, 'bucket_start': key[1].isoformat(),
+                'open': price, 'high': price, 'low': price, 'close': price, 'volume': None, 'samples': 0
+            }
+        candle['high'] = max(candle['high'], price)
+        candle['low'] = min(candle['low'], price)
+        candle['close'] = price
+        if volume is not None:
+            candle['volume'] = float(volume)
+        candle['samples'] += 1
+    return list(candles.values())
+
+
+def rollup_local(store, raw_retention_days: int = 3, candle_retention_days: Optional[Dict[str, int]] = None,
+                 synced_only: bool = False, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Свертка и очистка в локальном хранилище (LocalStore).
+    synced_only - удалять только сырые строки, уже отправленные в Supabase.
+    candle_retention_days: {'1m': дней, ...}, 0 - хранить всегда.
+    """
+    now = now or datetime.now(timezone.utc)
+    candle_retention_days = candle_retention_days or {}
+    latest_day = store.latest_candle_start('1d')
+    rows = store.raw_prices_since(latest_day)
+
+    stats = {'rows': len(rows), 'candles': 0, 'pruned_rows': 0, 'pruned_candles': 0}
+    for interval in INTERVALS:
+        candles = build_candles(rows, interval)
+        store.upsert_candles(candles)
+        stats['candles'] += len(candles)
+
+    # Удаляем только свернутое: строки до начала последней суточной свечи
+    rolled_up_before = store.latest_candle_start('1d')
+    cutoff = bucket_start(now - timedelta(days=raw_retention_days), '1d').isoformat()
+    if rolled_up_before:
+        max_id = store.cursor('safetrade_price_history') if synced_only else None
+        stats['pruned_rows'] = store.prune_price_history(min(cutoff, rolled_up_before), max_id)
+
+    for interval, days in candle_retention_days.items():
+        if days:
+            before = bucket_start(now - timedelta(days=days), '1d').isoformat()
+            stats['pruned_candles'] += store.prune_candles(interval, before)
+
+    logging.info(
+        f"Свертка истории цен: {stats['rows']} строк -> {stats['candles']} свечей, "
+        f"удалено {stats['pruned_rows']} строк и {stats['pruned_candles']} свечей"
+    )
+    return stats
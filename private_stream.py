@@ -0,0 +1,168 @@
+"""
+Приватный WebSocket-поток SafeTrade: ордера, сделки и балансы аккаунта.
+
+Подключение к <base>/websocket/private с теми же заголовками подписи
+(X-Auth-Apikey/Nonce/Signature), что и REST-запросы, и подписка на каналы
+order, trade и balance - как в example-client-master. События сразу
+передаются в обработчики, поэтому исполнение ордера видно без опроса REST.
+
+Поток работает в отдельном daemon-потоке со своим asyncio-циклом (aiohttp),
+при обрыве переподключается с экспоненциальной задержкой. Пока соединение
+живо, connected установлен - по нему трекер ордеров снижает частоту опроса.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+PRIVATE_STREAMS = ("order", "trade", "balance")
+
+
+def private_stream_url(base_url: str) -> str:
+    return base_url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/websocket/private"
+
+
+def _items(payload) -> list:
+    if isinstance(payload, list):
+        return [item for item in payload if isinstance(item, dict)]
+    return [payload] if isinstance(payload, dict) else []
+
+
+class PrivateStream:
+    """Подписка на приватные события аккаунта с переподключением."""
+
+    def __init__(self, url: str, headers_factory: Callable[[], dict],
+                 on_order: Optional[Callable[[dict], None]] = None,
+                 on_trade: Optional[Callable[[dict], None]] = None,
+                 on_balance: Optional[Callable[[dict], None]] = None,
+                 on_state: Optional[Callable[[bool], None]] = None,
+                 streams: Iterable[str] = PRIVATE_STREAMS,
+                 heartbeat: float = 30, max_backoff: float = 60):
+        self.url = url
+        self.headers_factory = headers_factory
+        self.on_order = on_order
+        self.on_trade = on_trade
+        self.on_balance = on_balance
+        self.on_state = on_state
+        self.streams = list(streams)
+        self.heartbeat = heartbeat
+        self.max_backoff = max_backoff
+        self.connected = threading.Event()
+        self.last_message_at: Optional[float] = None
+        self.stats = {"messages": 0, "orders": 0, "trades": 0, "balances": 0, "reconnects": 0}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Разбор сообщений ---
+
+    def handle_message(self, message) -> None:
+        """
+        Разбирает сообщение потока: {"order": {...}}, {"trade": {...}},
+        {"balance": {...} | [...]}; служебные ответы (success/error) только логируются.
+        """
+        if isinstance(message, (str, bytes)):
+            try:
+                message = json.loads(message)
+            except ValueError:
+                logging.debug(f"Не JSON сообщение приватного потока: {message!r}")
+                return
+        if not isinstance(message, dict):
+            return
+
+        self.stats["messages"] += 1
+        self.last_message_at = time.time()
+        for key, payload in message.items():
+            if key == "order" and self.on_order:
+                for order in _items(payload):
+                    self.stats["orders"] += 1
+                    self._call(self.on_order, order)
+            elif key == "trade" and self.on_trade:
+                for trade in _items(payload):
+                    self.stats["trades"] += 1
+                    self._call(self.on_trade, trade)
+            elif key == "balance" and self.on_balance:
+                for balance in self._balance_items(payload):
+                    self.stats["balances"] += 1
+                    self._call(self.on_balance, balance)
+            elif key == "error":
+                logging.warning(f"Приватный поток: ошибка {payload}")
+            elif key == "success":
+                logging.info(f"Приватный поток: {payload}")
+
+    @staticmethod
+    def _balance_items(payload) -> list:
+        """Баланс приходит списком {currency, balance, locked} или словарем currency -> [balance, locked]."""
+        if isinstance(payload, dict) and 'currency' not in payload:
+            items = []
+            for currency, value in payload.items():
+                if isinstance(value, (list, tuple)) and len(value) >= 2:
+                    items.append({'currency': currency, 'balance': value[0], 'locked': value[1]})
+                elif isinstance(value, dict):
+                    items.append(dict(value, currency=currency))
+            return items
+        return _items(payload)
+
+    @staticmethod
+    def _call(callback, item) -> None:
+        try:
+            callback(item)
+        except Exception as e:
+            logging.error(f"Ошибка обработчика приватного потока: {e}")
+
+    def _set_connected(self, value: bool) -> None:
+        if value == self.connected.is_set():
+            return
+        if value:
+            self.connected.set()
+        else:
+            self.connected.clear()
+        if self.on_state:
+            self._call(self.on_state, value)
+
+    # --- Соединение ---
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                            name="private-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def _run(self) -> None:
+        import aiohttp
+
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                async with aiohttp.ClientSession() as session:
+                    # Подпись с новым nonce на каждое подключение
+                    async with session.ws_connect(self.url, headers=self.headers_factory(),
+                                                  heartbeat=self.heartbeat) as ws:
+                        await ws.send_json({"event": "subscribe", "streams": self.streams})
+                        logging.info(f"Приватный поток подключен: {', '.join(self.streams)}")
+                        self._set_connected(True)
+                        backoff = 1
+                        async for msg in ws:
+                            if self._stop.is_set():
+                                break
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self.handle_message(msg.data)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except Exception as e:
+                logging.warning(f"Приватный поток недоступен: {e}")
+            self._set_connected(False)
+            if self._stop.is_set():
+                break
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
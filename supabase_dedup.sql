@@ -0,0 +1,89 @@
+-- One-off deduplication: natural-key unique indexes for every safetrade_* table.
+--
+-- 1. Run this file once in the Supabase SQL editor (it only defines functions).
+-- 2. Run `python main.py cleanup`. It calls safetrade_dedup_all() over RPC, which
+--    deletes existing duplicates server-side (keeping the earliest row per key) and
+--    creates the unique indexes. From then on the bot writes with upsert on these
+--    keys, so duplicates cannot reappear and health checks only read the catalog.
+--
+-- Keys (also DatabaseManager.UNIQUE_KEYS in main.py):
+--   safetrade_trading_pairs        (symbol)
+--   safetrade_price_history        (symbol, timestamp)
+--   safetrade_order_history        (order_id, timestamp)
+--   safetrade_ai_decisions         (decision_type, timestamp)
+--   safetrade_performance_metrics  (metric_type, metric_name, timestamp)
+-- Partitioned tables need the partition key (timestamp) in every unique index.
+-- order_history.timestamp is the exchange's order creation time, the same for every
+-- write of an order, so (order_id, timestamp) is effectively unique per order_id.
+-- Older rows were stamped with the local insert time, so that table is deduplicated
+-- on order_id alone before the index is created.
+
+-- Older 3-argument version; with the defaulted 4th argument a call would be ambiguous
+DROP FUNCTION IF EXISTS safetrade_dedup(TEXT, TEXT[], TEXT);
+
+-- Deletes duplicates of dedup_columns (default: key_columns) in one statement and
+-- creates the unique index on key_columns.
+-- (tableoid, ctid) identifies a row across partitions. Returns the number of rows removed.
+CREATE OR REPLACE FUNCTION safetrade_dedup(target TEXT, key_columns TEXT[], index_name TEXT,
+                                           dedup_columns TEXT[] DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+    keys TEXT := array_to_string(ARRAY(SELECT quote_ident(k) FROM unnest(key_columns) AS k), ', ');
+    dedup_keys TEXT := array_to_string(
+        ARRAY(SELECT quote_ident(k) FROM unnest(COALESCE(dedup_columns, key_columns)) AS k), ', ');
+    removed BIGINT;
+BEGIN
+    EXECUTE format(
+        'DELETE FROM %I WHERE (tableoid, ctid) IN ('
+        '  SELECT tableoid, ctid FROM ('
+        '    SELECT tableoid, ctid, row_number() OVER (PARTITION BY %s ORDER BY created_at, ctid) AS rn FROM %I'
+        '  ) ranked WHERE rn > 1)',
+        target, dedup_keys, target);
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I (%s)', index_name, target, keys);
+    RETURN removed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION safetrade_dedup_all()
+RETURNS TABLE(table_name TEXT, removed BIGINT) AS $$
+BEGIN
+    RETURN QUERY SELECT 'safetrade_trading_pairs'::TEXT,
+        safetrade_dedup('safetrade_trading_pairs', ARRAY['symbol'], 'uq_safetrade_trading_pairs_symbol');
+    -- The plain symbol index is redundant next to the unique one
+    DROP INDEX IF EXISTS idx_safetrade_trading_pairs_symbol;
+
+    RETURN QUERY SELECT 'safetrade_price_history'::TEXT,
+        safetrade_dedup('safetrade_price_history', ARRAY['symbol', 'timestamp'],
+                        'uq_safetrade_price_history_symbol_timestamp');
+    DROP INDEX IF EXISTS idx_safetrade_price_history_symbol_timestamp;
+
+    RETURN QUERY SELECT 'safetrade_order_history'::TEXT,
+        safetrade_dedup('safetrade_order_history', ARRAY['order_id', 'timestamp'],
+                        'uq_safetrade_order_history_order_id_timestamp', ARRAY['order_id']);
+
+    RETURN QUERY SELECT 'safetrade_ai_decisions'::TEXT,
+        safetrade_dedup('safetrade_ai_decisions', ARRAY['decision_type', 'timestamp'],
+                        'uq_safetrade_ai_decisions_type_timestamp');
+    DROP INDEX IF EXISTS idx_safetrade_ai_decisions_decision_type_timestamp;
+
+    RETURN QUERY SELECT 'safetrade_performance_metrics'::TEXT,
+        safetrade_dedup('safetrade_performance_metrics', ARRAY['metric_type', 'metric_name', 'timestamp'],
+                        'uq_safetrade_performance_metrics_key');
+
+    NOTIFY pgrst, 'reload schema';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Which safetrade_* tables already have a unique index besides the primary key.
+-- Catalog-only: used by `python main.py health` instead of scanning the tables.
+CREATE OR REPLACE FUNCTION safetrade_unique_keys()
+RETURNS TABLE(table_name TEXT, index_name TEXT, definition TEXT) AS $$
+    SELECT t.relname::TEXT, i.relname::TEXT, pg_get_indexdef(i.oid)
+    FROM pg_index x
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = 'public' AND x.indisunique AND NOT x.indisprimary
+      AND NOT t.relispartition AND t.relname LIKE 'safetrade\_%';
+$$ LANGUAGE sql STABLE;
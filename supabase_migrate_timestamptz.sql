@@ -0,0 +1,291 @@
+-- Migration: TEXT timestamps -> TIMESTAMPTZ, monthly partitions for
+-- safetrade_price_history and safetrade_order_history with BRIN indexes on time.
+--
+-- 1. Run this file once in the Supabase SQL editor (it only defines functions).
+-- 2. Run `python main.py migrate`. It calls the functions below over RPC:
+--    safetrade_migrate_prepare   - renames the TEXT tables to *_legacy, creates the
+--                                  partitioned tables and converts the small tables;
+--    safetrade_migrate_chunk     - moves one chunk of legacy price history per call
+--                                  (separate transactions, resumable after a failure);
+--    safetrade_migrate_finish    - drops the emptied legacy tables.
+-- The bot may keep running: after prepare it writes into the new tables.
+--
+-- Legacy values were written with datetime.now().isoformat() in the bot host's
+-- local time zone. Pass that zone as database.migration.source_timezone.
+-- Requires PostgreSQL 14+ (date_trunc with a time zone, row triggers on partitioned tables).
+
+-- Legacy TEXT timestamp -> TIMESTAMPTZ: values with an offset keep it, naive ones are read in source_tz
+CREATE OR REPLACE FUNCTION safetrade_parse_ts(value TEXT, source_tz TEXT DEFAULT 'UTC')
+RETURNS TIMESTAMPTZ AS $$
+    SELECT CASE
+        WHEN value IS NULL OR value = '' THEN NULL
+        WHEN value ~ '(Z|[+-]\d\d(:?\d\d)?)$' AND value ~ 'T|\s' THEN value::TIMESTAMPTZ
+        ELSE value::TIMESTAMP AT TIME ZONE source_tz
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Monthly partitions <parent>_yYYYYmMM from from_ts up to months_ahead months after now,
+-- plus a DEFAULT partition so inserts never fail. Also called by the scheduled rollup job.
+CREATE OR REPLACE FUNCTION safetrade_ensure_partitions(parent TEXT, from_ts TIMESTAMPTZ DEFAULT NOW(),
+                                                       months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start TIMESTAMPTZ := date_trunc('month', COALESCE(from_ts, NOW()), 'UTC');
+    last_month TIMESTAMPTZ := date_trunc('month', NOW(), 'UTC') + make_interval(months => months_ahead);
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+    WHILE month_start <= last_month LOOP
+        partition_name := parent || '_' || to_char(month_start AT TIME ZONE 'UTC', '"y"YYYY"m"MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent, month_start, month_start + INTERVAL '1 month');
+            created := created + 1;
+        END IF;
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Candle table from the rollup job, created typed if the rollup was never set up
+CREATE TABLE IF NOT EXISTS safetrade_price_candles (
+    symbol TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    open NUMERIC NOT NULL,
+    high NUMERIC NOT NULL,
+    low NUMERIC NOT NULL,
+    close NUMERIC NOT NULL,
+    volume NUMERIC,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, resolution, bucket_start)
+);
+
+-- Row estimates and sizes summed over partitions (`python main.py health`)
+CREATE OR REPLACE FUNCTION safetrade_table_stats()
+RETURNS TABLE(table_name TEXT, estimated_rows BIGINT, total_bytes BIGINT) AS $$
+    SELECT c.relname::TEXT, SUM(GREATEST(p.reltuples, 0))::BIGINT, SUM(pg_total_relation_size(p.oid))::BIGINT
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN LATERAL pg_partition_tree(c.oid) tree ON TRUE
+    JOIN pg_class p ON p.oid = tree.relid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+      AND c.relname LIKE 'safetrade\_%'
+    GROUP BY c.relname;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION safetrade_migrate_prepare(source_tz TEXT DEFAULT 'UTC')
+RETURNS TEXT AS $$
+DECLARE
+    oldest TIMESTAMPTZ;
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'safetrade_price_history' AND column_name = 'timestamp')
+       = 'timestamp with time zone' THEN
+        RETURN 'already migrated';
+    END IF;
+
+    -- Price history: the TEXT table becomes *_legacy and is moved in chunks by safetrade_migrate_chunk
+    ALTER TABLE safetrade_price_history RENAME TO safetrade_price_history_legacy;
+    ALTER INDEX IF EXISTS safetrade_price_history_pkey RENAME TO safetrade_price_history_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_safetrade_price_history_symbol_timestamp
+        RENAME TO idx_safetrade_price_history_legacy_symbol_timestamp;
+
+    CREATE TABLE safetrade_price_history (
+        id UUID DEFAULT uuid_generate_v4(),
+        timestamp TIMESTAMPTZ NOT NULL,
+        symbol TEXT NOT NULL,
+        price NUMERIC NOT NULL,
+        volume NUMERIC,
+        high NUMERIC,
+        low NUMERIC,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE INDEX idx_safetrade_price_history_symbol_timestamp ON safetrade_price_history (symbol, timestamp);
+    CREATE INDEX idx_safetrade_price_history_timestamp_brin ON safetrade_price_history USING BRIN (timestamp);
+
+    SELECT safetrade_parse_ts(MIN(timestamp), source_tz) INTO oldest FROM safetrade_price_history_legacy;
+    PERFORM safetrade_ensure_partitions('safetrade_price_history', oldest);
+
+    -- Order history is small and receives status updates: it is moved in this transaction
+    ALTER TABLE safetrade_order_history RENAME TO safetrade_order_history_legacy;
+    ALTER INDEX IF EXISTS safetrade_order_history_pkey RENAME TO safetrade_order_history_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_safetrade_order_history_order_id RENAME TO idx_safetrade_order_history_legacy_order_id;
+    ALTER INDEX IF EXISTS idx_safetrade_order_history_symbol_timestamp
+        RENAME TO idx_safetrade_order_history_legacy_symbol_timestamp;
+    DROP TRIGGER IF EXISTS update_safetrade_order_history_updated_at ON safetrade_order_history_legacy;
+
+    CREATE TABLE safetrade_order_history (
+        id UUID DEFAULT uuid_generate_v4(),
+        order_id TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        symbol TEXT NOT NULL,
+        side TEXT NOT NULL,
+        order_type TEXT NOT NULL,
+        amount NUMERIC NOT NULL,
+        price NUMERIC,
+        total NUMERIC,
+        status TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        updated_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE INDEX idx_safetrade_order_history_order_id ON safetrade_order_history (order_id);
+    CREATE INDEX idx_safetrade_order_history_symbol_timestamp ON safetrade_order_history (symbol, timestamp);
+    CREATE INDEX idx_safetrade_order_history_timestamp_brin ON safetrade_order_history USING BRIN (timestamp);
+    CREATE TRIGGER update_safetrade_order_history_updated_at
+        BEFORE UPDATE ON safetrade_order_history
+        FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+    SELECT safetrade_parse_ts(MIN(timestamp), source_tz) INTO oldest FROM safetrade_order_history_legacy;
+    PERFORM safetrade_ensure_partitions('safetrade_order_history', oldest);
+    INSERT INTO safetrade_order_history
+        (order_id, timestamp, symbol, side, order_type, amount, price, total, status, created_at, updated_at)
+    SELECT order_id, safetrade_parse_ts(timestamp, source_tz), symbol, side, order_type, amount, price, total,
+           status, created_at, updated_at
+    FROM safetrade_order_history_legacy;
+    DROP TABLE safetrade_order_history_legacy;
+
+    -- Small tables are converted in place
+    ALTER TABLE safetrade_ai_decisions
+        ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING safetrade_parse_ts(timestamp, source_tz);
+    ALTER TABLE safetrade_performance_metrics
+        ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING safetrade_parse_ts(timestamp, source_tz);
+    ALTER TABLE safetrade_trading_pairs
+        ALTER COLUMN last_updated TYPE TIMESTAMPTZ USING safetrade_parse_ts(last_updated, source_tz);
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'safetrade_price_candles' AND column_name = 'bucket_start')
+       = 'text' THEN
+        ALTER TABLE safetrade_price_candles
+            ALTER COLUMN bucket_start TYPE TIMESTAMPTZ USING safetrade_parse_ts(bucket_start, source_tz);
+    END IF;
+
+    NOTIFY pgrst, 'reload schema';
+    RETURN 'prepared';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moves up to batch_size legacy price rows into the partitioned table. Returns the number
+-- moved; 0 means the legacy table is empty (or already gone).
+CREATE OR REPLACE FUNCTION safetrade_migrate_chunk(batch_size INTEGER DEFAULT 5000, source_tz TEXT DEFAULT 'UTC')
+RETURNS INTEGER AS $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    IF to_regclass('safetrade_price_history_legacy') IS NULL THEN
+        RETURN 0;
+    END IF;
+    WITH batch AS (
+        DELETE FROM safetrade_price_history_legacy
+        WHERE ctid IN (SELECT ctid FROM safetrade_price_history_legacy LIMIT batch_size)
+        RETURNING timestamp, symbol, price, volume, high, low, created_at
+    )
+    INSERT INTO safetrade_price_history (timestamp, symbol, price, volume, high, low, created_at)
+    SELECT safetrade_parse_ts(timestamp, source_tz), symbol, price, volume, high, low, created_at FROM batch;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION safetrade_migrate_finish()
+RETURNS TEXT AS $$
+BEGIN
+    IF to_regclass('safetrade_price_history_legacy') IS NOT NULL THEN
+        IF EXISTS (SELECT 1 FROM safetrade_price_history_legacy) THEN
+            RETURN 'legacy rows remain';
+        END IF;
+        DROP TABLE safetrade_price_history_legacy;
+    END IF;
+    NOTIFY pgrst, 'reload schema';
+    RETURN 'done';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rollup for `python main.py rollup` and the scheduled job. Only buckets from the
+-- latest daily candle onwards are recomputed; raw rows are deleted up to a
+-- day-aligned cutoff, so every candle inside the retention window is built from
+-- complete data. Monthly partitions entirely below the cutoff are dropped instead
+-- of deleted row by row (their rows are counted from the planner estimate).
+-- Retention 0 keeps candles of that resolution forever.
+CREATE OR REPLACE FUNCTION safetrade_rollup_price_history(
+    raw_retention_days INTEGER DEFAULT 3,
+    minute_retention_days INTEGER DEFAULT 14,
+    hour_retention_days INTEGER DEFAULT 365
+)
+RETURNS TABLE(candles BIGINT, pruned_rows BIGINT, pruned_candles BIGINT) AS $$
+DECLARE
+    since TIMESTAMPTZ;
+    cutoff TIMESTAMPTZ;
+    n_candles BIGINT := 0;
+    n_rows BIGINT := 0;
+    n_pruned_candles BIGINT := 0;
+    step BIGINT;
+    unit TEXT;
+    child RECORD;
+    month_start TIMESTAMPTZ;
+BEGIN
+    SELECT MAX(c.bucket_start) INTO since FROM safetrade_price_candles c WHERE c.resolution = '1d';
+
+    FOREACH unit IN ARRAY ARRAY['minute', 'hour', 'day'] LOOP
+        INSERT INTO safetrade_price_candles AS c
+            (symbol, resolution, bucket_start, open, high, low, close, volume, samples)
+        SELECT symbol,
+               CASE unit WHEN 'minute' THEN '1m' WHEN 'hour' THEN '1h' ELSE '1d' END,
+               bucket,
+               (array_agg(price ORDER BY ts))[1], MAX(price), MIN(price),
+               (array_agg(price ORDER BY ts DESC))[1],
+               (array_agg(volume ORDER BY ts DESC) FILTER (WHERE volume IS NOT NULL))[1],
+               COUNT(*)
+        FROM (
+            SELECT symbol, price, volume, timestamp AS ts, date_trunc(unit, timestamp, 'UTC') AS bucket
+            FROM safetrade_price_history
+            WHERE since IS NULL OR timestamp >= since
+        ) raw
+        GROUP BY symbol, bucket
+        ON CONFLICT (symbol, resolution, bucket_start) DO UPDATE SET
+            open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+            close = EXCLUDED.close, volume = EXCLUDED.volume, samples = EXCLUDED.samples;
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_candles := n_candles + step;
+    END LOOP;
+
+    -- Only rows before the latest daily candle are fully rolled up
+    SELECT LEAST(MAX(c.bucket_start), date_trunc('day', NOW() - make_interval(days => raw_retention_days), 'UTC'))
+    INTO cutoff FROM safetrade_price_candles c WHERE c.resolution = '1d';
+    IF cutoff IS NOT NULL THEN
+        FOR child IN
+            SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'safetrade_price_history'::regclass AND c.relname ~ '_y\d{4}m\d{2}$'
+        LOOP
+            month_start := make_timestamptz(substring(child.relname FROM 'y(\d{4})m')::INTEGER,
+                                            substring(child.relname FROM 'm(\d{2})$')::INTEGER, 1, 0, 0, 0, 'UTC');
+            IF month_start + INTERVAL '1 month' <= cutoff THEN
+                EXECUTE format('DROP TABLE %I', child.relname);
+                n_rows := n_rows + child.estimated_rows;
+            END IF;
+        END LOOP;
+        DELETE FROM safetrade_price_history WHERE timestamp < cutoff;
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_rows := n_rows + step;
+    END IF;
+
+    IF minute_retention_days > 0 THEN
+        DELETE FROM safetrade_price_candles WHERE resolution = '1m'
+            AND bucket_start < date_trunc('day', NOW() - make_interval(days => minute_retention_days), 'UTC');
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_pruned_candles := n_pruned_candles + step;
+    END IF;
+    IF hour_retention_days > 0 THEN
+        DELETE FROM safetrade_price_candles WHERE resolution = '1h'
+            AND bucket_start < date_trunc('day', NOW() - make_interval(days => hour_retention_days), 'UTC');
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_pruned_candles := n_pruned_candles + step;
+    END IF;
+
+    RETURN QUERY SELECT n_candles, n_rows, n_pruned_candles;
+END;
+$$ LANGUAGE plpgsql;
@@ -4,23 +4,50 @@
 -- Enable UUID extension for primary keys
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
--- Table for storing historical price data
+-- Monthly partitions <parent>_yYYYYmMM from from_ts up to months_ahead months after now,
+-- plus a DEFAULT partition so inserts never fail. Also called by the scheduled rollup job.
+CREATE OR REPLACE FUNCTION safetrade_ensure_partitions(parent TEXT, from_ts TIMESTAMPTZ DEFAULT NOW(),
+                                                       months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start TIMESTAMPTZ := date_trunc('month', COALESCE(from_ts, NOW()), 'UTC');
+    last_month TIMESTAMPTZ := date_trunc('month', NOW(), 'UTC') + make_interval(months => months_ahead);
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+    WHILE month_start <= last_month LOOP
+        partition_name := parent || '_' || to_char(month_start AT TIME ZONE 'UTC', '"y"YYYY"m"MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent, month_start, month_start + INTERVAL '1 month');
+            created := created + 1;
+        END IF;
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Table for storing historical price data (partitioned by month; the primary key
+-- must include the partition key)
 CREATE TABLE IF NOT EXISTS safetrade_price_history (
-    id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    id UUID DEFAULT uuid_generate_v4(),
+    timestamp TIMESTAMPTZ NOT NULL,
     symbol TEXT NOT NULL,
     price NUMERIC NOT NULL,
     volume NUMERIC,
     high NUMERIC,
     low NUMERIC,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
 
--- Table for storing order history
+-- Table for storing order history (partitioned by month)
 CREATE TABLE IF NOT EXISTS safetrade_order_history (
-    id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+    id UUID DEFAULT uuid_generate_v4(),
     order_id TEXT NOT NULL,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     symbol TEXT NOT NULL,
     side TEXT NOT NULL,
     order_type TEXT NOT NULL,
@@ -29,13 +56,17 @@ CREATE TABLE IF NOT EXISTS safetrade_order_history (
     total NUMERIC,
     status TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+SELECT safetrade_ensure_partitions('safetrade_price_history');
+SELECT safetrade_ensure_partitions('safetrade_order_history');
 
 -- Table for storing AI decisions
 CREATE TABLE IF NOT EXISTS safetrade_ai_decisions (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     decision_type TEXT NOT NULL,
     decision_data TEXT NOT NULL,
     market_data TEXT,
@@ -47,18 +78,18 @@ CREATE TABLE IF NOT EXISTS safetrade_ai_decisions (
 -- Table for storing trading pairs
 CREATE TABLE IF NOT EXISTS safetrade_trading_pairs (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
-    symbol TEXT NOT NULL UNIQUE,
+    symbol TEXT NOT NULL,
     base_currency TEXT NOT NULL,
     quote_currency TEXT NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
-    last_updated TEXT,
+    last_updated TIMESTAMPTZ,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Table for storing performance metrics
 CREATE TABLE IF NOT EXISTS safetrade_performance_metrics (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
-    timestamp TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
     metric_type TEXT NOT NULL,
     metric_name TEXT NOT NULL,
     value NUMERIC NOT NULL,
@@ -66,27 +97,39 @@ CREATE TABLE IF NOT EXISTS safetrade_performance_metrics (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_safetrade_price_history_symbol_timestamp 
+-- Create indexes for better performance.
+-- uq_* are the natural keys the bot upserts on (see supabase_dedup.sql for existing databases)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_price_history_symbol_timestamp
 ON safetrade_price_history(symbol, timestamp);
 
 CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_order_id 
 ON safetrade_order_history(order_id);
 
+-- timestamp is the exchange order creation time, so this is one key per order_id
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_order_history_order_id_timestamp
+ON safetrade_order_history(order_id, timestamp);
+
 CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_symbol_timestamp 
 ON safetrade_order_history(symbol, timestamp);
 
-CREATE INDEX IF NOT EXISTS idx_safetrade_ai_decisions_decision_type_timestamp 
+-- BRIN indexes on time: tiny, and sufficient for append-ordered time range scans
+CREATE INDEX IF NOT EXISTS idx_safetrade_price_history_timestamp_brin
+ON safetrade_price_history USING BRIN (timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_safetrade_order_history_timestamp_brin
+ON safetrade_order_history USING BRIN (timestamp);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_ai_decisions_type_timestamp
 ON safetrade_ai_decisions(decision_type, timestamp);
 
-CREATE INDEX IF NOT EXISTS idx_safetrade_trading_pairs_symbol 
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_trading_pairs_symbol
 ON safetrade_trading_pairs(symbol);
 
 CREATE INDEX IF NOT EXISTS idx_safetrade_trading_pairs_base_currency 
 ON safetrade_trading_pairs(base_currency);
 
-CREATE INDEX IF NOT EXISTS idx_safetrade_performance_metrics_metric_type_timestamp 
-ON safetrade_performance_metrics(metric_type, timestamp);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_safetrade_performance_metrics_key
+ON safetrade_performance_metrics(metric_type, metric_name, timestamp);
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -102,5 +145,120 @@ CREATE TRIGGER update_safetrade_order_history_updated_at
     BEFORE UPDATE ON safetrade_order_history 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Table statistics for `python main.py health` without scanning the tables:
+-- planner row estimate and total size (table + indexes + TOAST) from the catalog,
+-- summed over the partitions of partitioned tables
+CREATE OR REPLACE FUNCTION safetrade_table_stats()
+RETURNS TABLE(table_name TEXT, estimated_rows BIGINT, total_bytes BIGINT) AS $$
+    SELECT c.relname::TEXT, SUM(GREATEST(p.reltuples, 0))::BIGINT, SUM(pg_total_relation_size(p.oid))::BIGINT
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN LATERAL pg_partition_tree(c.oid) tree ON TRUE
+    JOIN pg_class p ON p.oid = tree.relid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+      AND c.relname LIKE 'safetrade\_%'
+    GROUP BY c.relname;
+$$ LANGUAGE sql STABLE;
+
+-- OHLCV candles rolled up from safetrade_price_history (see price_rollup.py)
+CREATE TABLE IF NOT EXISTS safetrade_price_candles (
+    symbol TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    open NUMERIC NOT NULL,
+    high NUMERIC NOT NULL,
+    low NUMERIC NOT NULL,
+    close NUMERIC NOT NULL,
+    volume NUMERIC,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, resolution, bucket_start)
+);
+
+-- Rollup for `python main.py rollup` and the scheduled job. Only buckets from the
+-- latest daily candle onwards are recomputed; raw rows are deleted up to a
+-- day-aligned cutoff, so every candle inside the retention window is built from
+-- complete data. Monthly partitions entirely below the cutoff are dropped instead
+-- of deleted row by row (their rows are counted from the planner estimate).
+-- Retention 0 keeps candles of that resolution forever.
+CREATE OR REPLACE FUNCTION safetrade_rollup_price_history(
+    raw_retention_days INTEGER DEFAULT 3,
+    minute_retention_days INTEGER DEFAULT 14,
+    hour_retention_days INTEGER DEFAULT 365
+)
+RETURNS TABLE(candles BIGINT, pruned_rows BIGINT, pruned_candles BIGINT) AS $$
+DECLARE
+    since TIMESTAMPTZ;
+    cutoff TIMESTAMPTZ;
+    n_candles BIGINT := 0;
+    n_rows BIGINT := 0;
+    n_pruned_candles BIGINT := 0;
+    step BIGINT;
+    unit TEXT;
+    child RECORD;
+    month_start TIMESTAMPTZ;
+BEGIN
+    SELECT MAX(c.bucket_start) INTO since FROM safetrade_price_candles c WHERE c.resolution = '1d';
+
+    FOREACH unit IN ARRAY ARRAY['minute', 'hour', 'day'] LOOP
+        INSERT INTO safetrade_price_candles AS c
+            (symbol, resolution, bucket_start, open, high, low, close, volume, samples)
+        SELECT symbol,
+               CASE unit WHEN 'minute' THEN '1m' WHEN 'hour' THEN '1h' ELSE '1d' END,
+               bucket,
+               (array_agg(price ORDER BY ts))[1], MAX(price), MIN(price),
+               (array_agg(price ORDER BY ts DESC))[1],
+               (array_agg(volume ORDER BY ts DESC) FILTER (WHERE volume IS NOT NULL))[1],
+               COUNT(*)
+        FROM (
+            SELECT symbol, price, volume, timestamp AS ts, date_trunc(unit, timestamp, 'UTC') AS bucket
+            FROM safetrade_price_history
+            WHERE since IS NULL OR timestamp >= since
+        ) raw
+        GROUP BY symbol, bucket
+        ON CONFLICT (symbol, resolution, bucket_start) DO UPDATE SET
+            open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+            close = EXCLUDED.close, volume = EXCLUDED.volume, samples = EXCLUDED.samples;
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_candles := n_candles + step;
+    END LOOP;
+
+    -- Only rows before the latest daily candle are fully rolled up
+    SELECT LEAST(MAX(c.bucket_start), date_trunc('day', NOW() - make_interval(days => raw_retention_days), 'UTC'))
+    INTO cutoff FROM safetrade_price_candles c WHERE c.resolution = '1d';
+    IF cutoff IS NOT NULL THEN
+        FOR child IN
+            SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'safetrade_price_history'::regclass AND c.relname ~ '_y\d{4}m\d{2}$'
+        LOOP
+            month_start := make_timestamptz(substring(child.relname FROM 'y(\d{4})m')::INTEGER,
+                                            substring(child.relname FROM 'm(\d{2})$')::INTEGER, 1, 0, 0, 0, 'UTC');
+            IF month_start + INTERVAL '1 month' <= cutoff THEN
+                EXECUTE format('DROP TABLE %I', child.relname);
+                n_rows := n_rows + child.estimated_rows;
+            END IF;
+        END LOOP;
+        DELETE FROM safetrade_price_history WHERE timestamp < cutoff;
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_rows := n_rows + step;
+    END IF;
+
+    IF minute_retention_days > 0 THEN
+        DELETE FROM safetrade_price_candles WHERE resolution = '1m'
+            AND bucket_start < date_trunc('day', NOW() - make_interval(days => minute_retention_days), 'UTC');
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_pruned_candles := n_pruned_candles + step;
+    END IF;
+    IF hour_retention_days > 0 THEN
+        DELETE FROM safetrade_price_candles WHERE resolution = '1h'
+            AND bucket_start < date_trunc('day', NOW() - make_interval(days => hour_retention_days), 'UTC');
+        GET DIAGNOSTICS step = ROW_COUNT;
+        n_pruned_candles := n_pruned_candles + step;
+    END IF;
+
+    RETURN QUERY SELECT n_candles, n_rows, n_pruned_candles;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Grant necessary permissions (adjust as needed for your Supabase setup)
 -- These are typically handled automatically by Supabase RLS policies
@@ -0,0 +1,56 @@
+"""
+Тесты бэктеста стратегий (backtest.py) на снимках, записанных с симулятора биржи
+"""
+from decimal import Decimal
+
+import pytest
+
+from backtest import STRATEGIES, BookRecorder, load_snapshots, merge_params, run_backtest, run_strategy
+from exchange_simulator import DEFAULT_SIM_CONFIG, SimulatedExchange
+from order_sizing import SizingRules
+
+
+@pytest.fixture
+def books_dir(tmp_path):
+    now = [1_700_000_000.0]
+    exchange = SimulatedExchange(DEFAULT_SIM_CONFIG, seed=3, clock=lambda: now[0])
+    recorder = BookRecorder(tmp_path, interval=0, clock=lambda: now[0])
+    for _ in range(240):  # 2 часа снимков каждые 30 секунд
+        now[0] += 30
+        for market in ("nockusdt", "qtcusdt"):
+            ticker = exchange.ticker(market)
+            recorder.record(market, exchange.order_book(market), ticker["last"])
+    return tmp_path
+
+
+def test_market_sell_pays_the_spread_and_completes_immediately(books_dir):
+    snapshots = load_snapshots(books_dir / "nockusdt.jsonl")
+    assert len(snapshots) == 240
+    result = run_strategy("market", snapshots, 0, Decimal("100"), SizingRules.from_precision(4))
+    assert result.filled == Decimal("100")
+    assert result.time_to_complete == 0
+    assert result.slippage_bps >= 0
+
+
+def test_every_strategy_reports_metrics(books_dir):
+    results = run_backtest(books_dir, STRATEGIES, amount_usd=20, starts=3, workers=2,
+                           params={"horizon_seconds": 3600})
+    assert {(r["market"], r["strategy"]) for r in results} == {
+        (market, strategy) for market in ("nockusdt", "qtcusdt") for strategy in STRATEGIES
+    }
+    for r in results:
+        assert r["runs"] == 3
+        assert 0 <= r["fill_ratio_mean"] <= 1
+    market_run = next(r for r in results if r["market"] == "qtcusdt" and r["strategy"] == "market")
+    assert market_run["completed_share"] == 1
+
+
+def test_nested_params_override_single_keys(books_dir):
+    params = merge_params({"twap": {"chunks": 3}, "horizon_seconds": 600})
+    assert params["twap"] == {"duration_minutes": 60, "chunks": 3, "price_ratio": 1.001}
+    assert params["horizon_seconds"] == 600 and params["limit"] == {"price_ratio": 0.999}
+
+    snapshots = load_snapshots(books_dir / "nockusdt.jsonl")
+    result = run_strategy("twap", snapshots, 0, Decimal("100"), SizingRules.from_precision(4),
+                          {"twap": {"chunks": 3}})
+    assert result.filled > 0
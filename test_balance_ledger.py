@@ -0,0 +1,38 @@
+"""
+Тесты учета доступных/заблокированных средств (balance_ledger.py)
+"""
+import time
+from decimal import Decimal
+
+from balance_ledger import BalanceLedger
+from order_sizing import SizingRules
+
+RULES = SizingRules.from_precision(4, min_amount="0.01")
+
+
+def make_ledger(balance="177.83966849", locked="0"):
+    ledger = BalanceLedger()
+    ledger.update_from_balances([{"currency": "nock", "balance": balance, "locked": locked}], taken_at=time.time() - 1)
+    return ledger
+
+
+def test_sellable_is_exact_available_floored_to_step():
+    ledger = make_ledger()
+    assert ledger.sellable("NOCK", RULES) == Decimal("177.8396")
+    assert ledger.sellable("NOCK", RULES, requested=10) == Decimal("10.0000")
+    assert ledger.sellable("BTC", RULES) == 0
+
+
+def test_reservations_reduce_available_until_next_snapshot():
+    ledger = make_ledger("100")
+    ledger.reserve("NOCK", "60", order_id=1)
+    assert ledger.get_available("NOCK") == Decimal("40")
+    assert ledger.get_locked("NOCK") == Decimal("60")
+
+    # Отмена с частичным исполнением: исполненная часть остается списанной
+    ledger.release(1, filled_amount="15")
+    assert ledger.get_available("NOCK") == Decimal("85")
+
+    # Новый снимок уже учитывает ордер - резерв снимается
+    ledger.update_from_balances([{"currency": "NOCK", "balance": "85", "locked": "0"}])
+    assert ledger.get_available("NOCK") == Decimal("85")
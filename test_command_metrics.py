@@ -0,0 +1,44 @@
+"""Тесты замеров времени выполнения команд Telegram"""
+
+import pytest
+
+from command_metrics import CommandMetrics
+
+
+def test_wrapped_handlers_record_latency_and_errors():
+    ticks = iter([0.0, 1.5, 10.0, 10.5, 20.0, 22.0])
+    stored = []
+    metrics = CommandMetrics(sink=lambda command, seconds, ok: stored.append((command, seconds, ok)),
+                             clock=lambda: next(ticks))
+
+    def show_balance(message):
+        """Баланс"""
+        return f"ok {message}"
+
+    def broken(message):
+        raise RuntimeError("exchange down")
+
+    timed = metrics.wrap('balance', show_balance)
+    assert timed.__name__ == 'show_balance' and timed('m') == 'ok m'
+    assert timed('m') == 'ok m'
+    with pytest.raises(RuntimeError):
+        metrics.wrap('history', broken)('m')
+
+    assert stored == [('balance', 1.5, True), ('balance', 0.5, True), ('history', 2.0, False)]
+    stats = metrics.snapshot()
+    assert stats['balance']['count'] == 2 and stats['balance']['max'] == 1.5
+    assert stats['balance']['avg'] == 1.0
+    assert stats['history']['errors'] == 1
+    assert metrics.summary().splitlines()[0].startswith("/history:")
+
+
+def test_sink_failures_do_not_break_handlers():
+    def failing_sink(command, seconds, ok):
+        raise ConnectionError("db down")
+
+    metrics = CommandMetrics(window=2, sink=failing_sink)
+    handler = metrics.wrap('markets', lambda message: 'done')
+    for _ in range(3):
+        assert handler(None) == 'done'
+    assert metrics.snapshot()['markets']['count'] == 3
+    assert len(metrics.latencies['markets']) == 2
@@ -0,0 +1,47 @@
+"""Тесты пошаговой миграции Supabase на timestamptz"""
+
+from db_migrate import run_timestamptz_migration
+
+
+def make_rpc(legacy_rows, fail_on_chunk=None):
+    state = {'legacy': legacy_rows, 'chunks': 0, 'prepared': False}
+    calls = []
+
+    def rpc(name, params):
+        calls.append(name)
+        if name == 'safetrade_migrate_prepare':
+            if state['prepared']:
+                return 'already migrated'
+            state['prepared'] = True
+            return 'prepared'
+        if name == 'safetrade_migrate_chunk':
+            state['chunks'] += 1
+            if state['chunks'] == fail_on_chunk:
+                raise ConnectionError("statement timeout")
+            moved = min(params['batch_size'], state['legacy'])
+            state['legacy'] -= moved
+            return moved
+        if name == 'safetrade_migrate_finish':
+            return 'done' if state['legacy'] == 0 else 'legacy rows remain'
+    return rpc, state, calls
+
+
+def test_migration_moves_in_chunks_and_resumes_after_failure():
+    rpc, state, calls = make_rpc(legacy_rows=12, fail_on_chunk=2)
+    try:
+        run_timestamptz_migration(rpc, source_tz='Europe/Moscow', batch_size=5)
+    except ConnectionError:
+        pass
+    assert state['legacy'] == 7 and 'safetrade_migrate_finish' not in calls
+
+    # Повторный запуск продолжает перенос с оставшихся строк
+    report = run_timestamptz_migration(rpc, batch_size=5)
+    assert report['prepare'] == 'already migrated'
+    assert report['moved'] == 7 and report['finish'] == 'done'
+
+
+def test_chunk_limit_leaves_finish_for_next_run():
+    rpc, state, calls = make_rpc(legacy_rows=100)
+    report = run_timestamptz_migration(rpc, batch_size=10, max_chunks=3)
+    assert report['moved'] == 30 and report['finish'] is None
+    assert 'safetrade_migrate_finish' not in calls and state['legacy'] == 70
@@ -0,0 +1,52 @@
+"""Тесты менеджера БД: очередь записи при остановке и ее замена локальным хранилищем"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from db_write_queue import DBWriteQueue
+from local_store import LocalStore
+
+main = pytest.importorskip("main")
+
+
+def test_close_connection_flushes_queue_and_closes_store(tmp_path):
+    store = LocalStore(tmp_path / "safetrade.db")
+    manager = main.DatabaseManager(None, local_store=store)
+
+    release = threading.Event()
+    spill = tmp_path / "queue.jsonl"
+    # База зависла: запись статуса не успевает за время остановки
+    manager.write_queue = DBWriteQueue(lambda table, rows: None, lambda order_id, status: release.wait(5),
+                                       spill_path=spill, start=False)
+    manager.write_queue.set_status('42', 'cancelled')
+    closed = []
+    manager.syncer = type("Syncer", (), {"close": lambda self: closed.append("syncer")})()
+
+    manager.close_connection()
+    release.set()
+
+    assert '"cancelled"' in spill.read_text()
+    assert closed == ["syncer"]
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.count('safetrade_order_history')
+
+
+def test_local_store_replaces_the_write_queue_and_imports_its_file(tmp_path):
+    spill = tmp_path / "queue.jsonl"
+    leftover = DBWriteQueue(lambda table, rows: None, lambda order_id, status: None, spill_path=spill, start=False)
+    leftover.insert('safetrade_order_history', {
+        'order_id': '42', 'timestamp': '2026-01-01T00:00:00+00:00', 'symbol': 'NOCKUSDT', 'side': 'sell',
+        'order_type': 'limit', 'amount': 1, 'status': 'wait'
+    })
+    leftover.spill()
+
+    store = LocalStore(tmp_path / "safetrade.db")
+    manager = main.DatabaseManager(None, local_store=store)
+    manager.start_write_queue(spill)
+
+    assert manager.write_queue is None
+    assert not spill.exists()
+    assert store.count('safetrade_order_history') == 1
+    manager.close_connection()
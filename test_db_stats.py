@@ -0,0 +1,25 @@
+"""Тест статистики БД при работе с локальным хранилищем"""
+
+import pytest
+
+from local_store import LocalStore
+
+main = pytest.importorskip("main")
+
+
+def test_stats_come_from_the_local_store(tmp_path):
+    store = LocalStore(tmp_path / "safetrade.db")
+    manager = main.DatabaseManager(None, local_store=store)
+    store.insert_rows('safetrade_order_history', [
+        {'order_id': str(i), 'timestamp': f'2026-01-0{i}T00:00:00+00:00', 'symbol': 'NOCKUSDT', 'side': 'sell',
+         'order_type': 'limit', 'amount': 1, 'status': 'wait', 'created_at': f'2026-01-0{i}T00:00:01+00:00'}
+        for i in (1, 2)
+    ])
+
+    stats = manager.get_database_stats()
+
+    assert stats['order_history'] == 2 and stats['price_history'] == 0
+    assert stats['tables']['safetrade_order_history']['last_insert'] == '2026-01-02T00:00:01+00:00'
+    assert stats['tables']['safetrade_trading_pairs']['last_insert'] is None
+    assert manager.get_trading_pairs_count() == 0
+    manager.close_connection()
@@ -0,0 +1,39 @@
+"""Тест upsert по естественному ключу: пропущенные сервером строки попадают в лог"""
+
+import logging
+
+import pytest
+
+main = pytest.importorskip("main")
+
+
+class FakeQuery:
+    def __init__(self, calls, inserted):
+        self.calls = calls
+        self.inserted = inserted
+
+    def select(self, *columns):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.calls.append((rows, on_conflict, ignore_duplicates))
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": self.inserted})()
+
+
+def test_upsert_logs_rows_skipped_as_duplicates(caplog):
+    calls = []
+    rows = [{'order_id': str(i), 'timestamp': '2026-01-01T00:00:00+00:00'} for i in range(3)]
+    supabase = type("Supabase", (), {"table": lambda self, name: FakeQuery(calls, rows[:1])})()
+    manager = main.DatabaseManager(supabase)
+
+    with caplog.at_level(logging.INFO):
+        manager._insert_rows('safetrade_order_history', rows)
+
+    assert calls == [(rows, 'order_id,timestamp', True)]
+    assert "пропущено 2 из 3" in caplog.text
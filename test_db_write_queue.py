@@ -0,0 +1,92 @@
+"""Тесты очереди записи в базу (db_write_queue.py)"""
+
+import threading
+import time
+
+from db_write_queue import DBWriteQueue
+
+
+class FakeDB:
+    def __init__(self):
+        self.inserts = []
+        self.statuses = []
+        self.down = False
+
+    def insert_rows(self, table, rows):
+        if self.down:
+            raise ConnectionError("supabase down")
+        self.inserts.append((table, list(rows)))
+
+    def update_status(self, order_id, status):
+        if self.down:
+            raise ConnectionError("supabase down")
+        self.statuses.append((order_id, status))
+
+
+def test_batches_inserts_and_coalesces_statuses():
+    db = FakeDB()
+    queue = DBWriteQueue(db.insert_rows, db.update_status, batch_size=2, start=False)
+    for i in range(3):
+        queue.insert('safetrade_order_history', {'order_id': str(i)})
+    queue.set_status(1, 'partial')
+    queue.set_status(2, 'cancelled')
+    queue.set_status(1, 'filled')
+
+    assert queue.flush()
+    assert [len(rows) for _, rows in db.inserts] == [2, 1]
+    assert db.statuses == [('2', 'cancelled'), ('1', 'filled')]
+    assert queue.stats["coalesced"] == 1 and queue.pending() == 0
+
+
+def test_failures_requeue_then_spill_and_recover(tmp_path):
+    db = FakeDB()
+    spill = tmp_path / "queue.jsonl"
+    queue = DBWriteQueue(db.insert_rows, db.update_status, spill_path=spill,
+                         spill_after_failures=2, start=False)
+    db.down = True
+    queue.insert('safetrade_order_history', {'order_id': '1'})
+    queue.set_status('1', 'pending')
+
+    assert not queue.flush() and queue.pending() == 2
+    queue.set_status('1', 'filled')
+    assert not queue.flush()
+    # Второй сбой подряд - очередь на диске, в памяти пусто
+    assert queue.pending() == 0 and spill.exists()
+
+    # Новый процесс дочитывает файл; после восстановления базы все записано по порядку
+    db.down = False
+    restored = DBWriteQueue(db.insert_rows, db.update_status, spill_path=spill, start=False)
+    assert not spill.exists() and restored.pending() == 2
+    assert restored.flush()
+    assert db.inserts == [('safetrade_order_history', [{'order_id': '1'}])]
+    assert db.statuses == [('1', 'filled')]
+
+
+def test_close_spills_when_database_is_unreachable(tmp_path):
+    db = FakeDB()
+    db.down = True
+    spill = tmp_path / "queue.jsonl"
+    queue = DBWriteQueue(db.insert_rows, db.update_status, spill_path=spill, flush_interval=60)
+    queue.set_status('9', 'cancelled')
+    queue.close(timeout=1)
+    assert spill.read_text().count('"cancelled"') == 1
+
+
+def test_close_spills_batches_stuck_in_flush(tmp_path):
+    release = threading.Event()
+    written = []
+
+    def hung_insert(table, rows):
+        release.wait(5)
+        written.append(rows)
+
+    spill = tmp_path / "queue.jsonl"
+    queue = DBWriteQueue(hung_insert, lambda order_id, status: None, spill_path=spill, start=False)
+    queue.insert('safetrade_order_history', {'order_id': '1'})
+    queue.set_status('1', 'cancelled')
+    queue.close(timeout=0.2)
+    release.set()
+    time.sleep(0.1)  # Зависшая запись завершилась - файл для следующего запуска остается
+
+    lines = spill.read_text().splitlines()
+    assert len(lines) == 2 and '"order_id": "1"' in lines[0] and '"cancelled"' in lines[1]
@@ -0,0 +1,41 @@
+"""
+Тесты размера частей по глубине стакана (depth_slicing.py)
+"""
+from decimal import Decimal as D
+
+from depth_slicing import BookDepth, next_slice, plan_slices
+from order_sizing import SizingRules
+
+RULES = SizingRules.from_precision(4, min_amount="1")
+BOOK = BookDepth.from_bids([(D("1.00"), D("50")), (D("0.99"), D("50")), (D("0.90"), D("1000"))])
+
+
+def test_impact_and_fill_value():
+    assert BOOK.impact(50) == 0
+    assert BOOK.fill_value(60) == D("50") + D("9.9")
+    assert BOOK.impact(2000) is None
+
+
+def test_max_amount_within_budget_is_tight():
+    limit = BOOK.max_amount_within("0.01")
+    assert abs(BOOK.impact(limit) - D("0.01")) < D("1e-20")
+    assert BOOK.impact(limit + D("0.001")) > D("0.01")
+    assert BOOK.max_amount_within("0.005") == D("100")
+
+
+def test_plan_slices_stay_within_budget_and_sum_to_total():
+    slices = plan_slices(D("350.12345"), BOOK, RULES, "0.005")
+    assert len(slices) == 4
+    assert sum(slices) == D("350.1234")
+    assert all(BOOK.impact(s) <= D("0.005") for s in slices)
+
+    # Мелкий объем продается одной частью
+    assert plan_slices(D("30"), BOOK, RULES, "0.005") == [D("30.0000")]
+    # Лимит числа частей
+    assert len(plan_slices(D("10000"), BOOK, RULES, "0.005", max_slices=3)) == 3
+
+
+def test_next_slice_uses_fresh_plan_and_last_slice_takes_rest():
+    # 100.5 не укладывается в бюджет (100) - две равные части
+    assert next_slice(D("100.5"), BOOK, RULES, "0.005") == D("50.2500")
+    assert next_slice(D("250"), BOOK, RULES, "0.005", slices_left=1) == D("250.0000")
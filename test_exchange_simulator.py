@@ -0,0 +1,75 @@
+"""
+Тесты движка локального симулятора SafeTrade (exchange_simulator.py)
+"""
+from decimal import Decimal
+
+import pytest
+
+from exchange_simulator import DEFAULT_SIM_CONFIG, SimulatedExchange, SimulatorError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_exchange():
+    clock = FakeClock()
+    return SimulatedExchange(DEFAULT_SIM_CONFIG, seed=7, clock=clock), clock
+
+
+def balance(exchange, currency):
+    return next(b for b in exchange.list_balances() if b["currency"] == currency)
+
+
+def test_rejects_like_safetrade():
+    exchange, _ = make_exchange()
+    with pytest.raises(SimulatorError) as err:
+        exchange.create_order("nockusdt", "sell", "177.83966849", "market")
+    assert err.value.code == "market.order.non_round_amount"
+    with pytest.raises(SimulatorError) as err:
+        exchange.create_order("nockusdt", "sell", "177.8397", "market")
+    assert err.value.code == "market.account.insufficient_balance"
+    with pytest.raises(SimulatorError) as err:
+        exchange.create_order("nockusdt", "sell", "0.001", "market")
+    assert err.value.code == "market.order.invalid_volume_or_price"
+
+
+def test_market_sell_walks_book_and_settles_balances():
+    exchange, _ = make_exchange()
+    best_bid = Decimal(exchange.order_book("nockusdt")["bids"][0][0])
+    order = exchange.create_order("nockusdt", "sell", "177.8396", "market")
+    assert order["state"] == "done"
+    assert order["executed_volume"] == "177.8396"
+    assert Decimal(order["avg_price"]) <= best_bid
+    assert balance(exchange, "nock") == {"currency": "nock", "balance": "0.00006849", "locked": "0"}
+    assert Decimal(balance(exchange, "usdt")["balance"]) > 0
+    assert len(exchange.list_trades("nockusdt")) == order["trades_count"]
+    # Съеденная ликвидность видна в стакане
+    assert Decimal(exchange.order_book("nockusdt")["bids"][0][1]) < Decimal("300") / best_bid
+
+
+def test_resting_limit_order_locks_and_cancel_releases():
+    exchange, clock = make_exchange()
+    order = exchange.create_order("qtcusdt", "sell", "100", "limit", "5")
+    assert order["state"] == "wait"
+    assert balance(exchange, "qtc") == {"currency": "qtc", "balance": "150.5", "locked": "100"}
+    assert [o["id"] for o in exchange.list_orders(state="wait")] == [order["id"]]
+
+    clock.now += 10
+    cancelled = exchange.cancel_order(order["id"])
+    assert cancelled["state"] == "cancel"
+    assert balance(exchange, "qtc") == {"currency": "qtc", "balance": "250.5", "locked": "0"}
+    with pytest.raises(SimulatorError):
+        exchange.cancel_order(order["id"])
+
+
+def test_liquidity_replenishes_over_time():
+    exchange, clock = make_exchange()
+    exchange.create_order("qtcusdt", "sell", "200", "market")
+    depleted = Decimal(exchange.order_book("qtcusdt")["bids"][0][1])
+    clock.now += 300
+    assert Decimal(exchange.order_book("qtcusdt")["bids"][0][1]) > depleted
@@ -0,0 +1,63 @@
+"""Тесты учета частей Iceberg при неудачной отмене и ответе без ID ордера"""
+
+import json
+
+import pytest
+
+main = pytest.importorskip("main")
+
+
+class FakeDB:
+    def __init__(self):
+        self.metrics = []
+
+    def insert_performance_metric(self, **kwargs):
+        self.metrics.append(json.loads(kwargs["metadata"]))
+
+
+@pytest.fixture
+def iceberg(monkeypatch):
+    db = FakeDB()
+    placed = []
+    monkeypatch.setitem(main.CONFIG['trading']['strategies'], 'iceberg', {
+        'max_open_slices': 1, 'refill_fill_ratio': 0.9, 'poll_interval': 0,
+        'slice_timeout': 0, 'max_duration': 60
+    })
+    monkeypatch.setattr(main, "db_manager", db)
+    monkeypatch.setattr(main, "order_tracker", type("Tracker", (), {"get": lambda self, order_id: None})())
+    monkeypatch.setattr(main, "get_orderbook", lambda market, force_refresh=False: {'bids': [["1.0", "100"]]})
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+    def create(market, amount, order_type, price, strategy=None):
+        placed.append(amount)
+        return f"✅ Успешно размещен ордер {len(placed)}"
+
+    monkeypatch.setattr(main, "create_sell_order_safetrade", create)
+    monkeypatch.setattr(main, "extract_order_id_from_result", lambda result: result.split()[-1])
+    return db, placed
+
+
+def test_failed_cancel_requeries_and_replaces_the_unfilled_rest(iceberg, monkeypatch):
+    db, placed = iceberg
+    responses = {
+        '1': [{'state': 'wait', 'origin_amount': '10', 'filled_amount': '4'},
+              {'state': 'cancel', 'origin_amount': '10', 'filled_amount': '4'}],
+        '2': [{'state': 'done', 'origin_amount': '6', 'filled_amount': '6'}],
+    }
+    monkeypatch.setattr(main, "get_order_details", lambda order_id: responses[order_id].pop(0))
+    monkeypatch.setattr(main, "cancel_order", lambda order_id, filled_amount=0: False)
+
+    assert main.execute_iceberg_sell("nockusdt", 10, visible_ratio=1.0, max_attempts=3)
+    assert placed == [10, 6]
+    assert db.metrics[-1]["filled_amount"] == pytest.approx(10)
+    assert db.metrics[-1]["completed"] is True
+
+
+def test_missing_order_id_is_a_failed_placement(iceberg, monkeypatch):
+    db, placed = iceberg
+    monkeypatch.setattr(main, "extract_order_id_from_result", lambda result: None)
+
+    assert not main.execute_iceberg_sell("nockusdt", 10, visible_ratio=1.0, max_attempts=1)
+    assert placed == [10]
+    assert db.metrics[-1]["filled_amount"] == 0
+    assert db.metrics[-1]["completed"] is False
@@ -0,0 +1,99 @@
+"""Тесты локального хранилища SQLite и фоновой синхронизации с Supabase"""
+
+from datetime import datetime
+
+from db_time import to_local, to_utc_iso
+from local_store import LocalStore, SupabaseSyncer
+
+
+def make_store(tmp_path):
+    store = LocalStore(tmp_path / "safetrade.db")
+    assert store.query("PRAGMA journal_mode")[0]["journal_mode"] == "wal"
+    return store
+
+
+def test_writes_and_reads_are_local(tmp_path):
+    store = make_store(tmp_path)
+    store.insert('safetrade_price_history', {'timestamp': '2024-01-01T10:00:00', 'symbol': 'BTCUSDT',
+                                             'price': 100.0, 'volume': 5.0})
+    store.insert('safetrade_price_history', {'timestamp': '2023-12-01T10:00:00', 'symbol': 'BTCUSDT',
+                                             'price': 90.0, 'volume': 1.0})
+    assert store.price_history('BTCUSDT', '2023-12-31') == [{'timestamp': '2024-01-01T10:00:00', 'volume': 5.0}]
+
+    store.upsert_trading_pairs([{'symbol': 'btcusdt', 'base_currency': 'btc', 'quote_currency': 'usdt',
+                                 'is_active': True, 'last_updated': 't1'}])
+    store.upsert_trading_pairs([{'symbol': 'btcusdt', 'base_currency': 'btc', 'quote_currency': 'usdt',
+                                 'is_active': False, 'last_updated': 't2'}])
+    assert store.count('safetrade_trading_pairs') == 1
+    assert store.trading_pairs() == []
+    store.close()
+
+    # Данные и курсоры переживают перезапуск
+    reopened = LocalStore(tmp_path / "safetrade.db")
+    assert reopened.count('safetrade_price_history') == 2
+    assert reopened.trading_pairs(active_only=False)[0]['is_active'] is False
+
+
+def test_syncer_pushes_in_bulk_and_resumes_from_cursor(tmp_path):
+    store = make_store(tmp_path)
+    for i in range(5):
+        store.insert('safetrade_performance_metrics', {'timestamp': str(i), 'metric_type': 'm',
+                                                       'metric_name': 'n', 'value': i})
+    store.insert('safetrade_order_history', {'order_id': '42', 'timestamp': 't', 'symbol': 'BTCUSDT',
+                                             'side': 'sell', 'order_type': 'limit', 'amount': 1, 'status': 'pending'})
+    store.set_order_status('42', 'partial')
+    store.set_order_status('42', 'filled')
+    store.upsert_trading_pairs([{'symbol': 'btcusdt', 'base_currency': 'btc', 'quote_currency': 'usdt',
+                                 'last_updated': 't1'}])
+
+    calls = []
+    online = {'up': False}
+
+    def insert_rows(table, rows):
+        if not online['up']:
+            raise ConnectionError("supabase down")
+        calls.append(('insert', table, len(rows)))
+        assert all('id' not in row for row in rows)
+
+    syncer = SupabaseSyncer(store, insert_rows,
+                            upsert_pairs=lambda rows: calls.append(('pairs', len(rows))),
+                            update_status=lambda order_id, status: calls.append(('status', order_id, status)),
+                            batch_size=2, start=False)
+
+    try:
+        syncer.sync_once()
+    except ConnectionError:
+        pass
+    assert calls == [] and store.sync_backlog()['safetrade_performance_metrics'] == 5
+
+    online['up'] = True
+    syncer.sync_once()
+    assert ('insert', 'safetrade_performance_metrics', 2) in calls
+    assert sum(c[2] for c in calls if c[:2] == ('insert', 'safetrade_performance_metrics')) == 5
+    # Статус схлопнут до последнего и отправлен после строки ордера
+    statuses = [c for c in calls if c[0] == 'status']
+    assert statuses == [('status', '42', 'filled')]
+    assert calls.index(statuses[0]) > calls.index(('insert', 'safetrade_order_history', 1))
+    assert store.recent('safetrade_order_history', 1)[0]['status'] == 'filled'
+    assert set(store.sync_backlog().values()) == {0}
+
+    calls.clear()
+    assert syncer.sync_once() == 0 and calls == []
+
+
+def test_naive_timestamps_are_converted_to_utc_once(tmp_path):
+    path = tmp_path / "legacy.db"
+    store = LocalStore(path)
+    store.insert('safetrade_ai_decisions', {'timestamp': '2024-01-01T10:00:00', 'decision_type': 'x',
+                                            'decision_data': '{}'})
+    store.insert('safetrade_ai_decisions', {'timestamp': to_utc_iso(), 'decision_type': 'y',
+                                            'decision_data': '{}'})
+    store.conn.execute("PRAGMA user_version = 0")
+    store.close()
+
+    migrated = LocalStore(path)
+    legacy, fresh = migrated.query("SELECT timestamp FROM safetrade_ai_decisions ORDER BY id")
+    assert legacy['timestamp'] == to_utc_iso(datetime(2024, 1, 1, 10, 0))
+    assert legacy['timestamp'].endswith('+00:00')
+    assert to_local(legacy['timestamp']) == datetime(2024, 1, 1, 10, 0)
+    assert migrated.query("PRAGMA user_version")[0]['user_version'] == 1
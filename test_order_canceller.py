@@ -0,0 +1,48 @@
+"""Тесты отмены ордеров при остановке (order_canceller.py)"""
+
+import threading
+import time
+
+from order_canceller import cancel_open_orders
+
+
+def open_orders():
+    return [
+        {'id': 1, 'market': 'abcusdt'}, {'id': 2, 'market': 'abcusdt'}, {'id': 3, 'market': 'abcusdt'},
+        {'id': 4, 'market': 'xyzusdt'}, {'id': 5, 'market': 'qqqusdt'}, {'id': 6, 'market': 'qqqusdt'},
+    ]
+
+
+def test_bulk_per_market_with_fallback_to_single_cancels():
+    cancelled, lock = [], threading.Lock()
+
+    def cancel_one(order_id):
+        with lock:
+            cancelled.append(order_id)
+
+    def cancel_market(market):
+        if market == 'qqqusdt':
+            raise RuntimeError("404")
+
+    report = cancel_open_orders(open_orders, cancel_one, cancel_market, deadline=5)
+    assert report.bulk_markets == ['abcusdt']
+    assert sorted(report.cancelled) == ['1', '2', '3', '4', '5', '6']
+    assert sorted(cancelled) == ['4', '5', '6']
+    assert not report.failed and not report.unfinished
+
+
+def test_deadline_bounds_total_time():
+    release = threading.Event()
+
+    def slow_cancel(order_id):
+        if order_id == '4':
+            release.wait(5)
+        elif order_id == '5':
+            raise RuntimeError("rejected")
+
+    started = time.monotonic()
+    report = cancel_open_orders(open_orders, slow_cancel, deadline=0.3, max_workers=6)
+    release.set()
+    assert time.monotonic() - started < 2
+    assert report.unfinished == ['4'] and report.failed == ['5']
+    assert len(report.cancelled) == 4
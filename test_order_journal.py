@@ -0,0 +1,39 @@
+"""Тесты журнала жизненного цикла ордеров (order_journal.py)"""
+
+from order_journal import OrderJournal, OrderStatus
+
+
+def test_replay_restores_open_orders(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = OrderJournal(path)
+    for i in range(3):
+        journal.open(f"t{i}", "ABCUSDT", "sell", 10, 1.5, strategy="twap")
+    journal.open("m1", "abcusdt", "sell", 5, order_type="market")
+
+    assert journal.transition("t0", OrderStatus.PARTIAL, 4)
+    assert journal.transition("t0", OrderStatus.FILLED, 10)
+    assert journal.transition("t1", OrderStatus.PARTIAL, 2)
+    assert journal.transition("m1", OrderStatus.FAILED)
+    # Запоздавшие события после финального состояния не применяются
+    assert not journal.transition("t0", OrderStatus.PARTIAL, 5)
+    assert not journal.transition("unknown", OrderStatus.FILLED)
+
+    restored = OrderJournal(path)
+    assert {r.order_id for r in restored.open_orders()} == {"t1", "t2"}
+    assert [r.order_id for r in restored.open_orders(strategy="twap")] == ["t1", "t2"]
+    assert restored.get("t0").state is OrderStatus.FILLED and restored.get("t0").filled == 10
+    assert restored.get("t1").filled == 2 and restored.get("t1").market == "abcusdt"
+
+
+def test_compaction_keeps_open_and_recent_closed(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = OrderJournal(path, compact_threshold=8, keep_closed=2)
+    for i in range(6):
+        journal.open(i, "abcusdt", "sell", 1)
+        if i < 4:
+            journal.transition(i, OrderStatus.CANCELLED)
+
+    restored = OrderJournal(path, compact_threshold=8, keep_closed=2)
+    assert restored.lines == 4
+    assert sorted(restored.records) == ["2", "3", "4", "5"]
+    assert {r.order_id for r in OrderJournal(path).open_orders()} == {"4", "5"}
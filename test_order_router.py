@@ -0,0 +1,57 @@
+"""
+Тесты маршрутизации продажи между биржами (order_router.py)
+"""
+from decimal import Decimal as D
+
+from order_router import VenueQuote, currency_locks, expected_fill, parse_bids, route_sell
+from order_sizing import SizingRules
+
+RULES = SizingRules.from_precision(2, min_amount="0.1", min_notional="1")
+
+
+def test_expected_fill_walks_the_book_with_fee():
+    bids = parse_bids([["1.0", "10"], ["0.9", "10"]])
+    estimate = expected_fill(bids, 15, fee="0.01")
+    assert estimate.amount == D("15")
+    assert estimate.proceeds == (D("10") * D("1.0") + D("5") * D("0.9")) * D("0.99")
+    assert expected_fill(bids, 25).unfilled == D("5")
+
+
+def test_split_takes_best_net_levels_across_venues():
+    safetrade = VenueQuote("safetrade", parse_bids([["1.00", "5"], ["0.80", "100"]]), RULES, D("20"), D("0.002"))
+    mexc = VenueQuote("mexc", parse_bids([{"price": "0.95", "amount": "100"}]), RULES, D("20"), D("0.001"))
+    plan = route_sell([safetrade, mexc], amount=20)
+    assert plan.allocations == {"safetrade": D("5.00"), "mexc": D("15.00")}
+    assert plan.total_amount == D("20")
+
+
+def test_slippage_limit_and_balance_caps():
+    safetrade = VenueQuote("safetrade", parse_bids([["1.00", "5"], ["0.50", "100"]]), RULES, D("50"))
+    mexc = VenueQuote("mexc", parse_bids([["0.99", "3"]]), RULES, D("10"))
+    plan = route_sell([safetrade, mexc], max_slippage="0.05")
+    # Уровень 0.50 хуже лучшей цены больше чем на 5% - остаток не продается
+    assert plan.allocations == {"safetrade": D("5.00"), "mexc": D("3.00")}
+
+
+def test_single_venue_when_other_has_no_balance():
+    safetrade = VenueQuote("safetrade", parse_bids([["1.0", "100"]]), RULES, D("0"))
+    mexc = VenueQuote("mexc", parse_bids([["1.0", "100"]]), RULES, D("7.129"))
+    plan = route_sell([safetrade, mexc])
+    assert plan.allocations == {"mexc": D("7.12")}
+
+
+def test_each_venue_is_capped_by_its_own_balance():
+    # Лучший стакан у MEXC, но баланса там мало - остаток продается на SafeTrade
+    safetrade = VenueQuote("safetrade", parse_bids([["0.90", "100"]]), RULES, D("30"))
+    mexc = VenueQuote("mexc", parse_bids([["1.00", "100"]]), RULES, D("4"))
+    plan = route_sell([safetrade, mexc], amount=30)
+    assert plan.allocations == {"mexc": D("4.00"), "safetrade": D("26.00")}
+    for quote in (safetrade, mexc):
+        assert plan.allocations[quote.venue] <= quote.available
+
+
+def test_currency_locks_are_shared_case_insensitively():
+    lock = currency_locks.get("nock")
+    assert currency_locks.get("NOCK") is lock
+    with lock:
+        assert not currency_locks.get("Nock").acquire(blocking=False)
@@ -0,0 +1,83 @@
+"""
+Тесты точного расчета размера ордеров (order_sizing.py).
+Свойства проверяются на случайных значениях с фиксированным seed.
+"""
+import random
+from decimal import Decimal
+
+import pytest
+
+from order_sizing import (
+    OrderSizeError, SizingRules, format_decimal, quantize_to_step,
+    rules_from_safetrade_market, size_order, step_from_precision, to_decimal
+)
+
+STEPS = [Decimal("1"), Decimal("0.1"), Decimal("0.01"), Decimal("0.0001"),
+         Decimal("0.00000001"), Decimal("0.5"), Decimal("0.25"), Decimal("10")]
+
+
+def random_amounts(count=2000, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng.uniform(0, 10 ** rng.randint(-6, 6))
+
+
+def test_quantized_never_exceeds_original_and_lies_on_grid():
+    for amount in random_amounts():
+        for step in STEPS:
+            quantized = quantize_to_step(amount, step)
+            assert quantized <= to_decimal(amount)
+            assert to_decimal(amount) - quantized < step
+            assert quantized % step == 0
+
+
+def test_quantize_is_idempotent():
+    for amount in random_amounts(500):
+        for step in STEPS:
+            once = quantize_to_step(amount, step)
+            assert quantize_to_step(once, step) == once
+
+
+def test_canonical_string_has_no_exponent_and_round_trips():
+    for amount in random_amounts(1000):
+        for precision in (0, 2, 4, 8):
+            quantized = quantize_to_step(amount, step_from_precision(precision))
+            text = format_decimal(quantized)
+            assert "e" not in text.lower()
+            assert Decimal(text) == quantized
+            if "." in text:
+                assert not text.endswith("0")
+                assert len(text.split(".")[1]) <= precision
+
+
+def test_float_artifacts_are_removed():
+    assert format_decimal(quantize_to_step(0.1 + 0.2, step_from_precision(8))) == "0.3"
+    assert format_decimal(quantize_to_step(177.83966849, step_from_precision(4))) == "177.8396"
+    assert format_decimal(1e-7) == "0.0000001"
+
+
+def test_size_order_enforces_minimums():
+    rules = SizingRules.from_precision(4, price_precision=2, min_amount="0.01", min_notional="5")
+    with pytest.raises(OrderSizeError) as err:
+        size_order("0.00009", rules)
+    assert err.value.reason == "zero_amount"
+    with pytest.raises(OrderSizeError) as err:
+        size_order("0.005", rules)
+    assert err.value.reason == "below_min_amount"
+    with pytest.raises(OrderSizeError) as err:
+        size_order("1", rules, reference_price="4.99")
+    assert err.value.reason == "below_min_notional"
+
+    order = size_order("2.56789", rules, price="2.001")
+    assert order.amount_str == "2.5678"
+    assert order.price_str == "2.01"  # продажа: цена округляется вверх
+    assert order.notional >= rules.min_notional
+
+
+def test_rules_from_safetrade_market_prefers_learned_precision():
+    market = {"amount_precision": 8, "price_precision": 6, "min_amount": "0.1"}
+    rules = rules_from_safetrade_market(market, amount_precision=4)
+    assert rules.amount_step == Decimal("0.0001")
+    assert rules.price_step == Decimal("0.000001")
+    assert rules.min_amount == Decimal("0.1")
+    assert rules_from_safetrade_market(None).amount_step == Decimal("0.0001")
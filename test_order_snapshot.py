@@ -0,0 +1,44 @@
+"""Тесты снимка ордеров с индексом по id (order_snapshot.py)"""
+
+import pytest
+
+from order_snapshot import OrderSnapshot, fetch_order_snapshot
+
+
+def paged_orders(orders):
+    calls = []
+
+    def get_orders(state=None, limit=100, offset=0):
+        calls.append((state, limit, offset))
+        selected = [o for o in orders if state is None or o['state'] == state]
+        return selected[offset:offset + limit]
+    return get_orders, calls
+
+
+def test_snapshot_walks_all_pages():
+    orders = [{'id': i, 'state': 'wait' if i % 3 else 'done'} for i in range(250)]
+    get_orders, calls = paged_orders(orders)
+
+    snapshot = fetch_order_snapshot(get_orders, page_size=100)
+    assert [offset for _, _, offset in calls] == [0, 100, 200]
+    assert len(snapshot) == 250 and snapshot.complete
+    # Ордер с последней страницы больше не считается not_found
+    assert snapshot.status(248) == 'wait'
+    assert snapshot.statuses([0, '1', 999]) == {0: 'done', '1': 'wait', 999: 'not_found'}
+
+    waiting = fetch_order_snapshot(get_orders, state='wait', page_size=100)
+    assert all(o['state'] == 'wait' for o in waiting.orders)
+    assert 3 not in waiting and 4 in waiting
+
+
+def test_truncated_snapshot_does_not_claim_not_found():
+    get_orders, _ = paged_orders([{'id': i, 'state': 'wait'} for i in range(50)])
+    snapshot = fetch_order_snapshot(get_orders, page_size=10, max_pages=2)
+    assert len(snapshot) == 20 and not snapshot.complete
+    assert snapshot.status(45) == 'unknown'
+
+
+def test_unexpected_response_raises():
+    with pytest.raises(ValueError):
+        fetch_order_snapshot(lambda **kwargs: {'error': 'x'})
+    assert OrderSnapshot([{'id': 1}, {'state': 'wait'}, None]).get('1') == {'id': 1}
@@ -0,0 +1,145 @@
+"""Тесты единого трекера ордеров (order_tracker.py)"""
+
+from order_tracker import OrderTracker
+
+
+class FakeExchange:
+    def __init__(self):
+        self.open = {}
+        self.closed = {}
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    def fetch_open_orders(self):
+        self.batch_calls += 1
+        return list(self.open.values())
+
+    def fetch_order(self, order_id):
+        self.single_calls += 1
+        return self.closed.get(order_id)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_tracker(exchange, clock, top=None, timeout=3600):
+    tracker = OrderTracker(exchange.fetch_open_orders, exchange.fetch_order,
+                           get_top_of_book=(lambda market: top) if top else None,
+                           min_interval=2, max_interval=30, far_distance=0.05,
+                           default_timeout=timeout, clock=clock)
+    tracker.start = lambda: None  # такты вызываются вручную
+    return tracker
+
+
+def test_one_batch_request_per_tick_and_events():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock)
+    events = []
+    for i in range(10):
+        exchange.open[str(i)] = {'id': i, 'state': 'wait', 'origin_amount': '10', 'filled_amount': '0'}
+        tracker.track(i, on_fill=lambda t, d: events.append(('fill', t.order_id, t.filled)),
+                      on_done=lambda t, d: events.append(('done', t.order_id)),
+                      on_cancel=lambda t, d: events.append(('cancel', t.order_id)))
+
+    tracker.tick()
+    assert exchange.batch_calls == 1 and exchange.single_calls == 0
+    assert events == []
+
+    exchange.open['3']['filled_amount'] = '4'
+    exchange.closed['5'] = dict(exchange.open.pop('5'), state='done', filled_amount='10')
+    exchange.closed['7'] = dict(exchange.open.pop('7'), state='cancel', filled_amount='1')
+    clock.now += 2
+    tracker.tick()
+
+    assert exchange.batch_calls == 2 and exchange.single_calls == 2
+    assert ('fill', '3', 4.0) in events
+    assert ('done', '5') in events and ('cancel', '7') in events
+    assert tracker.open_count() == 8
+    assert tracker.wait('5', timeout=0).state == 'done'
+    assert tracker.latest('7')['state'] == 'cancel'
+
+
+def test_interval_adapts_to_distance_from_top_of_book():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock, top=(0.99, 1.0))
+    exchange.open['near'] = {'id': 'near', 'state': 'wait'}
+    exchange.open['far'] = {'id': 'far', 'state': 'wait'}
+    tracker.track('near', market='abcusdt', price=1.0)
+    tracker.track('far', market='abcusdt', price=1.2)
+
+    tracker.tick()
+    assert tracker.get('near').next_check == clock.now + 2
+    assert tracker.get('far').next_check == clock.now + 30
+
+    # Через 2 секунды проверяется только ближний ордер
+    clock.now += 2
+    tracker.tick()
+    assert tracker.get('near').checks == 2
+    assert tracker.get('far').checks == 1
+
+
+def test_timeout_event():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock, timeout=60)
+    exchange.open['1'] = {'id': 1, 'state': 'wait'}
+    timeouts = []
+    tracker.track(1, on_timeout=lambda t, d: timeouts.append(t.order_id))
+
+    clock.now += 61
+    tracker.tick()
+    assert timeouts == ['1']
+    assert tracker.open_count() == 0
+
+
+def test_failed_lookup_keeps_order_tracked():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock)
+    events = []
+    tracker.track(1, on_done=lambda t, d: events.append('done'))
+
+    # Ордера нет среди ожидающих, а запрос самого ордера не удался
+    tracker.tick()
+    assert events == [] and tracker.open_count() == 1
+    assert tracker.get(1).state == 'wait'
+
+    exchange.closed['1'] = {'id': 1, 'state': 'done', 'origin_amount': '5', 'filled_amount': '5'}
+    clock.now += 2
+    tracker.tick()
+    assert events == ['done'] and tracker.get(1).filled == 5.0
+
+
+def test_top_of_book_is_fetched_without_holding_the_lock():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock)
+    held = []
+
+    def top_of_book(market):
+        held.append(tracker.lock.locked())
+        return 0.99, 1.0
+
+    tracker.get_top_of_book = top_of_book
+    exchange.open['1'] = {'id': 1, 'state': 'wait'}
+    tracker.track(1, market='abcusdt', price=1.0)
+    tracker.tick()
+    assert held == [False]
+
+
+def test_pushed_trades_and_order_updates_are_not_double_counted():
+    exchange, clock = FakeExchange(), Clock()
+    tracker = make_tracker(exchange, clock)
+    fills = []
+    tracker.track("7", "nockusdt", price=1.0, on_fill=lambda t, data: fills.append(t.filled))
+
+    tracker.push_trade({'id': 't1', 'order_id': '7', 'amount': '3'})
+    tracker.push_trade({'id': 't1', 'order_id': '7', 'amount': '3'})  # повторная доставка
+    tracker.push_order({'id': '7', 'state': 'wait', 'executed_volume': '3'})
+    tracker.push_trade({'id': 't2', 'order_id': '7', 'amount': '2'})
+    tracker.push_order({'id': '7', 'state': 'wait', 'executed_volume': '5'})
+
+    assert tracker.get("7").filled == 5
+    assert fills == [3, 5]
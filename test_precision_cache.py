@@ -0,0 +1,62 @@
+"""
+Тесты персистентного кэша точности (precision_cache.py)
+"""
+from precision_cache import PrecisionCache
+
+
+def test_success_is_persisted_and_reloaded(tmp_path):
+    path = tmp_path / "precision_cache.json"
+    cache = PrecisionCache(path)
+    cache.record_success("NOCKUSDT", 4, advertised_precision=8)
+
+    reloaded = PrecisionCache(path)
+    assert reloaded.get_precision("nockusdt") == 4
+    record = reloaded.get("nockusdt")
+    assert record["advertised_precision"] == 8
+    assert record["advertised_wrong"] is True
+
+
+def test_candidates_skip_rejected_and_wrong_advertised(tmp_path):
+    cache = PrecisionCache(tmp_path / "precision_cache.json")
+    cache.record_rejection("qtcusdt", 8, advertised_precision=8)
+    cache.record_rejection("qtcusdt", 7)
+
+    candidates = cache.candidate_precisions("qtcusdt", 8, [8, 7, 6, 5, 4])
+    assert candidates == [6, 5, 4]
+
+    cache.record_success("qtcusdt", 5, advertised_precision=8)
+    assert cache.candidate_precisions("qtcusdt", 8, [8, 7, 6, 5, 4])[0] == 5
+
+
+def test_unknown_market_uses_advertised_first(tmp_path):
+    cache = PrecisionCache(tmp_path / "precision_cache.json")
+    assert cache.get_precision("btcusdt") is None
+    assert cache.candidate_precisions("btcusdt", 6, [6, 5, 4]) == [6, 5, 4]
+
+
+def test_corrupted_file_is_ignored(tmp_path):
+    path = tmp_path / "precision_cache.json"
+    path.write_text("{not json", encoding="utf-8")
+    cache = PrecisionCache(path)
+    assert cache.get_precision("nockusdt") is None
+
+
+def test_rejections_expire_and_last_candidate_is_kept(tmp_path):
+    now = [1000.0]
+    cache = PrecisionCache(tmp_path / "precision_cache.json", rejection_ttl=3600, clock=lambda: now[0])
+    for precision in (6, 5, 4):
+        cache.record_rejection("nockusdt", precision)
+        now[0] += 10
+
+    # Все уровни отклонены - остается отклоненный раньше всех
+    assert cache.candidate_precisions("nockusdt", None, [6, 5, 4]) == [6]
+
+    now[0] += 3600
+    assert cache.candidate_precisions("nockusdt", None, [6, 5, 4]) == [6, 5, 4]
+
+
+def test_legacy_rejection_list_is_loaded_as_expired(tmp_path):
+    path = tmp_path / "precision_cache.json"
+    path.write_text('{"qtcusdt": {"rejected": [8, 7]}}', encoding="utf-8")
+    cache = PrecisionCache(path)
+    assert cache.candidate_precisions("qtcusdt", None, [8, 7, 6]) == [8, 7, 6]
@@ -0,0 +1,48 @@
+"""Тест повторного размещения ордера после ошибки точности (handle_precision_error)"""
+
+import time
+from decimal import Decimal
+
+import pytest
+
+from balance_ledger import BalanceLedger
+from order_journal import OrderJournal
+from precision_cache import PrecisionCache
+
+main = pytest.importorskip("main")
+
+
+class FakeAPI:
+    def __init__(self):
+        self.orders = []
+
+    def create_order(self, market, side, amount, order_type, price=None):
+        if len(amount.split(".")[-1]) > 2:
+            raise Exception("market.order.non_round_amount")
+        self.orders.append({"amount": amount, "price": price})
+        return {"id": "77", "market": market, "side": side, "type": order_type,
+                "amount": amount, "price": price, "state": "wait"}
+
+
+def test_fallback_order_is_sized_reserved_and_journaled(tmp_path, monkeypatch):
+    api = FakeAPI()
+    ledger = BalanceLedger()
+    ledger.update_from_balances([{"currency": "nock", "balance": "100", "locked": "0"}], taken_at=time.time() - 1)
+    journal = OrderJournal(tmp_path / "order_journal.jsonl")
+    monkeypatch.setattr(main, "api_client", api)
+    monkeypatch.setattr(main, "balance_ledger", ledger)
+    monkeypatch.setattr(main, "order_journal", journal)
+    monkeypatch.setattr(main, "precision_cache", PrecisionCache(tmp_path / "precision_cache.json"))
+    monkeypatch.setattr(main, "get_market_info", lambda market: {
+        "id": market, "amount_precision": 4, "price_precision": 3, "min_amount": "0.01", "min_notional": "1"
+    })
+    monkeypatch.setattr(main, "db_manager", type("DB", (), {"insert_order_history": lambda self, **kw: None})())
+    monkeypatch.setattr(main, "track_order", lambda *args, **kwargs: None)
+
+    result = main.handle_precision_error("nockusdt", 60.123456, "limit", 1.23456,
+                                         Exception("market.order.non_round_amount"), strategy="twap")
+
+    assert "✅" in result
+    assert api.orders == [{"amount": "60.12", "price": "1.235"}]  # Цена продажи - вверх по шагу
+    assert ledger.get_available("NOCK") == Decimal("39.88")
+    assert journal.open_orders(strategy="twap")[0].order_id == "77"
@@ -0,0 +1,51 @@
+"""Тесты свертки истории цен в свечи и очистки старых строк"""
+
+from datetime import datetime, timedelta
+
+from local_store import LocalStore
+from price_rollup import build_candles, rollup_local
+
+
+def test_build_candles_ohlcv():
+    rows = [
+        {'symbol': 'BTCUSDT', 'timestamp': '2024-01-01T10:00:05', 'price': 100, 'volume': 10},
+        {'symbol': 'BTCUSDT', 'timestamp': '2024-01-01T10:00:50', 'price': 90, 'volume': 12},
+        {'symbol': 'BTCUSDT', 'timestamp': '2024-01-01T10:00:30', 'price': 120, 'volume': 11},
+        {'symbol': 'BTCUSDT', 'timestamp': '2024-01-01T10:01:10', 'price': 95, 'volume': None},
+    ]
+    minutes = build_candles(rows, '1m')
+    assert [(c['bucket_start'], c['open'], c['high'], c['low'], c['close'], c['volume'], c['samples'])
+            for c in minutes] == [('2024-01-01T10:00:00', 100, 120, 90, 90, 12, 3),
+                                  ('2024-01-01T10:01:00', 95, 95, 95, 95, None, 1)]
+    hour = build_candles(rows, '1h')[0]
+    assert (hour['open'], hour['close'], hour['volume'], hour['samples']) == (100, 95, 12, 4)
+
+
+def test_rollup_prunes_only_rolled_up_and_synced_rows(tmp_path):
+    store = LocalStore(tmp_path / "safetrade.db")
+    now = datetime(2024, 1, 10, 12, 0)
+    for day in range(10):
+        for hour in (1, 2):
+            ts = datetime(2024, 1, 1 + day, hour, 30)
+            store.insert('safetrade_price_history', {'timestamp': ts.isoformat(), 'symbol': 'BTCUSDT',
+                                                     'price': 100 + day, 'volume': float(day * 10 + hour)})
+    retention = {'1m': 2, '1h': 0, '1d': 0}
+
+    # Ничего не отправлено в Supabase - сырые строки остаются
+    stats = rollup_local(store, raw_retention_days=3, candle_retention_days=retention, synced_only=True, now=now)
+    assert stats['rows'] == 20 and stats['pruned_rows'] == 0
+    assert len(store.candles('BTCUSDT', '1d')) == 10
+
+    store.advance_cursor('safetrade_price_history', 10**9)
+    stats = rollup_local(store, raw_retention_days=3, candle_retention_days=retention, synced_only=True, now=now)
+    # Пересчитан только последний день; удалены строки до 2024-01-07
+    assert stats['rows'] == 2
+    assert stats['pruned_rows'] == 12
+    assert store.count('safetrade_price_history') == 8
+    assert store.candles('BTCUSDT', '1m')[0]['bucket_start'] >= (now - timedelta(days=2)).date().isoformat()
+    assert len(store.candles('BTCUSDT', '1h')) == 20
+
+    # Чтение истории для VWAP: часовые свечи за удаленный период + сырые строки
+    history = store.price_history('BTCUSDT', '2024-01-05T00:00:00')
+    assert [row['timestamp'][:10] for row in history][:2] == ['2024-01-05', '2024-01-05']
+    assert len(history) == 12 and history[0]['volume'] == 41.0
@@ -0,0 +1,70 @@
+"""Тесты разбора приватного WebSocket-потока и push-обновлений трекера"""
+
+import json
+import threading
+from decimal import Decimal
+
+from balance_ledger import BalanceLedger
+from order_tracker import OrderTracker
+from private_stream import PrivateStream, private_stream_url
+
+
+def test_private_stream_url():
+    assert private_stream_url("https://safe.trade/api/v2") == "wss://safe.trade/api/v2/websocket/private"
+    assert private_stream_url("http://127.0.0.1:8080/api/v2/") == "ws://127.0.0.1:8080/api/v2/websocket/private"
+
+
+def test_events_are_pushed_into_tracker_and_ledger():
+    polls = []
+    tracker = OrderTracker(lambda: polls.append(1) or [], lambda order_id: None, push_interval=300)
+    tracker.start = lambda: None
+    ledger = BalanceLedger()
+    ledger.update_from_balances([{'currency': 'abc', 'balance': '10', 'locked': '0'}], taken_at=0)
+    ledger.reserve('ABC', '4', order_id=1)
+
+    events = []
+    tracker.track(1, market='abcusdt', price=1.0,
+                  on_fill=lambda t, d: events.append(('fill', t.filled)),
+                  on_done=lambda t, d: events.append(('done', t.filled)))
+    stream = PrivateStream("wss://example/websocket/private", dict,
+                           on_order=tracker.push_order, on_trade=tracker.push_trade,
+                           on_balance=lambda b: ledger.update_currency(b['currency'], b['balance'], b['locked']),
+                           on_state=tracker.set_push_active)
+
+    stream._set_connected(True)
+    assert tracker.push_active and tracker._interval_for(tracker.get(1)) == 300
+
+    stream.handle_message(json.dumps({"success": {"message": "subscribed"}}))
+    stream.handle_message({"trade": {"id": 7, "order_id": 1, "amount": "1.5", "price": "1.0"}})
+    stream.handle_message({"order": {"id": 1, "state": "wait", "origin_amount": "4", "filled_amount": "1.5"}})
+    stream.handle_message({"order": {"id": 1, "state": "done", "origin_amount": "4", "filled_amount": "4"}})
+    stream.handle_message({"balance": {"abc": ["6", "0"]}})
+
+    assert events == [('fill', 1.5), ('fill', 4.0), ('done', 4.0)]
+    assert tracker.open_count() == 0 and polls == []
+    # Резерв снят: биржа уже списала проданный объем в событии баланса
+    assert ledger.get_available('ABC') == Decimal("6")
+    assert stream.stats["orders"] == 2 and stream.stats["trades"] == 1 and stream.stats["balances"] == 1
+
+    stream._set_connected(False)
+    assert not tracker.push_active
+
+
+def test_concurrent_start_runs_a_single_stream():
+    runs = []
+    stream = PrivateStream("wss://example/websocket/private", dict)
+
+    async def run():
+        runs.append(threading.current_thread().name)
+        stream._stop.wait(5)
+
+    stream._run = run
+    barrier = threading.Barrier(8)
+    starters = [threading.Thread(target=lambda: (barrier.wait(), stream.start())) for _ in range(8)]
+    for thread in starters:
+        thread.start()
+    for thread in starters:
+        thread.join()
+    stream.stop()
+    stream._thread.join(5)
+    assert runs == ["private-stream"]
@@ -0,0 +1,50 @@
+"""Тесты инкрементальной синхронизации сделок (trade_sync.py)"""
+
+from trade_sync import TradeStore, TradeSync, trade_timestamp
+
+
+class FakeTrades:
+    def __init__(self, trades):
+        self.trades = trades
+        self.calls = []
+
+    def __call__(self, time_from=None, limit=100, offset=0):
+        self.calls.append((time_from, limit, offset))
+        newer = [t for t in self.trades if trade_timestamp(t) >= time_from]
+        return newer[offset:offset + limit]
+
+
+def make_trade(i, order_id, ts):
+    return {'id': i, 'order_id': order_id, 'market': 'abcusdt', 'amount': '1', 'created_at': ts}
+
+
+def test_incremental_sync_and_order_index(tmp_path):
+    clock = lambda: 10_000
+    api = FakeTrades([make_trade(i, i % 3, 9_000 + i) for i in range(25)])
+    store = TradeStore(tmp_path / "trades.jsonl")
+    sync = TradeSync(api, store, page_size=10, min_interval=0, clock=clock)
+
+    assert sync.sync() == 25
+    assert [offset for _, _, offset in api.calls] == [0, 10, 20]
+    assert api.calls[0][0] == 10_000 - 86_400
+    assert len(store.for_order(1)) == 8 and len(store.for_market('ABCUSDT')) == 25
+
+    # Следующий проход запрашивает только сделки от последней виденной
+    api.trades.append(make_trade(25, 7, 9_100))
+    api.calls.clear()
+    assert sync.sync() == 1
+    assert api.calls == [(9_024, 10, 0)]
+    assert sync.trades_for_order(7)[0]['id'] == 25
+
+    # После перезапуска индекс и курсор восстанавливаются из файла
+    restored = TradeSync(api, TradeStore(tmp_path / "trades.jsonl"), clock=clock)
+    assert len(restored.store) == 26 and restored.cursor == 9_100
+
+
+def test_trades_for_order_syncs_only_on_miss():
+    api = FakeTrades([make_trade(1, 'a', '2026-01-01T00:00:00Z')])
+    sync = TradeSync(api, TradeStore(), min_interval=0, clock=lambda: 1_767_225_700)
+    assert len(sync.trades_for_order('a')) == 1
+    assert len(sync.trades_for_order('a')) == 1
+    assert len(api.calls) == 1
+    assert trade_timestamp({'created_at': 1_767_225_600_000}) == 1_767_225_600
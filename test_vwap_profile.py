@@ -0,0 +1,42 @@
+"""
+Тесты профиля объема и расписания VWAP (vwap_profile.py)
+"""
+from datetime import datetime, timedelta
+
+from vwap_profile import build_hourly_profile, schedule_slices, uniform_profile
+
+
+def make_history(hourly_volume, days=2):
+    """Записи истории каждые 30 минут с накопленным объемом (как vol тикера)."""
+    rows, volume = [], 1000.0
+    ts = datetime(2024, 1, 1)
+    for _ in range(days * 48):
+        volume += hourly_volume(ts.hour) / 2
+        rows.append({"timestamp": ts.isoformat(), "volume": volume})
+        ts += timedelta(minutes=30)
+    return rows
+
+
+def test_profile_follows_recorded_volume():
+    profile = build_hourly_profile(make_history(lambda h: 300 if 14 <= h < 18 else 100))
+    assert abs(sum(profile) - 1) < 1e-9
+    assert abs(profile[15] / profile[3] - 3) < 1e-9
+
+
+def test_sparse_history_falls_back_to_uniform():
+    rows = make_history(lambda h: 100)[:6]
+    assert build_hourly_profile(rows) == uniform_profile()
+    assert build_hourly_profile([]) == uniform_profile()
+
+
+def test_schedule_is_proportional_to_expected_volume():
+    profile = [0.0] * 24
+    profile[10], profile[11] = 0.25, 0.75
+    schedule = schedule_slices(profile, datetime(2024, 1, 1, 10, 0), 120, 4)
+    assert [offset for offset, _ in schedule] == [0, 1800, 3600, 5400]
+    assert [round(share, 6) for _, share in schedule] == [0.125, 0.125, 0.375, 0.375]
+
+
+def test_uniform_profile_matches_twap():
+    schedule = schedule_slices(uniform_profile(), datetime(2024, 1, 1, 23, 30), 60, 3)
+    assert all(abs(share - 1 / 3) < 1e-9 for _, share in schedule)
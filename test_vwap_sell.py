@@ -0,0 +1,25 @@
+"""Тест переноса объема неудачных частей VWAP в следующие"""
+
+import pytest
+
+from order_sizing import SizingRules
+
+main = pytest.importorskip("main")
+
+
+def test_failed_chunk_volume_moves_to_the_next_chunk(monkeypatch):
+    placed = []
+    results = iter([True, False, True, True])
+
+    def create(market, amount, order_type, price, strategy=None):
+        placed.append(amount)
+        return "✅ Успешно размещен ордер 1" if next(results) else "❌ Ошибка"
+
+    monkeypatch.setattr(main, "db_manager", type("DB", (), {"get_price_history": lambda self, symbol, days: []})())
+    monkeypatch.setattr(main, "get_sizing_rules", lambda market: SizingRules.from_precision(2))
+    monkeypatch.setattr(main, "get_orderbook", lambda market, force_refresh=False: {'bids': [["1.0", "100"]]})
+    monkeypatch.setattr(main, "create_sell_order_safetrade", create)
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+    assert main.execute_vwap_sell("nockusdt", 40, duration_minutes=0, chunks=4)
+    assert placed == [10, 10, 20, 10]
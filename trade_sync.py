@@ -0,0 +1,163 @@
+"""
+Инкрементальная синхронизация сделок аккаунта с локальным индексом.
+
+Раньше для каждого исполненного ордера скачивалась первая страница
+/trade/market/trades и фильтровалась по order_id. TradeSync запрашивает только
+сделки новее последней виденной (time_from), а TradeStore хранит их с
+индексами по order_id и рынку - поиск сделок ордера становится чтением словаря.
+
+Сделки дописываются в JSONL-файл, поэтому после перезапуска синхронизация
+продолжается с последней сохраненной сделки, а не с начала истории.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def trade_timestamp(trade: dict) -> Optional[float]:
+    """Время сделки в секундах Unix (created_at ISO-строкой или числом, мс тоже понимаются)."""
+    value = trade.get('created_at', trade.get('timestamp'))
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        return number / 1000 if number > 1e11 else number
+
+
+class TradeStore:
+    """Сделки по id с индексами по order_id и рынку."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.lock = threading.Lock()
+        self.trades: Dict[str, dict] = {}
+        self.by_order: Dict[str, List[dict]] = {}
+        self.by_market: Dict[str, List[dict]] = {}
+        self.last_timestamp: Optional[float] = None
+        self.path = Path(path) if path else None
+        if self.path and self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        loaded = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    loaded.append(json.loads(line))
+                except ValueError:
+                    continue
+        self._index(loaded)
+        logging.info(f"Загружено {len(self.trades)} сделок из {self.path}")
+
+    def _index(self, trades: Iterable[dict]) -> List[dict]:
+        """Добавляет новые сделки в индексы. Вызывается под self.lock или при загрузке."""
+        added = []
+        for trade in trades:
+            if not isinstance(trade, dict) or trade.get('id') is None:
+                continue
+            trade_id = str(trade['id'])
+            if trade_id in self.trades:
+                continue
+            self.trades[trade_id] = trade
+            if trade.get('order_id') is not None:
+                self.by_order.setdefault(str(trade['order_id']), []).append(trade)
+            if trade.get('market'):
+                self.by_market.setdefault(str(trade['market']).lower(), []).append(trade)
+            ts = trade_timestamp(trade)
+            if ts is not None and (self.last_timestamp is None or ts > self.last_timestamp):
+                self.last_timestamp = ts
+            added.append(trade)
+        return added
+
+    def add(self, trades: Iterable[dict]) -> List[dict]:
+        """Добавляет сделки (дубликаты по id пропускаются). Возвращает новые."""
+        with self.lock:
+            added = self._index(trades)
+            if added and self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for trade in added:
+                        f.write(json.dumps(trade, ensure_ascii=False) + "\n")
+        return added
+
+    def for_order(self, order_id) -> List[dict]:
+        with self.lock:
+            return list(self.by_order.get(str(order_id), []))
+
+    def for_market(self, market: str) -> List[dict]:
+        with self.lock:
+            return list(self.by_market.get(market.lower(), []))
+
+    def __len__(self) -> int:
+        return len(self.trades)
+
+
+class TradeSync:
+    """Подтягивает в TradeStore только сделки новее последней сохраненной."""
+
+    def __init__(self, fetch_trades: Callable[..., Optional[list]], store: TradeStore,
+                 page_size: int = 100, max_pages: int = 10, initial_lookback: float = 86400,
+                 min_interval: float = 2, clock=time.time):
+        self.fetch_trades = fetch_trades
+        self.store = store
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.initial_lookback = initial_lookback
+        self.min_interval = min_interval
+        self.clock = clock
+        self.last_sync: Optional[float] = None
+        # Курсор двигает только REST-синхронизация: сделки из приватного потока
+        # не должны сдвигать его через пропущенные при обрыве потока сделки
+        self.cursor: Optional[float] = store.last_timestamp
+        self.sync_lock = threading.Lock()
+        self.stats = {"syncs": 0, "requests": 0, "trades": 0}
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Один инкрементальный проход: time_from = время последней сделки (включительно,
+        повторы отсекаются по id). Чаще min_interval не ходит на биржу без force.
+        Возвращает число новых сделок.
+        """
+        with self.sync_lock:
+            now = self.clock()
+            if not force and self.last_sync is not None and now - self.last_sync < self.min_interval:
+                return 0
+            self.last_sync = now
+            self.stats["syncs"] += 1
+
+            time_from = self.cursor if self.cursor is not None else now - self.initial_lookback
+            added = 0
+            for page in range(self.max_pages):
+                batch = self.fetch_trades(time_from=int(time_from), limit=self.page_size,
+                                          offset=page * self.page_size)
+                self.stats["requests"] += 1
+                if not isinstance(batch, list):
+                    break
+                added += len(self.store.add(batch))
+                for trade in batch:
+                    ts = trade_timestamp(trade) if isinstance(trade, dict) else None
+                    if ts is not None and (self.cursor is None or ts > self.cursor):
+                        self.cursor = ts
+                if len(batch) < self.page_size:
+                    break
+            self.stats["trades"] += added
+            return added
+
+    def trades_for_order(self, order_id) -> List[dict]:
+        """Сделки ордера: из индекса, при отсутствии - после одной инкрементальной синхронизации."""
+        trades = self.store.for_order(order_id)
+        if trades:
+            return trades
+        self.sync()
+        return self.store.for_order(order_id)
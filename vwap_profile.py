@@ -0,0 +1,108 @@
+"""
+Профиль объема торгов по часам суток для VWAP-продажи.
+
+Тикер SafeTrade отдает скользящий объем за 24 часа (vol), который
+get_ticker_price записывает в safetrade_price_history. Прирост vol между
+соседними записями - оценка объема, проторгованного за этот промежуток.
+Приросты суммируются по часу суток и усредняются по числу наблюдений,
+из чего получается доля объема каждого часа.
+
+По профилю части продажи распределяются пропорционально ожидаемому
+объему на их временных интервалах, а не поровну, как в TWAP.
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+HOURS = 24
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+
+
+def build_hourly_profile(rows: Iterable[dict], max_gap_minutes: int = 120,
+                         min_observed_hours: int = 12) -> List[float]:
+    """
+    Строит профиль объема по часам суток из записей истории цен
+    ({'timestamp', 'volume'}). Возвращает 24 доли, сумма которых равна 1.
+    Если данных мало (наблюдено меньше min_observed_hours разных часов), профиль равномерный.
+    """
+    samples: List[Tuple[datetime, float]] = []
+    for row in rows:
+        ts = _parse_timestamp(row.get('timestamp'))
+        volume = row.get('volume')
+        if ts is None or volume is None:
+            continue
+        try:
+            samples.append((ts, float(volume)))
+        except (TypeError, ValueError):
+            continue
+    samples.sort(key=lambda sample: sample[0])
+
+    volume_by_hour = [0.0] * HOURS
+    observations = [0] * HOURS
+    max_gap = timedelta(minutes=max_gap_minutes)
+    for (prev_ts, prev_volume), (ts, volume) in zip(samples, samples[1:]):
+        if ts - prev_ts > max_gap or ts <= prev_ts:
+            continue
+        # Скользящий 24ч объем может уменьшаться, когда из окна выходят старые сделки
+        volume_by_hour[ts.hour] += max(volume - prev_volume, 0.0)
+        observations[ts.hour] += 1
+
+    observed_hours = sum(1 for count in observations if count > 0)
+    if observed_hours < min_observed_hours:
+        return uniform_profile()
+
+    # Средний объем на наблюдение; для ненаблюдавшихся часов - среднее по наблюдавшимся
+    averages = [volume_by_hour[h] / observations[h] if observations[h] else None for h in range(HOURS)]
+    known = [a for a in averages if a is not None]
+    fallback = sum(known) / len(known) if known else 0.0
+    averages = [a if a is not None else fallback for a in averages]
+
+    total = sum(averages)
+    if total <= 0:
+        return uniform_profile()
+    return [a / total for a in averages]
+
+
+def uniform_profile() -> List[float]:
+    return [1.0 / HOURS] * HOURS
+
+
+def expected_volume_share(profile: List[float], start: datetime, end: datetime) -> float:
+    """Доля суточного объема, ожидаемая на интервале [start, end) по профилю."""
+    share = 0.0
+    cursor = start
+    while cursor < end:
+        hour_end = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        segment_end = min(hour_end, end)
+        share += profile[cursor.hour] * (segment_end - cursor).total_seconds() / 3600
+        cursor = segment_end
+    return share
+
+
+def schedule_slices(profile: List[float], start: datetime, duration_minutes: float,
+                    slices: int) -> List[Tuple[float, float]]:
+    """
+    Расписание VWAP: интервал делится на slices равных отрезков, доля объема
+    каждой части пропорциональна ожидаемому объему торгов на ее отрезке.
+    Возвращает [(секунд от начала, доля от общего объема)], сумма долей равна 1.
+    """
+    slices = max(1, int(slices))
+    step = timedelta(minutes=duration_minutes) / slices
+    shares = []
+    for i in range(slices):
+        slice_start = start + step * i
+        shares.append(expected_volume_share(profile, slice_start, slice_start + step))
+
+    total = sum(shares)
+    if total <= 0:
+        shares = [1.0] * slices
+        total = float(slices)
+    return [(step.total_seconds() * i, share / total) for i, share in enumerate(shares)]